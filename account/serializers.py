@@ -1,7 +1,8 @@
 from rest_framework import serializers
+from backend.metrics import TimedSerializerMixin
 from .models import Account
 
-class AccountSerializer(serializers.ModelSerializer):
+class AccountSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Account
         fields = ['id', 'name_account', 'balance', 'user']
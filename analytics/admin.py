@@ -0,0 +1,56 @@
+from django.contrib import admin
+from django.db import transaction as db_transaction
+from django.db.models import OuterRef, Subquery
+from dashboard.signals import bulk_updated, owned_rows
+from transaction.models import Transaction
+from .models import DuplicateCandidate, RecurringSeries
+
+
+@admin.register(RecurringSeries)
+class RecurringSeriesAdmin(admin.ModelAdmin):
+    list_display = ['merchant', 'user', 'type', 'amount', 'interval_days', 'occurrences', 'next_date', 'confidence']
+    list_filter = ['type', 'user']
+    search_fields = ['merchant', 'description', 'user__username']
+    list_select_related = ['user']
+    ordering = ['next_date']
+    readonly_fields = ['detected_at']
+
+
+@admin.register(DuplicateCandidate)
+class DuplicateCandidateAdmin(admin.ModelAdmin):
+    list_display = ['duplicate', 'original', 'amount', 'account', 'user', 'similarity', 'dismissed']
+    list_filter = ['dismissed', 'user']
+    search_fields = ['original__description', 'duplicate__description', 'user__username']
+    list_select_related = ['user', 'account', 'original', 'duplicate']
+    ordering = ['-detected_at']
+    raw_id_fields = ['original', 'duplicate']
+    readonly_fields = ['detected_at']
+    actions = ['merge_duplicates', 'delete_duplicates', 'dismiss']
+
+    def amount(self, obj):
+        return obj.duplicate.amount
+    amount.admin_order_field = 'duplicate__amount'
+
+    @admin.action(description='Delete the duplicate transactions')
+    def delete_duplicates(self, request, queryset):
+        # The total would also count the cascaded rows, the selected pairs among them.
+        _, deleted = Transaction.objects.filter(pk__in=list(queryset.values_list('duplicate_id', flat=True))).delete()
+        self.message_user(request, f"{deleted.get('transaction.Transaction', 0)} transaction(s) deleted.")
+
+    @admin.action(description='Merge into the originals (copy the category, then delete the duplicates)')
+    def merge_duplicates(self, request, queryset):
+        pairs = queryset.filter(duplicate__budget_category__isnull=False)
+        with db_transaction.atomic():
+            pks, user_ids = owned_rows(
+                Transaction.objects.filter(pk__in=pairs.values('original'), budget_category__isnull=True)
+            )
+            Transaction.objects.filter(pk__in=pks).update(budget_category=Subquery(
+                pairs.filter(original=OuterRef('pk')).values('duplicate__budget_category')[:1]
+            ))
+            bulk_updated.send(sender=Transaction, pks=pks, user_ids=user_ids)
+            self.delete_duplicates(request, queryset)
+
+    @admin.action(description='Dismiss (not duplicates)')
+    def dismiss(self, request, queryset):
+        updated = queryset.update(dismissed=True)
+        self.message_user(request, f'{updated} pair(s) dismissed.')
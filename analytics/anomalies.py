@@ -0,0 +1,144 @@
+"""
+Spending anomalies per category.
+
+CategoryStats keeps count, mean and variance (Welford) and a decayed median
+estimate of each user's withdrawals per category. Every transaction write
+updates one row in O(1), so scoring a transaction never rescans history:
+its z-score is taken against the stats of all *other* withdrawals in its
+category, which Welford lets us back out in O(1) as well.
+"""
+
+import math
+
+import numpy as np
+from django.db import transaction as db_transaction
+
+from .models import CategoryStats
+from .recurring import group_medians
+
+MIN_COUNT = 5  # fewer earlier withdrawals than this are not enough to judge
+Z_THRESHOLD = 3.0
+MEDIAN_RATE = 0.05  # step of the median estimate, in standard deviations
+
+
+def welford_add(count, mean, m2, value):
+    count += 1
+    delta = value - mean
+    mean += delta / count
+    return count, mean, m2 + delta * (value - mean)
+
+
+def welford_remove(count, mean, m2, value):
+    if count <= 1:
+        return 0, 0.0, 0.0
+    count -= 1
+    old_mean = (mean * (count + 1) - value) / count
+    return count, old_mean, max(m2 - (value - old_mean) * (value - mean), 0.0)
+
+
+def add(stats, value):
+    stats.count, stats.mean, stats.m2 = welford_add(stats.count, stats.mean, stats.m2, value)
+    if stats.count == 1:
+        stats.median = value
+    else:
+        step = MEDIAN_RATE * math.sqrt(stats.m2 / (stats.count - 1))
+        stats.median += math.copysign(step, value - stats.median) if value != stats.median else 0.0
+
+
+def remove(stats, value):
+    # The median estimate cannot be unwound; it drifts back as new values arrive.
+    stats.count, stats.mean, stats.m2 = welford_remove(stats.count, stats.mean, stats.m2, value)
+
+
+def record(user_id, category_id, amount, removed=False):
+    """Add (or remove) one withdrawal amount to the user's stats for the category."""
+    if category_id is None:
+        return
+    with db_transaction.atomic():
+        stats = CategoryStats.objects.select_for_update().filter(user_id=user_id, category_id=category_id).first()
+        if stats is None:
+            if removed:
+                return
+            stats = CategoryStats(user_id=user_id, category_id=category_id)
+        if removed:
+            remove(stats, float(amount))
+        else:
+            add(stats, float(amount))
+        stats.save()
+
+
+def score(stats, amount):
+    """
+    Score a withdrawal already included in ``stats`` against the others.
+
+    Returns ``(z, is_anomaly)``; ``z`` is None while there are fewer than
+    ``MIN_COUNT`` other withdrawals or they do not vary.
+    """
+    value = float(amount)
+    count, mean, m2 = welford_remove(stats.count, stats.mean, stats.m2, value)
+    if count < MIN_COUNT or m2 <= 0:
+        return None, False
+    z = (value - mean) / math.sqrt(m2 / (count - 1))
+    return z, z >= Z_THRESHOLD
+
+
+def rebuild_stats(transactions):
+    """
+    Recompute CategoryStats from scratch for every (user, category) pair
+    in ``transactions`` (a Transaction queryset), in vectorized passes.
+    Returns the number of pairs written.
+    """
+    rows = list(
+        transactions.filter(type='withdrawal', budget_category__isnull=False)
+        .values_list('user_id', 'budget_category_id', 'amount')
+    )
+    categories = set(transactions.filter(budget_category__isnull=False).values_list('budget_category_id', flat=True))
+    if rows:
+        keys = np.array([(user_id, category_id) for user_id, category_id, _ in rows], np.int64)
+        values = np.array([float(amount) for _, _, amount in rows])
+        groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        counts = np.bincount(inverse)
+        means = np.bincount(inverse, weights=values) / counts
+        m2 = np.bincount(inverse, weights=(values - means[inverse]) ** 2)
+        medians = group_medians(values, inverse, len(groups))
+    else:
+        groups = np.empty((0, 2), np.int64)
+
+    with db_transaction.atomic():
+        # Categories belong to one user, so the category alone picks the row.
+        CategoryStats.objects.filter(category_id__in=categories).delete()
+        CategoryStats.objects.bulk_create([
+            CategoryStats(
+                user_id=int(user_id), category_id=int(category_id),
+                count=int(counts[index]), mean=float(means[index]), m2=float(m2[index]), median=float(medians[index]),
+            )
+            for index, (user_id, category_id) in enumerate(groups)
+        ])
+    return len(groups)
+
+
+def flagged(user_id, transactions):
+    """
+    Score ``transactions`` (the user's withdrawals) against their category
+    stats with one lookup, and return the anomalous ones as
+    ``(transaction, z, stats)``, most unusual first.
+    """
+    transactions = list(transactions.filter(type='withdrawal', budget_category__isnull=False))
+    stats = {
+        item.category_id: item
+        for item in CategoryStats.objects.filter(
+            user_id=user_id, category_id__in={transaction.budget_category_id for transaction in transactions},
+        )
+    }
+    results = []
+    for transaction in transactions:
+        category_stats = stats.get(transaction.budget_category_id)
+        if category_stats is None:
+            continue
+        z, is_anomaly = score(category_stats, transaction.amount)
+        if is_anomaly:
+            results.append((transaction, z, category_stats))
+    results.sort(key=lambda item: -item[1])
+    return results
+
@@ -0,0 +1,74 @@
+"""
+Duplicate transaction detection.
+
+Each account's transactions are sorted by (type, amount, date), so entries
+that could be the same one sit next to each other: a window slides over
+the sorted run and only compares transactions of equal amount at most
+``WINDOW`` apart. That is O(n log n) for the sort plus a few comparisons
+per transaction, instead of comparing every pair. Descriptions are
+compared with difflib; two transactions at the same normalized merchant
+count as identical.
+"""
+
+from datetime import timedelta
+from difflib import SequenceMatcher
+
+from django.db import transaction as db_transaction
+
+from transaction.models import Transaction
+from .models import DuplicateCandidate
+
+WINDOW = timedelta(days=3)
+SIMILARITY = 0.8
+
+
+def similarity(first, second):
+    """difflib ratio of two lowercased descriptions, skipping the full ratio when a bound already fails."""
+    matcher = SequenceMatcher(None, first.lower(), second.lower())
+    if matcher.real_quick_ratio() < SIMILARITY or matcher.quick_ratio() < SIMILARITY:
+        return 0.0
+    return matcher.ratio()
+
+
+def find_pairs(rows, window=WINDOW):
+    """
+    ``rows`` are one account's ``(id, type, amount, date, description,
+    merchant_id)``, sorted by (type, amount, date, id). Returns
+    ``(original_id, duplicate_id, similarity)`` for every likely pair.
+    """
+    pairs = []
+    for position, (first_id, kind, amount, when, description, merchant) in enumerate(rows):
+        # By index: a slice of the rest would copy O(n) rows per row.
+        for other in range(position + 1, len(rows)):
+            second_id, other_kind, other_amount, other_when, other_description, other_merchant = rows[other]
+            if other_kind != kind or other_amount != amount or other_when - when > window:
+                break
+            score = 1.0 if merchant is not None and merchant == other_merchant else similarity(description, other_description)
+            if score >= SIMILARITY:
+                pairs.append((first_id, second_id, round(score, 3)))
+    return pairs
+
+
+def detect_for_accounts(account_ids):
+    """
+    Replace the open (not dismissed) candidates of ``account_ids`` with the
+    pairs found now. Returns how many pairs were found.
+    """
+    rows = (
+        Transaction.objects.filter(account_id__in=account_ids)
+        .order_by('account', 'type', 'amount', 'date', 'id')
+        .values_list('account_id', 'user_id', 'id', 'type', 'amount', 'date', 'description', 'merchant_id')
+    )
+    accounts = {}
+    for account_id, user_id, *row in rows:
+        accounts.setdefault((account_id, user_id), []).append(row)
+    candidates = [
+        DuplicateCandidate(user_id=user_id, account_id=account_id, original_id=original, duplicate_id=duplicate, similarity=score)
+        for (account_id, user_id), account_rows in accounts.items()
+        for original, duplicate, score in find_pairs(account_rows)
+    ]
+    with db_transaction.atomic():
+        DuplicateCandidate.objects.filter(account_id__in=account_ids, dismissed=False).delete()
+        # Dismissed pairs stay and win over a re-detected one.
+        DuplicateCandidate.objects.bulk_create(candidates, ignore_conflicts=True)
+    return len(candidates)
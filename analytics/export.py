@@ -0,0 +1,185 @@
+"""
+Columnar export of transactions, accounts, budgets and categories.
+
+Rows are read with ``values_list(...).iterator()``, which streams from a
+server-side cursor on PostgreSQL, so no model instances are built and only
+one batch is held at a time. Each batch becomes one Arrow record batch,
+appended to a Parquet file (one row group per batch) or an Arrow IPC file.
+``stream`` yields the same Parquet, or the Arrow IPC stream format, as
+bytes batch by batch instead, for sending as it is produced. Columns and their Arrow types come from the model's concrete fields.
+Archived transactions (transaction.archive) are exported after the live
+ones, one year file at a time.
+
+pyarrow is optional; it is only imported when an export runs.
+"""
+
+from decimal import Decimal
+from itertools import islice
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.utils.dateparse import parse_datetime
+
+from account.models import Account
+from budget.models import Budget
+from category.models import Category
+from transaction.archive import read_year
+from transaction.models import ArchivedYear, Transaction
+
+TABLES = {'transactions': Transaction, 'accounts': Account, 'budgets': Budget, 'categories': Category}
+FORMATS = ('parquet', 'arrow')  # also the file extensions
+BATCH_SIZE = 100_000
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ImproperlyConfigured('Columnar export needs pyarrow; install it with "pip install pyarrow".')
+    return pyarrow
+
+
+def _arrow_type(pa, field):
+    if isinstance(field, models.ForeignKey):
+        return pa.int64()
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    if isinstance(field, (models.AutoField, models.BigAutoField, models.IntegerField)):
+        return pa.int64()
+    return pa.string()
+
+
+def schema(model):
+    pa = _pyarrow()
+    return pa.schema([pa.field(field.attname, _arrow_type(pa, field), nullable=field.null) for field in model._meta.concrete_fields])
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _archived_rows(fields, user_ids):
+    """Archived transactions as value tuples in ``fields`` order."""
+    years = ArchivedYear.objects.order_by('user', 'year')
+    if user_ids:
+        years = years.filter(user_id__in=user_ids)
+    for user_id, year in years.values_list('user_id', 'year'):
+        for row in read_year(user_id, year):
+            values = []
+            for field in fields:
+                value = row.get(field.name)
+                if value is not None and isinstance(field, models.DecimalField):
+                    value = Decimal(value)
+                elif value is not None and isinstance(field, models.DateTimeField):
+                    value = parse_datetime(value)
+                values.append(value)
+            yield tuple(values)
+
+
+def rows(model, user_ids=None, chunk_size=BATCH_SIZE):
+    """Value tuples of every row of ``model``, in ``schema(model)`` column order."""
+    fields = model._meta.concrete_fields
+    queryset = model._default_manager.order_by('pk')
+    if user_ids:
+        queryset = queryset.filter(user_id__in=user_ids)
+    yield from queryset.values_list(*[field.attname for field in fields]).iterator(chunk_size=chunk_size)
+    if model is Transaction:
+        yield from _archived_rows(fields, user_ids)
+
+
+def _record_batches(pa, rows, table_schema, batch_size):
+    for batch in _batches(rows, batch_size):
+        columns = zip(*batch)
+        yield pa.record_batch(
+            [pa.array(column, type=field.type) for column, field in zip(columns, table_schema)], schema=table_schema,
+        )
+
+
+def write(rows, out, table_schema, format='parquet', batch_size=BATCH_SIZE):
+    """
+    Write value tuples in ``table_schema`` column order to ``out``, a path or
+    binary file, ``batch_size`` rows per record batch. Returns the row count.
+    """
+    pa = _pyarrow()
+    if format == 'parquet':
+        writer = pa.parquet.ParquetWriter(out, table_schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(out, table_schema)
+    count = 0
+    with writer:
+        for record_batch in _record_batches(pa, rows, table_schema, batch_size):
+            writer.write_batch(record_batch)
+            count += record_batch.num_rows
+    return count
+
+
+class _Chunks:
+    """A write-only binary file that keeps what is written until ``take()``."""
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _stream(pa, model, format, user_ids, batch_size):
+    table_schema = schema(model)
+    sink = _Chunks()
+    if format == 'parquet':
+        writer = pa.parquet.ParquetWriter(sink, table_schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_stream(sink, table_schema)
+    with writer:
+        for record_batch in _record_batches(pa, rows(model, user_ids, batch_size), table_schema, batch_size):
+            writer.write_batch(record_batch)
+            yield sink.take()
+    yield sink.take()  # the Parquet footer or the end-of-stream marker
+
+
+def stream(table, format='parquet', user_ids=None, batch_size=BATCH_SIZE):
+    """
+    ``table`` as an iterator of bytes, one chunk per record batch as soon as
+    it is written: Parquet, or the Arrow IPC stream format (read it with
+    ``pyarrow.ipc.open_stream``) for ``format='arrow'``. Raises
+    ImproperlyConfigured without pyarrow before anything is produced.
+    """
+    return _stream(_pyarrow(), TABLES[table], format, user_ids, batch_size)
+
+
+def export(table, out, format='parquet', user_ids=None, batch_size=BATCH_SIZE):
+    """
+    Write ``table`` (a key of TABLES) to ``out``, a path or binary file, as
+    Parquet or Arrow IPC. Returns the number of rows written.
+    """
+    model = TABLES[table]
+    return write(rows(model, user_ids, batch_size), out, schema(model), format, batch_size)
@@ -0,0 +1,136 @@
+"""
+Cash-flow forecast.
+
+Each account's balance is projected day by day from its current balance,
+the recurring series detected for it (analytics.recurring), and the
+average daily spend per category over the last ``LOOKBACK_DAYS`` of
+withdrawals that are not part of a series, summed in integer cents over
+the user's ledger (analytics.ledger). The projection is built as an
+(accounts x days) array of integer cents: recurring flows are scattered
+onto their due days, everything is cumulated along the day axis, and the
+discretionary spend is subtracted as a straight line.
+"""
+
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from account.models import Account
+from category.models import Category
+from dashboard.memo import memoize
+from .ledger import WITHDRAWAL, group_totals, load_ledger, money, to_cents, to_day
+from .models import RecurringSeries
+from .recurring import normalize_description
+
+LOOKBACK_DAYS = 90
+MIN_SPAN_DAYS = 7
+
+# Data the forecast is computed from. 'recurring' is bumped by
+# analytics.recurring.detect_for_user.
+VERSION_SCOPES = ('accounts', 'categories', 'transactions', 'recurring')
+
+
+def project(balances, flow_accounts, flow_offsets, flow_intervals, flow_cents, daily_spend, days):
+    """
+    Return the (accounts, days) int64 array of projected end-of-day balances
+    in cents, for day 1 (tomorrow) to ``days``.
+
+    Flow ``i`` adds ``flow_cents[i]`` to account ``flow_accounts[i]`` on day
+    index ``flow_offsets[i]`` (0 is tomorrow) and every ``flow_intervals[i]``
+    days after. ``daily_spend`` is each account's spend per day in cents.
+    """
+    flows = np.zeros((len(balances), days), np.int64)
+    if len(flow_cents):
+        repeats = int(np.max((days - 1 - flow_offsets) // flow_intervals)) + 1
+        offsets = flow_offsets[:, None] + np.arange(max(repeats, 1))[None, :] * flow_intervals[:, None]
+        due = (offsets >= 0) & (offsets < days)
+        rows = np.broadcast_to(flow_accounts[:, None], offsets.shape)
+        amounts = np.broadcast_to(flow_cents[:, None], offsets.shape)
+        np.add.at(flows, (rows[due], offsets[due]), amounts[due])
+    spend = np.rint(daily_spend[:, None] * np.arange(1, days + 1)[None, :]).astype(np.int64)
+    return balances[:, None] + np.cumsum(flows, axis=1) - spend
+
+
+def forecast_for_user(user_id, days, today=None):
+    today = today or timezone.localdate()
+    accounts = list(Account.objects.filter(user_id=user_id).order_by('id').values('id', 'name_account', 'balance'))
+    index = {account['id']: position for position, account in enumerate(accounts)}
+    balances = np.array([to_cents(account['balance']) for account in accounts], np.int64)
+
+    series = [
+        item for item in RecurringSeries.objects.filter(user_id=user_id)
+        .values('account', 'merchant', 'type', 'amount', 'interval_days', 'next_date')
+        if item['account'] in index
+    ]
+    intervals = np.array([item['interval_days'] for item in series], np.int64)
+    # Day index of the next occurrence; overdue series are rolled forward.
+    offsets = np.array([(item['next_date'] - today).days - 1 for item in series], np.int64)
+    overdue = offsets < 0
+    offsets[overdue] += -(offsets[overdue] // intervals[overdue]) * intervals[overdue]
+    signs = np.array([1 if item['type'] == 'deposit' else -1 for item in series], np.int64)
+    cents = signs * np.array([to_cents(item['amount']) for item in series], np.int64)
+
+    # Discretionary spend: recent withdrawals that are not part of a series.
+    since = timezone.make_aware(datetime.combine(today - timedelta(days=LOOKBACK_DAYS - 1), time.min))
+    ledger = load_ledger(user_id, start=since, normalize=normalize_description)
+    rows = ledger.rows
+    recurring = np.isin(ledger.descriptions, [item['merchant'] for item in series if item['type'] == 'withdrawal'])
+    known = np.isin(ledger.accounts, list(index))
+    rows = rows[(rows['type'] == WITHDRAWAL) & ~recurring[rows['description']] & known[rows['account']]]
+    keys, totals, _ = group_totals(rows, ('account', 'category'))
+    account_ids = ledger.accounts[keys['account']]
+    category_ids = ledger.categories[keys['category']]
+    names = dict(Category.objects.filter(id__in=category_ids.tolist()).values_list('id', 'name'))
+    earliest = int(rows['day'].min()) if len(rows) else to_day(today)
+    span = max(MIN_SPAN_DAYS, to_day(today) - earliest + 1)
+    daily_spend = np.zeros(len(accounts))
+    np.add.at(daily_spend, np.array([index[account_id] for account_id in account_ids.tolist()], np.int64), totals / span)
+    per_category = sorted(
+        zip(account_ids.tolist(), category_ids.tolist(), totals.tolist()), key=lambda item: -item[2],
+    )
+
+    projected = project(
+        balances,
+        np.array([index[item['account']] for item in series], np.int64),
+        offsets, intervals, cents, daily_spend, days,
+    )
+    dates = [today + timedelta(days=day) for day in range(1, days + 1)]
+    result_accounts = []
+    for position, account in enumerate(accounts):
+        low = int(np.argmin(projected[position]))
+        result_accounts.append({
+            'id': account['id'],
+            'name_account': account['name_account'],
+            'balance': money(balances[position]),
+            'projected': [money(value) for value in projected[position]],
+            'lowest': {'date': dates[low], 'balance': money(projected[position, low])},
+        })
+    return {
+        'start': dates[0],
+        'days': days,
+        'dates': dates,
+        'accounts': result_accounts,
+        'total': [money(value) for value in projected.sum(axis=0)],
+        'daily_spend': [
+            {
+                'account': account_id,
+                'category': category_id or None,
+                'category_name': names.get(category_id),
+                'amount': money(round(total / span)),
+            }
+            for account_id, category_id, total in per_category
+        ],
+        'recurring_series': len(series),
+    }
+
+
+_memoized_forecast = memoize('forecast', VERSION_SCOPES)(forecast_for_user)
+
+
+def cached_forecast(user_id, days):
+    """
+    ``forecast_for_user``, cached until the user's accounts, categories,
+    transactions or recurring series change, or the day rolls over.
+    """
+    return _memoized_forecast(user_id, days, timezone.localdate())
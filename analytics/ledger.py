@@ -0,0 +1,158 @@
+"""
+In-memory ledger of a user's transactions.
+
+``load_ledger`` reads the transactions with one ``values_list`` query into
+a NumPy structured array of integer cents, local days and small integer
+codes for account, category, type and (optionally) normalized description.
+Amounts are turned into cents by the database, so no Decimal or float is
+built per row, and every sum below is int64 arithmetic: exact to the cent.
+
+The helpers are the shared vectorized building blocks of the analytics
+features (recurring detection, forecast, trend): grouped sums, dense
+per-day and per-month series, running totals and rolling windows.
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import NamedTuple
+
+import numpy as np
+from django.db.models import BigIntegerField, Case, F, IntegerField, Value, When
+from django.db.models.functions import Cast, Coalesce, Round, TruncDate
+from numpy.lib import recfunctions
+
+from transaction.models import Transaction
+
+EPOCH = date(1970, 1, 1)
+
+WITHDRAWAL, DEPOSIT = 0, 1  # values of the 'type' field
+
+LEDGER_DTYPE = np.dtype([
+    ('id', np.int64),
+    ('cents', np.int64),  # amount in integer cents, as stored (never negative for normal data)
+    ('day', np.int32),  # local date, as days since 1970-01-01
+    ('account', np.int32),  # index into Ledger.accounts
+    ('category', np.int32),  # index into Ledger.categories
+    ('type', np.int8),  # WITHDRAWAL or DEPOSIT
+    ('description', np.int32),  # index into Ledger.descriptions; 0 when not loaded
+])
+
+
+class Ledger(NamedTuple):
+    rows: np.ndarray  # LEDGER_DTYPE, ordered by (date, id)
+    accounts: np.ndarray  # account id of each account code
+    categories: np.ndarray  # category id of each category code; 0 stands for uncategorized
+    descriptions: np.ndarray  # normalized description of each description code
+
+    @property
+    def signed_cents(self):
+        """Amounts with withdrawals negative."""
+        return np.where(self.rows['type'] == DEPOSIT, self.rows['cents'], -self.rows['cents'])
+
+
+def money(cents):
+    """Integer cents as a decimal string: 1234 -> '12.34'."""
+    return str(Decimal(int(cents)).scaleb(-2))
+
+
+def to_cents(amount):
+    return int(amount.scaleb(2))
+
+
+def to_day(value):
+    return (value - EPOCH).days
+
+
+def from_day(day):
+    return EPOCH + timedelta(days=int(day))
+
+
+def load_ledger(user_id, start=None, end=None, normalize=None):
+    """
+    The user's transactions dated from ``start`` up to, not including,
+    ``end`` (either may be None). With ``normalize``, a function of a
+    description, descriptions are coded by their normalized text; it runs
+    once per distinct description.
+    """
+    transactions = Transaction.objects.filter(user_id=user_id)
+    if start is not None:
+        transactions = transactions.filter(date__gte=start)
+    if end is not None:
+        transactions = transactions.filter(date__lt=end)
+    fields = ['id', 'cents', 'day', 'account', 'category', 'deposit']
+    if normalize is not None:
+        fields.append('description')
+    rows = list(
+        transactions.annotate(
+            cents=Cast(Round(F('amount') * 100), BigIntegerField()),
+            day=TruncDate('date'),
+            category=Coalesce('budget_category', 0),
+            deposit=Case(When(type='deposit', then=Value(DEPOSIT)), default=Value(WITHDRAWAL), output_field=IntegerField()),
+        )
+        .order_by('date', 'id')
+        .values_list(*fields)
+    )
+
+    ledger = np.zeros(len(rows), LEDGER_DTYPE)
+    if not rows:
+        empty = np.empty(0, np.int64)
+        return Ledger(ledger, empty, empty, np.empty(0, str))
+    columns = dict(zip(fields, zip(*rows)))
+    ledger['id'] = columns['id']
+    ledger['cents'] = columns['cents']
+    ledger['day'] = np.array(columns['day'], 'datetime64[D]').astype(np.int64)
+    ledger['type'] = columns['deposit']
+    accounts, ledger['account'] = np.unique(np.array(columns['account'], np.int64), return_inverse=True)
+    categories, ledger['category'] = np.unique(np.array(columns['category'], np.int64), return_inverse=True)
+    descriptions = np.empty(0, str)
+    if normalize is not None:
+        texts, text_codes = np.unique(columns['description'], return_inverse=True)
+        descriptions, normalized_codes = np.unique([normalize(text) for text in texts], return_inverse=True)
+        ledger['description'] = normalized_codes[text_codes]
+    return Ledger(ledger, accounts, categories, descriptions)
+
+
+def group_sums(values, groups, count):
+    """Sum of the int64 ``values`` within each group ``0..count-1``, exactly."""
+    sums = np.zeros(count, np.int64)
+    np.add.at(sums, groups, values)
+    return sums
+
+
+def group_totals(rows, fields, values=None):
+    """
+    ``values`` (default ``rows['cents']``) summed over ``rows`` grouped by
+    the ledger ``fields``. Returns ``(keys, sums, counts)``: the distinct
+    field combinations as a structured array, sorted, and per key the sum
+    and the number of rows.
+    """
+    if values is None:
+        values = rows['cents']
+    keys, groups = np.unique(recfunctions.repack_fields(rows[list(fields)]), return_inverse=True)
+    return keys, group_sums(values, groups, len(keys)), np.bincount(groups, minlength=len(keys))
+
+
+def daily_totals(rows, first_day, days, values=None):
+    """Dense per-day sums of ``values`` (default ``rows['cents']``) for ``days`` days from ``first_day``."""
+    if values is None:
+        values = rows['cents']
+    offsets = rows['day'].astype(np.int64) - first_day
+    inside = (offsets >= 0) & (offsets < days)
+    return group_sums(values[inside], offsets[inside], days)
+
+
+def month_index(days):
+    """Months since January 1970 of each day number."""
+    return np.asarray(days).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+def month_start(index):
+    year, month = divmod(int(index), 12)
+    return date(1970 + year, month + 1, 1)
+
+
+def rolling_sums(values, window):
+    """Sum of each value and the ``window - 1`` before it (fewer at the start), exactly."""
+    totals = np.cumsum(values, dtype=np.int64)
+    totals[window:] -= totals[:-window].copy()
+    return totals
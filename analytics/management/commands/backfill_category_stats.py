@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from analytics.anomalies import rebuild_stats
+from transaction.models import Transaction
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-category spending statistics used for anomaly detection from existing transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, nargs='+', dest='users', help='Only these user ids.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Users per vectorized pass.')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(transactions__isnull=False).distinct().order_by('id')
+        if options['users']:
+            users = users.filter(id__in=options['users'])
+        user_ids = list(users.values_list('id', flat=True))
+        size = options['batch_size']
+        written = 0
+        for start in range(0, len(user_ids), size):
+            written += rebuild_stats(Transaction.objects.filter(user_id__in=user_ids[start:start + size]))
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} category statistics for {len(user_ids)} user(s).'))
@@ -0,0 +1,35 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from account.models import Account
+from analytics.duplicates import detect_for_accounts
+from analytics.recurring import init_worker
+
+
+class Command(BaseCommand):
+    help = 'Find likely duplicate transactions in every account and record them for review in the admin.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, nargs='+', dest='accounts', help='Only these account ids.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes; 0 runs in this process.')
+        parser.add_argument('--chunk-size', type=int, default=100, help='Accounts per task.')
+
+    def handle(self, *args, **options):
+        accounts = Account.objects.filter(transactions__isnull=False).distinct().order_by('id')
+        if options['accounts']:
+            accounts = accounts.filter(id__in=options['accounts'])
+        account_ids = list(accounts.values_list('id', flat=True))
+        size = options['chunk_size']
+        chunks = [account_ids[start:start + size] for start in range(0, len(account_ids), size)]
+
+        if options['workers'] == 0:
+            found = sum(map(detect_for_accounts, chunks))
+        else:
+            # Forked workers must not share the parent's open connections.
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers'], initializer=init_worker) as pool:
+                found = sum(pool.map(detect_for_accounts, chunks))
+        self.stdout.write(self.style.SUCCESS(f'Found {found} likely duplicate(s) in {len(account_ids)} account(s).'))
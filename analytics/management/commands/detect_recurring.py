@@ -0,0 +1,34 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from analytics.recurring import detect_for_users, init_worker
+
+
+class Command(BaseCommand):
+    help = 'Detect recurring transactions for every user with transactions, in a process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, nargs='+', dest='users', help='Only these user ids.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes; 0 runs in this process.')
+        parser.add_argument('--chunk-size', type=int, default=50, help='Users per task.')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(transactions__isnull=False).distinct().order_by('id')
+        if options['users']:
+            users = users.filter(id__in=options['users'])
+        user_ids = list(users.values_list('id', flat=True))
+        size = options['chunk_size']
+        chunks = [user_ids[start:start + size] for start in range(0, len(user_ids), size)]
+
+        if options['workers'] == 0:
+            found = sum(map(detect_for_users, chunks))
+        else:
+            # Forked workers must not share the parent's open connections.
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers'], initializer=init_worker) as pool:
+                found = sum(pool.map(detect_for_users, chunks))
+        self.stdout.write(self.style.SUCCESS(f'Detected {found} recurring series for {len(user_ids)} user(s).'))
@@ -0,0 +1,31 @@
+import time
+from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.export import BATCH_SIZE, FORMATS, TABLES, export
+
+
+class Command(BaseCommand):
+    help = 'Export transactions, accounts, budgets and categories to Parquet or Arrow IPC files (needs pyarrow).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Directory for the files, one per table.')
+        parser.add_argument('--format', choices=FORMATS, default='parquet')
+        parser.add_argument('--table', choices=list(TABLES), nargs='+', dest='tables', default=list(TABLES))
+        parser.add_argument('--user', type=int, nargs='+', dest='users', help='Only these user ids.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows per fetch and per row group.')
+
+    def handle(self, *args, **options):
+        output = Path(options['output'])
+        output.mkdir(parents=True, exist_ok=True)
+        for table in options['tables']:
+            path = output / f"{table}.{options['format']}"
+            start = time.perf_counter()
+            try:
+                count = export(table, str(path), options['format'], options['users'], options['batch_size'])
+            except ImproperlyConfigured as error:
+                raise CommandError(str(error))
+            self.stdout.write(f'{table}: {count} row(s) to {path} in {time.perf_counter() - start:.1f}s')
+        self.stdout.write(self.style.SUCCESS('Export finished.'))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('account', '0002_account_user'),
+        ('category', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('merchant', models.CharField(max_length=100)),
+                ('description', models.CharField(max_length=255)),
+                ('type', models.CharField(choices=[('deposit', 'Deposit'), ('withdrawal', 'Withdrawal')], max_length=50)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('interval_days', models.PositiveIntegerField()),
+                ('occurrences', models.PositiveIntegerField()),
+                ('last_date', models.DateField()),
+                ('next_date', models.DateField()),
+                ('confidence', models.FloatField()),
+                ('detected_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_series', to='account.account')),
+                ('budget_category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recurring_series', to='category.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_series', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'merchant', 'type'), name='recurring_series_unique_merchant')],
+            },
+        ),
+    ]
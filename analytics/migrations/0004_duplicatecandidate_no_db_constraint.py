@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_duplicatecandidate'),
+        ('transaction', '0006_transaction_merchant'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='duplicatecandidate',
+            name='duplicate',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='transaction.transaction'),
+        ),
+        migrations.AlterField(
+            model_name='duplicatecandidate',
+            name='original',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_candidates', to='transaction.transaction'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+from django.db import models
+from django.contrib.auth.models import User
+from account.models import Account
+from category.models import Category
+from transaction.models import Transaction
+
+
+class RecurringSeries(models.Model):
+    """A subscription, bill or paycheck found by analytics.recurring."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_series')
+    merchant = models.CharField(max_length=100)  # normalized description shared by the series
+    description = models.CharField(max_length=255)  # description of the latest occurrence
+    type = models.CharField(max_length=50, choices=[('deposit', 'Deposit'), ('withdrawal', 'Withdrawal')])
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='recurring_series')  # account of the latest occurrence
+    budget_category = models.ForeignKey(Category, on_delete=models.SET_NULL, related_name='recurring_series', blank=True, null=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)  # median amount
+    interval_days = models.PositiveIntegerField()  # median days between occurrences
+    occurrences = models.PositiveIntegerField()
+    last_date = models.DateField()
+    next_date = models.DateField()  # expected date of the next occurrence
+    confidence = models.FloatField()  # 0..1, regularity of dates and amounts
+    detected_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'merchant', 'type'], name='recurring_series_unique_merchant'),
+        ]
+
+    def __str__(self):
+        return f"{self.merchant}: ${self.amount} every {self.interval_days} days"
+
+
+class CategoryStats(models.Model):
+    """
+    Running statistics of a user's withdrawals in one category, kept up to
+    date by analytics.anomalies on every transaction write.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='category_stats')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='stats')
+    count = models.PositiveIntegerField(default=0)
+    mean = models.FloatField(default=0)
+    m2 = models.FloatField(default=0)  # sum of squared deviations from the mean (Welford)
+    median = models.FloatField(default=0)  # exponentially decayed running estimate
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category'], name='category_stats_unique_category'),
+        ]
+
+    def __str__(self):
+        return f"{self.category_id}: n={self.count} mean={self.mean:.2f}"
+
+
+class DuplicateCandidate(models.Model):
+    """
+    Two transactions of one account that look like the same entry, found by
+    analytics.duplicates and kept for review in the admin. ``original`` is
+    the earlier of the two.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='duplicate_candidates')
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='duplicate_candidates')
+    # No database constraint: a partitioned transaction table cannot be
+    # referenced by id alone (see transaction/partitions.py). Deletes still
+    # cascade through the ORM.
+    original = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='duplicate_candidates', db_constraint=False)
+    duplicate = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='+', db_constraint=False)
+    similarity = models.FloatField()  # 0..1, of the descriptions
+    dismissed = models.BooleanField(default=False)  # reviewed and not a duplicate; kept so detection skips it
+    detected_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['original', 'duplicate'], name='duplicate_candidate_unique_pair'),
+        ]
+
+    def __str__(self):
+        return f"{self.duplicate_id} duplicates {self.original_id}"
@@ -0,0 +1,177 @@
+"""
+Recurring transaction detection.
+
+A user's history is loaded once into NumPy arrays (integer cents, epoch
+days, normalized-description codes; see analytics.ledger) and every
+merchant is scored in a few vectorized passes: transactions are sorted by
+(merchant, type, day), the gaps between consecutive days become the
+intervals, and per-group medians come from one more sort. A merchant
+whose intervals sit close to their median, at a steady amount, and which
+is still due, is a recurring series.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+from typing import NamedTuple
+
+import numpy as np
+from django import setup as django_setup
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from dashboard.versioning import bump
+from transaction.merchants import normalize_merchant
+from transaction.models import Transaction
+from .ledger import DEPOSIT, EPOCH, load_ledger
+from .models import RecurringSeries
+
+MIN_OCCURRENCES = 3
+MIN_INTERVAL = 6  # days; anything more frequent is habit, not a bill
+MAX_INTERVAL = 400
+REGULARITY = 0.75  # share of intervals within tolerance of the median
+AMOUNT_SPREAD = 0.25  # largest median absolute deviation, relative to the median amount
+
+
+def normalize_description(description):
+    """
+    The merchant name of ``description`` (transaction.merchants), so series
+    line up with Merchant rows: 'NETFLIX.COM 8843' -> 'netflix'. Falls back
+    to the lowercased description when it names nothing recognizable.
+    """
+    return normalize_merchant(description) or description.lower().strip()[:100]
+
+
+class History(NamedTuple):
+    ids: np.ndarray  # transaction ids
+    cents: np.ndarray  # amounts in integer cents
+    days: np.ndarray  # local dates as days since 1970-01-01
+    codes: np.ndarray  # index into merchants
+    deposits: np.ndarray  # True for deposits
+    merchants: np.ndarray  # normalized descriptions
+
+
+def load_history(user_id):
+    ledger = load_ledger(user_id, normalize=normalize_description)
+    return History(
+        ids=ledger.rows['id'],
+        cents=ledger.rows['cents'],
+        days=ledger.rows['day'].astype(np.int64),
+        codes=ledger.rows['description'].astype(np.int64),
+        deposits=ledger.rows['type'] == DEPOSIT,
+        merchants=ledger.descriptions,
+    )
+
+
+def group_medians(values, groups, count):
+    """Median of ``values`` within each group ``0..count-1``; every group must be non-empty."""
+    ordered = values[np.lexsort((values, groups))].astype(np.float64)
+    sizes = np.bincount(groups, minlength=count)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    return (ordered[starts + (sizes - 1) // 2] + ordered[starts + sizes // 2]) / 2
+
+
+def detect(history, today=None):
+    """
+    Return a dict per recurring series in ``history``: merchant, type,
+    amount, interval_days, occurrences, last_date, next_date, confidence
+    and the id of its latest transaction (``last_id``).
+    """
+    if len(history.ids) < MIN_OCCURRENCES:
+        return []
+    today = ((today or timezone.localdate()) - EPOCH).days
+
+    key = history.codes * 2 + history.deposits
+    order = np.lexsort((history.ids, history.days, key))
+    key, days, cents, ids = key[order], history.days[order], history.cents[order], history.ids[order]
+
+    boundary = key[1:] != key[:-1]
+    group = np.concatenate(([0], np.cumsum(boundary)))
+    group_count = group[-1] + 1
+    sizes = np.bincount(group, minlength=group_count)
+    last_index = np.flatnonzero(np.concatenate((boundary, [True])))
+
+    # Intervals between consecutive days of the same group; several
+    # transactions on one day count as one occurrence.
+    gaps = np.diff(days)
+    in_group = ~boundary & (gaps > 0)
+    intervals, interval_group = gaps[in_group], group[1:][in_group]
+    interval_counts = np.bincount(interval_group, minlength=group_count)
+
+    candidates = np.flatnonzero(interval_counts >= MIN_OCCURRENCES - 1)
+    if not len(candidates):
+        return []
+    relabel = np.full(group_count, -1)
+    relabel[candidates] = np.arange(len(candidates))
+    count = len(candidates)
+
+    keep = relabel[interval_group] >= 0
+    intervals, interval_group = intervals[keep], relabel[interval_group[keep]]
+    period = group_medians(intervals, interval_group, count)
+    tolerance = np.maximum(2.0, 0.15 * period)
+    close = np.abs(intervals - period[interval_group]) <= tolerance[interval_group]
+    regularity = np.bincount(interval_group, weights=close, minlength=count) / np.bincount(interval_group, minlength=count)
+
+    keep = relabel[group] >= 0
+    amounts, amount_group = cents[keep], relabel[group[keep]]
+    typical = group_medians(amounts, amount_group, count)
+    deviation = group_medians(np.abs(amounts - typical[amount_group]), amount_group, count)
+    spread = np.divide(deviation, typical, out=np.ones(count), where=typical > 0)
+
+    last_day = days[last_index][candidates]
+    recurring = (
+        (period >= MIN_INTERVAL) & (period <= MAX_INTERVAL)
+        & (regularity >= REGULARITY)
+        & (spread <= AMOUNT_SPREAD)
+        # Stopped series: more than two periods overdue.
+        & (today - last_day <= 2 * period + tolerance)
+    )
+
+    series = []
+    for index in np.flatnonzero(recurring):
+        group_key = key[last_index[candidates[index]]]
+        interval = int(round(period[index]))
+        series.append({
+            'merchant': str(history.merchants[group_key // 2]),
+            'type': 'deposit' if group_key % 2 else 'withdrawal',
+            'amount': Decimal(int(round(typical[index]))).scaleb(-2),
+            'interval_days': interval,
+            'occurrences': int(sizes[candidates[index]]),
+            'last_date': EPOCH + timedelta(days=int(last_day[index])),
+            'next_date': EPOCH + timedelta(days=int(last_day[index]) + interval),
+            'confidence': round(float(regularity[index] * (1 - min(spread[index], 1.0))), 3),
+            'last_id': int(ids[last_index[candidates[index]]]),
+        })
+    return series
+
+
+def detect_for_user(user_id, today=None):
+    """Detect the user's recurring series and replace the stored ones. Returns how many were found."""
+    series = detect(load_history(user_id), today)
+    latest = Transaction.objects.in_bulk([item['last_id'] for item in series])
+    with db_transaction.atomic():
+        RecurringSeries.objects.filter(user_id=user_id).delete()
+        RecurringSeries.objects.bulk_create([
+            RecurringSeries(
+                user_id=user_id,
+                description=latest[item['last_id']].description,
+                account_id=latest[item['last_id']].account_id,
+                budget_category_id=latest[item['last_id']].budget_category_id,
+                **{field: value for field, value in item.items() if field != 'last_id'},
+            )
+            for item in series
+        ])
+    bump([user_id], 'recurring')
+    return len(series)
+
+
+def init_worker():
+    """
+    ProcessPoolExecutor initializer. Workers open their own database
+    connections, which close when the pool shuts the worker down.
+    """
+    django_setup()
+
+
+def detect_for_users(user_ids):
+    """Run ``detect_for_user`` for a chunk of users. Returns how many series were found."""
+    return sum(detect_for_user(user_id) for user_id in user_ids)
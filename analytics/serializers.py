@@ -0,0 +1,16 @@
+from rest_framework import serializers
+from backend.metrics import TimedSerializerMixin
+from dashboard.lookups import CachedNameField
+from .models import RecurringSeries
+
+
+class RecurringSeriesSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    account_name = CachedNameField('accounts', source='account.name_account')
+    budget_category_name = CachedNameField('categories', source='budget_category.name')
+
+    class Meta:
+        model = RecurringSeries
+        fields = ['id', 'merchant', 'description', 'type', 'account', 'account_name', 'budget_category',
+                  'budget_category_name', 'amount', 'interval_days', 'occurrences', 'last_date', 'next_date',
+                  'confidence', 'detected_at']
+        read_only_fields = fields
@@ -0,0 +1,52 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from dashboard.signals import bulk_updated
+from transaction.models import Transaction
+from .anomalies import rebuild_stats, record
+
+
+def remember_previous(sender, instance, **kwargs):
+    # An update has to take the old amount out of the stats before adding
+    # the new one: as loaded (Transaction.from_db) or last saved, or, for
+    # an instance loaded with deferred fields, as stored.
+    instance._stats_previous = None
+    if not instance._state.adding:
+        instance._stats_previous = getattr(instance, '_loaded_stats', None)
+        if instance._stats_previous is None:
+            instance._stats_previous = (
+                Transaction.objects.filter(pk=instance.pk)
+                .values_list('user_id', 'budget_category_id', 'amount', 'type').first()
+            )
+
+
+def update_category_stats(sender, instance, update_fields=None, **kwargs):
+    previous = getattr(instance, '_stats_previous', None)
+    current = (instance.user_id, instance.budget_category_id, instance.amount, instance.type)
+    # A partial save may have left some of the in-memory values unsaved.
+    instance._loaded_stats = current if update_fields is None else None
+    if previous == current:
+        return
+    if previous is not None and previous[3] == 'withdrawal':
+        record(previous[0], previous[1], previous[2], removed=True)
+    if instance.type == 'withdrawal':
+        record(instance.user_id, instance.budget_category_id, instance.amount)
+
+
+def remove_from_category_stats(sender, instance, **kwargs):
+    if instance.type == 'withdrawal':
+        record(instance.user_id, instance.budget_category_id, instance.amount, removed=True)
+
+
+def rebuild_category_stats(sender, pks, **kwargs):
+    # The bulk updates change the type of rows or categorize uncategorized
+    # ones, never take rows out of a category, so the categories the
+    # updated rows are in now are all the ones whose stats changed.
+    if sender is Transaction:
+        updated = Transaction.objects.filter(pk__in=pks)
+        rebuild_stats(Transaction.objects.filter(budget_category__in=updated.values('budget_category')))
+
+
+pre_save.connect(remember_previous, sender=Transaction, dispatch_uid='category-stats-previous')
+post_save.connect(update_category_stats, sender=Transaction, dispatch_uid='category-stats-save')
+post_delete.connect(remove_from_category_stats, sender=Transaction, dispatch_uid='category-stats-delete')
+bulk_updated.connect(rebuild_category_stats, dispatch_uid='category-stats-bulk')
@@ -0,0 +1,531 @@
+import random
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from importlib.util import find_spec
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
+
+import numpy as np
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from account.models import Account
+from analytics.admin import DuplicateCandidateAdmin
+from analytics.duplicates import find_pairs
+from analytics.export import stream
+from analytics.forecast import project
+from analytics.ledger import (
+    DEPOSIT, daily_totals, from_day, group_sums, group_totals, load_ledger, month_index, rolling_sums, to_cents, to_day,
+)
+from analytics.models import CategoryStats, DuplicateCandidate, RecurringSeries
+from analytics.recurring import EPOCH, History, detect, normalize_description
+from category.models import Category, CategoryRule
+from category.rules import apply_rules
+from transaction.admin import TransactionAdmin
+from transaction.models import Transaction, TransactionRollup
+
+TODAY = date(2026, 6, 15)
+
+
+def history(rows):
+    """rows: (description, cents, date, type)."""
+    merchants, codes = np.unique([normalize_description(row[0]) for row in rows], return_inverse=True)
+    return History(
+        ids=np.arange(1, len(rows) + 1),
+        cents=np.array([row[1] for row in rows]),
+        days=np.array([(row[2] - EPOCH).days for row in rows]),
+        codes=codes,
+        deposits=np.array([row[3] == 'deposit' for row in rows]),
+        merchants=merchants,
+    )
+
+
+class DetectTests(SimpleTestCase):
+    def test_finds_subscriptions_and_paychecks(self):
+        rows = []
+        for month in range(1, 7):
+            rows.append((f'NETFLIX.COM {month}8843', 1599, date(2026, month, 3), 'withdrawal'))
+        for week in range(0, 24, 2):
+            rows.append(('ACME PAYROLL', 250000 + week, date(2026, 1, 2) + timedelta(weeks=week), 'deposit'))
+        rng = np.random.default_rng(0)
+        for day in sorted(rng.choice(160, 40, replace=False)):
+            rows.append(('Corner Market', int(rng.integers(500, 9000)), date(2026, 1, 1) + timedelta(days=int(day)), 'withdrawal'))
+
+        series = {item['merchant']: item for item in detect(history(rows), TODAY)}
+        self.assertEqual(set(series), {'netflix', 'acme payroll'})
+        self.assertEqual(series['netflix']['amount'], Decimal('15.99'))
+        self.assertEqual(series['netflix']['interval_days'], 31)
+        self.assertEqual(series['netflix']['next_date'], date(2026, 7, 4))
+        self.assertEqual((series['acme payroll']['type'], series['acme payroll']['interval_days']), ('deposit', 14))
+
+    def test_ignores_stopped_series(self):
+        rows = [('Gym', 4000, date(2025, month, 1), 'withdrawal') for month in range(1, 6)]
+        self.assertEqual(detect(history(rows), TODAY), [])
+
+    def test_same_day_repeats_count_once(self):
+        rows = [('Spotify', 999, date(2026, month, 10), 'withdrawal') for month in range(1, 7)]
+        rows.append(('Spotify', 999, date(2026, 3, 10), 'withdrawal'))
+        self.assertEqual(detect(history(rows), TODAY)[0]['interval_days'], 31)
+
+
+class RecurringSeriesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='recurring_user', password='test123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('0.00'), user=self.user)
+        today = timezone.localdate()
+        for months_ago in range(6):
+            transaction = Transaction.objects.create(
+                user=self.user, amount=Decimal('15.99'), description='NETFLIX.COM', account=self.account, type='withdrawal',
+            )
+            when = timezone.make_aware(datetime.combine(today - timedelta(days=30 * months_ago), time(12)))
+            Transaction.objects.filter(pk=transaction.pk).update(date=when)
+
+    def test_detect_action(self):
+        response = self.client.post('/api/recurring/detect/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['merchant'], 'netflix')
+        # Series are named like the Merchant rows their transactions point at.
+        self.assertEqual(Transaction.objects.filter(merchant__name='netflix').count(), 6)
+        self.assertEqual(response.data[0]['account_name'], 'Checking')
+        self.assertEqual(self.client.get('/api/recurring/').data['count'], 1)
+
+    def test_command_replaces_series(self):
+        call_command('detect_recurring', workers=0, stdout=StringIO())
+        call_command('detect_recurring', workers=0, stdout=StringIO())
+        self.assertEqual(RecurringSeries.objects.filter(user=self.user).count(), 1)
+
+
+class ProjectTests(SimpleTestCase):
+    def test_flows_and_daily_spend(self):
+        projected = project(
+            balances=np.array([10000, 0]),
+            flow_accounts=np.array([0, 1]),
+            flow_offsets=np.array([1, 0]),
+            flow_intervals=np.array([3, 30]),
+            flow_cents=np.array([-1000, 50000]),
+            daily_spend=np.array([100.0, 0.0]),
+            days=7,
+        )
+        self.assertEqual(projected[0].tolist(), [9900, 8800, 8700, 8600, 7500, 7400, 7300])
+        self.assertEqual(projected[1].tolist(), [50000] * 7)
+
+
+class ForecastViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='forecast_user', password='test123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('1000.00'), user=self.user)
+        today = timezone.localdate()
+        RecurringSeries.objects.create(
+            user=self.user, merchant='acme payroll', description='ACME PAYROLL', type='deposit', account=self.account,
+            amount=Decimal('500.00'), interval_days=14, occurrences=10, last_date=today - timedelta(days=12),
+            next_date=today + timedelta(days=2), confidence=1.0,
+        )
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('70.00'), description='Groceries', account=self.account, type='withdrawal',
+        )
+
+    def test_forecast(self):
+        data = self.client.get('/api/forecast/', {'days': 14}).data
+        projected = data['accounts'][0]['projected']
+        self.assertEqual(len(projected), 14)
+        # Recent spend is spread over at least a week: 70.00 / 7 per day.
+        self.assertEqual(projected[0], '990.00')
+        self.assertEqual(projected[1], '1480.00')
+        self.assertEqual(data['daily_spend'][0]['amount'], '10.00')
+        self.assertEqual(data['accounts'][0]['lowest']['balance'], '990.00')
+
+    def test_cached_until_data_changes(self):
+        first = self.client.get('/api/forecast/', {'days': 30}).data
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/forecast/', {'days': 30}).data, first)
+        self.assertEqual(len(queries), 1)  # the data versions
+
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('7.00'), description='Coffee', account=self.account, type='withdrawal',
+        )
+        self.assertNotEqual(self.client.get('/api/forecast/', {'days': 30}).data, first)
+
+    def test_rejects_bad_days(self):
+        self.assertEqual(self.client.get('/api/forecast/', {'days': 1000}).status_code, 400)
+
+
+class RollingSumsTests(SimpleTestCase):
+    def test_matches_naive_sums(self):
+        rng = random.Random(0)
+        for trial in range(50):
+            values = [rng.randint(-10 ** 12, 10 ** 12) for _ in range(rng.randint(1, 40))]
+            window = rng.randint(1, 10)
+            with self.subTest(trial=trial):
+                expected = [sum(values[max(0, i - window + 1):i + 1]) for i in range(len(values))]
+                self.assertEqual(rolling_sums(np.array(values, np.int64), window).tolist(), expected)
+
+
+class LedgerTests(TestCase):
+    """Ledger sums against the same aggregates computed by the database, over random histories."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ledger_user', password='test123')
+        self.accounts = [
+            Account.objects.create(name_account=name, balance=Decimal('0.00'), user=self.user) for name in ['A', 'B']
+        ]
+        self.categories = [None] + [Category.objects.create(name=name, user=self.user) for name in ['Food', 'Rent']]
+        other = User.objects.create_user(username='ledger_other', password='test123')
+        Transaction.objects.create(
+            user=other, amount=Decimal('5.00'), description='Other', type='withdrawal',
+            account=Account.objects.create(name_account='Other', balance=Decimal('0.00'), user=other),
+        )
+
+    def _random_history(self, rng, count):
+        # Amounts that are inexact as binary floats, the largest the field holds, and random ones.
+        edges = ['0.01', '0.29', '0.57', '1.10', '99999999.99']
+        start = timezone.make_aware(datetime(2025, 1, 1))
+        Transaction.objects.filter(user=self.user).delete()
+        created = Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, account=rng.choice(self.accounts), budget_category=rng.choice(self.categories),
+                amount=Decimal(rng.choice(edges)) if rng.random() < 0.3 else Decimal(rng.randint(1, 99999999)).scaleb(-2),
+                type=rng.choice(['deposit', 'withdrawal']), description=f'T{index}',
+            )
+            for index in range(count)
+        ])
+        for transaction in created:
+            # Minutes from midnight matter: the day is the local one.
+            when = start + timedelta(days=rng.randint(0, 500), minutes=rng.choice([0, 1, 299, 300, 1439, rng.randint(0, 1439)]))
+            Transaction.objects.filter(pk=transaction.pk).update(date=when)
+
+    def test_matches_sql_aggregates(self):
+        rng = random.Random(1)
+        for trial in range(5):
+            self._random_history(rng, rng.randint(1, 80))
+            transactions = Transaction.objects.filter(user=self.user)
+            ledger = load_ledger(self.user.id)
+            rows = ledger.rows
+            with self.subTest(trial=trial):
+                self.assertEqual(rows['id'].tolist(), list(transactions.order_by('date', 'id').values_list('id', flat=True)))
+
+                keys, sums, counts = group_totals(rows, ('account', 'category', 'type'))
+                totals = {
+                    (int(ledger.accounts[key['account']]), int(ledger.categories[key['category']]) or None, key['type'] == DEPOSIT):
+                        (total, count)
+                    for key, total, count in zip(keys, sums.tolist(), counts.tolist())
+                }
+                expected = {
+                    (account_id, category_id, type == 'deposit'): (to_cents(total), count)
+                    for account_id, category_id, type, total, count in (
+                        transactions.values_list('account', 'budget_category', 'type')
+                        .annotate(total=Sum('amount'), count=Count('id')).order_by()
+                    )
+                }
+                self.assertEqual(totals, expected)
+
+                signed = ledger.signed_cents
+                first = int(rows['day'].min())
+                days = int(rows['day'].max()) - first + 1
+                daily = daily_totals(rows, first, days, signed)
+                expected = np.zeros(days, np.int64)
+                for day, type, total in (
+                    transactions.annotate(day=TruncDate('date')).values_list('day', 'type').annotate(total=Sum('amount')).order_by()
+                ):
+                    expected[to_day(day) - first] += to_cents(total) if type == 'deposit' else -to_cents(total)
+                self.assertEqual(daily.tolist(), expected.tolist())
+                self.assertEqual(int(np.cumsum(daily)[-1]), int(signed.sum()))
+
+                months = month_index(rows['day'])
+                first = int(months.min())
+                monthly = group_sums(signed, months - first, int(months.max()) - first + 1)
+                expected = np.zeros(len(monthly), np.int64)
+                for month, type, total in (
+                    transactions.annotate(month=TruncMonth('date', output_field=DateField()))
+                    .values_list('month', 'type').annotate(total=Sum('amount')).order_by()
+                ):
+                    expected[int(month_index(to_day(month))) - first] += to_cents(total) if type == 'deposit' else -to_cents(total)
+                self.assertEqual(monthly.tolist(), expected.tolist())
+
+    def test_range_and_descriptions(self):
+        account = self.accounts[0]
+        for description, when in [('NETFLIX 1', datetime(2026, 1, 5)), ('Netflix 2', datetime(2026, 2, 5)), ('Market', datetime(2026, 3, 5))]:
+            transaction = Transaction.objects.create(
+                user=self.user, amount=Decimal('15.99'), description=description, account=account, type='withdrawal',
+            )
+            Transaction.objects.filter(pk=transaction.pk).update(date=timezone.make_aware(when))
+        ledger = load_ledger(
+            self.user.id, start=timezone.make_aware(datetime(2026, 1, 1)), end=timezone.make_aware(datetime(2026, 3, 1)),
+            normalize=normalize_description,
+        )
+        self.assertEqual([from_day(day) for day in ledger.rows['day']], [date(2026, 1, 5), date(2026, 2, 5)])
+        self.assertEqual(ledger.descriptions.tolist(), ['netflix'])
+        self.assertEqual(ledger.rows['description'].tolist(), [0, 0])
+        self.assertEqual(ledger.signed_cents.tolist(), [-1599, -1599])
+        self.assertEqual(len(load_ledger(self.user.id, start=timezone.make_aware(datetime(2027, 1, 1))).rows), 0)
+
+
+class TrendViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='trend_user', password='test123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('0.00'), user=self.user)
+        self.food = Category.objects.create(name='Food', user=self.user)
+        this_month = timezone.localdate().replace(day=1)
+        self.last_month = (this_month - timedelta(days=1)).replace(day=1)
+        for amount, type, category in [('1000.00', 'deposit', None), ('30.10', 'withdrawal', self.food), ('0.20', 'withdrawal', None)]:
+            Transaction.objects.create(
+                user=self.user, amount=Decimal(amount), description='T', account=self.account, budget_category=category, type=type,
+            )
+        TransactionRollup.objects.create(
+            user=self.user, account=self.account, budget_category=self.food, type='withdrawal', month=self.last_month,
+            count=2, total=Decimal('60.30'),
+        )
+
+    def test_trend(self):
+        data = self.client.get('/api/trend/', {'months': 3}).data
+        months = data['months']
+        self.assertEqual([month['month'] for month in months][1:], [self.last_month, timezone.localdate().replace(day=1)])
+        self.assertEqual([month['expenses'] for month in months], ['0.00', '60.30', '30.30'])
+        self.assertEqual(months[2]['net'], '969.70')
+        self.assertEqual(months[2]['cumulative_net'], '909.40')
+        self.assertEqual(months[2]['average_expenses'], '30.20')
+        self.assertEqual(data['spending_by_category'][0], {'category': self.food.id, 'category_name': 'Food', 'amount': '90.40'})
+        self.assertEqual(data['spending_by_category'][1]['category'], None)
+
+    def test_rejects_bad_months(self):
+        self.assertEqual(self.client.get('/api/trend/', {'months': 0}).status_code, 400)
+
+
+class CategoryStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='anomaly_user', password='test123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('0.00'), user=self.user)
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.amounts = ['20.00', '25.00', '22.50', '18.00', '24.00', '21.00']
+        self.transactions = [self._spend(amount) for amount in self.amounts]
+
+    def _spend(self, amount, type='withdrawal'):
+        return Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), description='Market', account=self.account,
+            budget_category=self.food, type=type,
+        )
+
+    def _stats(self):
+        return CategoryStats.objects.get(user=self.user, category=self.food)
+
+    def test_running_stats_match_numpy(self):
+        self.transactions[0].amount = Decimal('30.00')
+        self.transactions[0].save()
+        self.transactions[1].delete()
+        self._spend('99.00', type='deposit')
+        values = np.array([30.0, 22.5, 18.0, 24.0, 21.0])
+        stats = self._stats()
+        self.assertEqual(stats.count, 5)
+        self.assertAlmostEqual(stats.mean, values.mean())
+        self.assertAlmostEqual(stats.m2 / (stats.count - 1), values.var(ddof=1))
+
+    def test_update_takes_the_old_amount_from_the_loaded_row(self):
+        transaction = Transaction.objects.get(pk=self.transactions[0].pk)
+        with CaptureQueriesContext(connection) as queries:
+            transaction.amount = Decimal('30.00')
+            transaction.save()
+        self.assertEqual([q['sql'] for q in queries if q['sql'].startswith('SELECT "transaction_transaction"')], [])
+        # The saved values become the previous ones of the next save.
+        transaction.amount = Decimal('40.00')
+        transaction.save()
+        values = np.array([40.0, 25.0, 22.5, 18.0, 24.0, 21.0])
+        stats = self._stats()
+        self.assertEqual(stats.count, 6)
+        self.assertAlmostEqual(stats.mean, values.mean())
+        self.assertAlmostEqual(stats.m2 / (stats.count - 1), values.var(ddof=1))
+
+    def test_backfill_matches_running_stats(self):
+        running = self._stats()
+        CategoryStats.objects.all().delete()
+        call_command('backfill_category_stats', stdout=StringIO())
+        rebuilt = self._stats()
+        self.assertEqual(rebuilt.count, running.count)
+        self.assertAlmostEqual(rebuilt.mean, running.mean)
+        self.assertAlmostEqual(rebuilt.m2, running.m2)
+        self.assertEqual(rebuilt.median, float(np.median([float(amount) for amount in self.amounts])))
+
+    def test_flags_outliers(self):
+        outlier = self._spend('180.00')
+        response = self.client.get('/api/anomalies/')
+        self.assertEqual([row['id'] for row in response.data], [outlier.id])
+        self.assertGreater(response.data[0]['z_score'], 3)
+        self.assertEqual(response.data[0]['category_count'], 7)
+
+    def test_admin_type_change_rebuilds(self):
+        admin = TransactionAdmin(Transaction, site)
+        admin.message_user = lambda *args, **kwargs: None
+        admin.mark_as_deposit(RequestFactory().post('/admin/'), Transaction.objects.filter(pk=self.transactions[0].pk))
+        self.assertEqual(self._stats().count, 5)
+
+    def test_admin_type_change_on_a_filtered_list_rebuilds(self):
+        admin = TransactionAdmin(Transaction, site)
+        admin.message_user = lambda *args, **kwargs: None
+        # As selected under ?type__exact=withdrawal, which the update empties.
+        admin.mark_as_deposit(RequestFactory().post('/admin/'), Transaction.objects.filter(type='withdrawal'))
+        self.assertFalse(CategoryStats.objects.filter(category=self.food).exists())
+
+    def test_apply_rules_rebuilds_the_new_category(self):
+        transaction = Transaction.objects.create(
+            user=self.user, amount=Decimal('23.00'), description='Corner Market', account=self.account, type='withdrawal',
+        )
+        CategoryRule.objects.create(user=self.user, pattern='market', category=self.food)
+        self.assertEqual(apply_rules(self.user.id), 1)
+        self.assertEqual(Transaction.objects.get(pk=transaction.pk).budget_category, self.food)
+        self.assertEqual(self._stats().count, 7)
+
+
+class DuplicateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='duplicate_user', password='test123')
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('0.00'), user=self.user)
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.original = self._create('Corner Cafe', '4.50')
+        self.duplicate = self._create('CORNER CAFE', '4.50', category=self.food)
+        self._create('Corner Cafe', '4.75')
+        self._create('Bookshop', '4.50')
+        later = self._create('Corner Cafe', '4.50')
+        Transaction.objects.filter(pk=later.pk).update(date=timezone.now() + timedelta(days=10))
+
+    def _create(self, description, amount, category=None):
+        return Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), description=description, account=self.account,
+            budget_category=category, type='withdrawal',
+        )
+
+    def _detect(self):
+        call_command('detect_duplicates', workers=0, stdout=StringIO())
+        return list(DuplicateCandidate.objects.values_list('original', 'duplicate'))
+
+    def test_finds_pairs_within_window(self):
+        self.assertEqual(self._detect(), [(self.original.id, self.duplicate.id)])
+
+    def test_find_pairs_compares_neighbours_only(self):
+        when = timezone.now()
+        rows = [(index, 'withdrawal', Decimal('1.00'), when + timedelta(days=index * 2), 'Coffee', None) for index in range(5)]
+        self.assertEqual([pair[:2] for pair in find_pairs(rows)], [(0, 1), (1, 2), (2, 3), (3, 4)])
+
+    def test_find_pairs_does_not_copy_the_rows(self):
+        class Rows(list):
+            def __getitem__(self, key):
+                if isinstance(key, slice):
+                    raise AssertionError('find_pairs sliced the rows')
+                return super().__getitem__(key)
+
+        when = timezone.now()
+        rows = Rows((index, 'withdrawal', Decimal(index), when, 'Coffee', None) for index in range(20000))
+        self.assertEqual(find_pairs(rows), [])
+
+    def test_dismissed_pairs_stay_dismissed(self):
+        self._detect()
+        DuplicateCandidate.objects.update(dismissed=True)
+        self._detect()
+        self.assertEqual(list(DuplicateCandidate.objects.values_list('dismissed', flat=True)), [True])
+
+    def test_merge_action(self):
+        self._detect()
+        admin = DuplicateCandidateAdmin(DuplicateCandidate, site)
+        admin.message_user = lambda *args, **kwargs: None
+        admin.merge_duplicates(RequestFactory().post('/admin/'), DuplicateCandidate.objects.all())
+        self.assertFalse(Transaction.objects.filter(pk=self.duplicate.pk).exists())
+        self.assertEqual(Transaction.objects.get(pk=self.original.pk).budget_category, self.food)
+        self.assertFalse(DuplicateCandidate.objects.exists())
+
+    def test_delete_action_counts_transactions(self):
+        self._detect()
+        admin = DuplicateCandidateAdmin(DuplicateCandidate, site)
+        messages = []
+        admin.message_user = lambda request, message, *args, **kwargs: messages.append(message)
+        admin.delete_duplicates(RequestFactory().post('/admin/'), DuplicateCandidate.objects.all())
+        self.assertFalse(Transaction.objects.filter(pk=self.duplicate.pk).exists())
+        self.assertEqual(messages, ['1 transaction(s) deleted.'])
+
+
+@skipUnless(find_spec('pyarrow'), 'needs pyarrow')
+class ColumnarExportTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        archive_settings = override_settings(TRANSACTION_ARCHIVE_DIR=directory.name)
+        archive_settings.enable()
+        self.addCleanup(archive_settings.disable)
+
+        self.user = User.objects.create_user(username='export_user', password='test123')
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('12.34'), user=self.user)
+        self.food = Category.objects.create(name='Food', user=self.user)
+        for amount in ['1.10', '2.20', '3.30']:
+            Transaction.objects.create(
+                user=self.user, amount=Decimal(amount), description='Market', account=self.account,
+                budget_category=self.food, type='withdrawal',
+            )
+
+    def test_command_writes_every_table(self):
+        import pyarrow.parquet as pq
+
+        call_command('export_columnar', str(self.directory), batch_size=2, stdout=StringIO())
+        table = pq.read_table(self.directory / 'transactions.parquet')
+        self.assertEqual(table.column('amount').to_pylist(), [Decimal('1.10'), Decimal('2.20'), Decimal('3.30')])
+        self.assertEqual(set(table.column('budget_category_id').to_pylist()), {self.food.id})
+        self.assertEqual(pq.read_table(self.directory / 'accounts.parquet').column('balance').to_pylist(), [Decimal('12.34')])
+        self.assertEqual(pq.read_table(self.directory / 'budgets.parquet').num_rows, 0)
+
+    def test_includes_archived_transactions(self):
+        import pyarrow.parquet as pq
+
+        old = Transaction.objects.order_by('id').first()
+        Transaction.objects.filter(pk=old.pk).update(date=timezone.now() - timedelta(days=365 * 5))
+        call_command('archive_transactions', stdout=StringIO())
+        self.assertEqual(Transaction.objects.count(), 2)
+        call_command('export_columnar', str(self.directory), table=['transactions'], stdout=StringIO())
+        table = pq.read_table(self.directory / 'transactions.parquet')
+        self.assertEqual(table.column('id').to_pylist(), list(Transaction.objects.order_by('pk').values_list('id', flat=True)) + [old.id])
+
+    def test_staff_endpoint(self):
+        import pyarrow as pa
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        self.assertEqual(client.get('/api/export/transactions/').status_code, 403)
+        client.force_authenticate(user=User.objects.create_superuser(username='export_admin', password='test123'))
+        response = client.get('/api/export/transactions/', {'as': 'arrow', 'user': self.user.id})
+        self.assertEqual(response.status_code, 200)
+        table = pa.ipc.open_stream(pa.py_buffer(b''.join(response.streaming_content))).read_all()
+        self.assertEqual(table.num_rows, 3)
+
+    def test_streams_parquet_batch_by_batch(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        chunks = list(stream('transactions', 'parquet', batch_size=2))
+        self.assertEqual(len(chunks), 3)  # two record batches and the footer
+        table = pq.read_table(pa.BufferReader(b''.join(chunks)))
+        self.assertEqual(table.column('amount').to_pylist(), [Decimal('1.10'), Decimal('2.20'), Decimal('3.30')])
+
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_superuser(username='export_admin', password='test123'))
+        response = client.get('/api/export/transactions/')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="transactions.parquet"')
+        self.assertEqual(pq.read_table(pa.BufferReader(b''.join(response.streaming_content))).num_rows, 3)
+        self.assertEqual(client.get('/api/export/users/').status_code, 404)
+        for user in ['\u00b2', '0', str(2 ** 63)]:
+            self.assertEqual(client.get('/api/export/transactions/', {'user': user}).status_code, 400, user)
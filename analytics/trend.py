@@ -0,0 +1,79 @@
+"""
+Monthly income and spending trend.
+
+The user's transactions of the last ``months`` months (this one included)
+are summed per month and type over the ledger (analytics.ledger), in
+integer cents; months already archived (transaction.archive) add their
+rollups. Net flow is cumulated across the window and spending is averaged
+over a rolling ``AVERAGE_MONTHS`` window.
+"""
+
+from datetime import datetime, time
+
+import numpy as np
+from django.db.models import Sum
+from django.utils import timezone
+
+from category.models import Category
+from dashboard.memo import memoize
+from transaction.models import TransactionRollup
+from .ledger import (
+    DEPOSIT, group_sums, group_totals, load_ledger, money, month_index, month_start, rolling_sums, to_cents, to_day,
+)
+
+AVERAGE_MONTHS = 3
+
+
+def trend_for_user(user_id, months, today=None):
+    today = today or timezone.localdate()
+    first = int(month_index(to_day(today))) - months + 1
+    ledger = load_ledger(user_id, start=timezone.make_aware(datetime.combine(month_start(first), time.min)))
+    rows = ledger.rows
+    offsets = month_index(rows['day']) - first
+    deposits = rows['type'] == DEPOSIT
+    income = group_sums(rows['cents'][deposits], offsets[deposits], months)
+    expenses = group_sums(rows['cents'][~deposits], offsets[~deposits], months)
+
+    keys, totals, _ = group_totals(rows[~deposits], ('category',))
+    by_category = dict(zip(ledger.categories[keys['category']].tolist(), totals.tolist()))
+    rollups = (
+        TransactionRollup.objects.filter(user_id=user_id, month__gte=month_start(first), month__lte=today)
+        .values_list('month', 'type', 'budget_category').annotate(total=Sum('total'))
+    )
+    for month, type, category_id, total in rollups:
+        offset = int(month_index(to_day(month))) - first
+        if type == 'deposit':
+            income[offset] += to_cents(total)
+        else:
+            expenses[offset] += to_cents(total)
+            by_category[category_id or 0] = by_category.get(category_id or 0, 0) + to_cents(total)
+
+    net = income - expenses
+    cumulative = np.cumsum(net)
+    average = np.rint(rolling_sums(expenses, AVERAGE_MONTHS) / np.minimum(np.arange(1, months + 1), AVERAGE_MONTHS))
+    names = dict(Category.objects.filter(id__in=list(by_category)).values_list('id', 'name'))
+    return {
+        'months': [
+            {
+                'month': month_start(first + offset),
+                'income': money(income[offset]),
+                'expenses': money(expenses[offset]),
+                'net': money(net[offset]),
+                'cumulative_net': money(cumulative[offset]),
+                'average_expenses': money(average[offset]),
+            }
+            for offset in range(months)
+        ],
+        'spending_by_category': [
+            {'category': category_id or None, 'category_name': names.get(category_id), 'amount': money(total)}
+            for category_id, total in sorted(by_category.items(), key=lambda item: -item[1])
+        ],
+    }
+
+
+_memoized_trend = memoize('trend', ('categories', 'transactions'))(trend_for_user)
+
+
+def cached_trend(user_id, months):
+    """``trend_for_user``, cached until the user's categories or transactions change, or the day rolls over."""
+    return _memoized_trend(user_id, months, timezone.localdate())
@@ -0,0 +1,16 @@
+from django.urls import path, include
+from . import views
+from rest_framework.routers import DefaultRouter
+
+app_name = 'analytics'
+
+router = DefaultRouter()
+router.register(r"recurring", views.RecurringSeriesViewSet, basename='recurring')
+
+urlpatterns = [
+    path("", include(router.urls)),
+    path("forecast/", views.ForecastView.as_view(), name='forecast'),
+    path("trend/", views.TrendView.as_view(), name='trend'),
+    path("anomalies/", views.AnomalyView.as_view(), name='anomalies'),
+    path("export/<str:table>/", views.ExportView.as_view(), name='export'),
+]
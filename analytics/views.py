@@ -0,0 +1,154 @@
+from datetime import timedelta
+
+from django.core.exceptions import ImproperlyConfigured
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import permissions
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from transaction.models import Transaction
+from transaction.serializers import TransactionSerializer
+from .anomalies import flagged
+from .export import FORMATS, TABLES, stream
+from .forecast import cached_forecast
+from .models import RecurringSeries
+from .recurring import detect_for_user
+from .serializers import RecurringSeriesSerializer
+from .trend import cached_trend
+
+FORECAST_DEFAULT_DAYS = 90
+FORECAST_MAX_DAYS = 365
+ANOMALY_DEFAULT_DAYS = 30
+ANOMALY_MAX_DAYS = 365
+TREND_DEFAULT_MONTHS = 12
+TREND_MAX_MONTHS = 60
+
+
+class RecurringSeriesViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = RecurringSeriesSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return (
+            RecurringSeries.objects.filter(user=self.request.user)
+            .order_by('next_date', 'id')
+        )
+
+    @action(detail=False, methods=['post'])
+    def detect(self, request):
+        """Re-run detection over the user's history now and return the series found."""
+        detect_for_user(request.user.id)
+        return Response(self.get_serializer(self.get_queryset(), many=True).data)
+
+
+class ForecastView(APIView):
+    """
+    Day-by-day projected balance of each account for the next ``?days=``
+    days (default 90, at most 365), from detected recurring series and
+    recent average spend per category.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            days = int(request.query_params.get('days', FORECAST_DEFAULT_DAYS))
+        except ValueError:
+            raise ValidationError({'days': 'Must be a number.'})
+        if not 1 <= days <= FORECAST_MAX_DAYS:
+            raise ValidationError({'days': f'Must be between 1 and {FORECAST_MAX_DAYS}.'})
+        return Response(cached_forecast(request.user.id, days))
+
+
+class TrendView(APIView):
+    """
+    Income, spending and net flow per month for the last ``?months=``
+    months (default 12, at most 60), with the running net and a rolling
+    average of spending, and spending per category over the whole window.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            months = int(request.query_params.get('months', TREND_DEFAULT_MONTHS))
+        except ValueError:
+            raise ValidationError({'months': 'Must be a number.'})
+        if not 1 <= months <= TREND_MAX_MONTHS:
+            raise ValidationError({'months': f'Must be between 1 and {TREND_MAX_MONTHS}.'})
+        return Response(cached_trend(request.user.id, months))
+
+
+class AnomalyView(APIView):
+    """
+    Withdrawals from the last ``?days=`` days (default 30) that are unusually
+    large for their category, scored against the running category stats.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            days = int(request.query_params.get('days', ANOMALY_DEFAULT_DAYS))
+        except ValueError:
+            raise ValidationError({'days': 'Must be a number.'})
+        if not 1 <= days <= ANOMALY_MAX_DAYS:
+            raise ValidationError({'days': f'Must be between 1 and {ANOMALY_MAX_DAYS}.'})
+
+        transactions = Transaction.objects.filter(user=request.user, date__gte=timezone.now() - timedelta(days=days))
+        found = list(flagged(request.user.id, transactions))
+        results = []
+        for data, (_, z, stats) in zip(TransactionSerializer([item[0] for item in found], many=True).data, found):
+            data.update({
+                'z_score': round(z, 2),
+                'category_mean': round(stats.mean, 2),
+                'category_median': round(stats.median, 2),
+                'category_count': stats.count,
+            })
+            results.append(data)
+        return Response(results)
+
+
+class ExportUnavailable(APIException):
+    status_code = 503
+    default_detail = 'Columnar export is not available on this server.'
+
+
+MAX_ID = 2 ** 63 - 1  # largest bigint
+
+EXPORT_CONTENT_TYPES = {
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+
+class ExportView(APIView):
+    """
+    Staff only: the whole ``transactions``, ``accounts``, ``budgets`` or
+    ``categories`` table as a Parquet file, or an Arrow IPC stream with
+    ``?as=arrow``. ``?user=<id>`` limits it to one user. Each record batch
+    is sent as soon as it is written (analytics.export.stream), so the
+    response starts before the whole table has been read.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, table):
+        if table not in TABLES:
+            raise Http404
+        file_format = request.query_params.get('as', 'parquet')
+        if file_format not in FORMATS:
+            raise ValidationError({'as': f'Must be one of {", ".join(FORMATS)}.'})
+        user = request.query_params.get('user')
+        if user is not None:
+            user = int(user) if user.isascii() and user.isdecimal() else 0
+            if not 0 < user <= MAX_ID:
+                raise ValidationError({'user': 'Must be a user id.'})
+
+        try:
+            chunks = stream(table, file_format, [user] if user else None)
+        except ImproperlyConfigured as error:
+            raise ExportUnavailable(str(error))
+        content_type, extension = EXPORT_CONTENT_TYPES[file_format]
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{table}.{extension}"'
+        return response
@@ -0,0 +1,140 @@
+import io
+import json
+import logging
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger('backend.batch')
+
+ALLOWED_METHODS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE'}
+
+# Request headers that describe the outer batch body, not a sub-request.
+_BODY_HEADERS = {'CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MATCH'}
+
+
+class BatchView(APIView):
+    """
+    Runs several API requests in one round trip.
+
+    POST ``{"requests": [{"method": "POST", "path": "/api/transactions/", "body": {...}}, ...],
+    "atomic": false}``. Sub-requests run in order, in-process, through the
+    normal URL resolver and views, as the already authenticated user. The
+    response lists ``status``, ``headers`` and ``body`` for each
+    sub-request.
+
+    With ``atomic`` they share one database transaction. The first one to
+    fail (status 400 or above) stops the batch and rolls it back: the
+    sub-requests before it are reported with status 424 and
+    ``"rolled_back": true``, the ones after it with status 424 and
+    ``"run": false``.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        items = request.data.get('requests') if isinstance(request.data, dict) else None
+        max_requests = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+        if not isinstance(items, list) or not items:
+            return Response({'detail': '"requests" must be a non-empty list.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > max_requests:
+            return Response(
+                {'detail': f'A batch may contain at most {max_requests} requests.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if request.data.get('atomic'):
+            responses = self.run_atomic(request, items)
+        else:
+            responses = [self.run_one(request, item) for item in items]
+        return Response({'responses': responses})
+
+    def run_atomic(self, request, items):
+        responses = []
+        with db_transaction.atomic():
+            for index, item in enumerate(items):
+                response = self.run_one(request, item)
+                if response['status'] < 400:
+                    responses.append(response)
+                    continue
+                db_transaction.set_rollback(True)
+                responses = [{**done, 'status': 424, 'rolled_back': True} for done in responses]
+                responses.append(response)
+                responses.extend(
+                    {**_error(424, f'Not run: request {index} failed.'), 'run': False} for _ in items[index + 1:]
+                )
+                break
+        return responses
+
+    def run_one(self, request, item):
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            return _error(400, 'Each request needs a "path".')
+        method = str(item.get('method', 'GET')).upper()
+        if method not in ALLOWED_METHODS:
+            return _error(405, f'Method "{method}" not allowed.')
+
+        url = urlsplit(item['path'])
+        try:
+            match = resolve(url.path)
+        except Resolver404:
+            return _error(404, 'Not found.')
+        if not url.path.startswith('/api/') or getattr(match.func, 'view_class', None) is BatchView:
+            return _error(400, 'Only API endpoints can be batched.')
+
+        sub_request = _build_request(request, method, url, item.get('body'))
+        sub_request.resolver_match = match
+        try:
+            if iscoroutinefunction(match.func):
+                response = async_to_sync(match.func)(sub_request, *match.args, **match.kwargs)
+            else:
+                response = match.func(sub_request, *match.args, **match.kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        except Exception:
+            logger.exception('Batched %s %s failed', method, url.path)
+            return _error(500, 'Internal server error.')
+        if response.streaming:
+            return _error(400, 'Streaming endpoints cannot be batched.')
+
+        if hasattr(response, 'data'):
+            body = response.data
+        elif response.get('Content-Type', '').startswith('application/json') and response.content:
+            body = json.loads(response.content)
+        else:
+            body = response.content.decode() or None
+        headers = {key: value for key, value in response.items() if key.lower() != 'content-length'}
+        return {'status': response.status_code, 'headers': headers, 'body': body}
+
+
+def _error(status_code, detail):
+    return {'status': status_code, 'headers': {}, 'body': {'detail': detail}}
+
+
+def _build_request(request, method, url, body):
+    payload = json.dumps(body).encode() if body is not None else b''
+    sub_request = HttpRequest()
+    sub_request.method = method
+    sub_request.path = sub_request.path_info = url.path
+    sub_request.GET = QueryDict(url.query)
+    sub_request.META = {key: value for key, value in request.META.items() if key not in _BODY_HEADERS}
+    sub_request.META.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(payload)),
+    })
+    sub_request._body = payload
+    sub_request._stream = io.BytesIO(payload)
+    sub_request._read_started = False
+    # Reuse the batch request's authentication instead of running it again.
+    sub_request.user = request.user
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+    return sub_request
@@ -0,0 +1,381 @@
+import atexit
+import fcntl
+import hmac
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from backend.middleware import QueryRecorder, recording
+from backend.permissions import is_staff_request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current_request = ContextVar('metrics_request', default=None)
+
+
+class RequestTimings:
+    """Per-request accumulator for named phases such as ``serializer``."""
+
+    def __init__(self):
+        self.totals = {}
+        self.active = set()
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent inside the block to the current request's ``name`` phase."""
+    timings = _current_request.get()
+    if timings is None or name in timings.active:
+        yield
+        return
+    timings.active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.active.discard(name)
+        timings.totals[name] = timings.totals.get(name, 0.0) + time.perf_counter() - start
+
+
+class TimedSerializerMixin:
+    """Counts validation and representation time towards the ``serializer`` phase."""
+
+    def to_representation(self, instance):
+        with phase('serializer'):
+            return super().to_representation(instance)
+
+    def is_valid(self, *args, **kwargs):
+        with phase('serializer'):
+            return super().is_valid(*args, **kwargs)
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms kept in process memory.
+
+    When ``directory`` is set every process periodically writes its own
+    snapshot to ``<directory>/<pid>.json`` and :meth:`collect` merges all of
+    them, so a scrape of any gunicorn worker reports totals for the whole
+    server. Recording only touches in-memory dicts; files are written at most
+    once per ``flush_interval`` seconds.
+
+    Snapshots of workers that are gone are folded into ``<directory>/dead.json``
+    and their files removed: by the worker itself at exit, by
+    :func:`mark_process_dead` from gunicorn's ``child_exit`` hook, and, for
+    workers that were killed, by the first flush of every new worker. The
+    directory keeps one file per live worker, and the totals keep counting
+    what the dead ones recorded.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = Path(directory) if directory else None
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._pruned_pid = None
+        self._last_flush = 0.0
+        self._counters = {}
+        self._histograms = {}
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            atexit.register(self._exit)
+
+    def _check_fork(self):
+        # A worker forked from a preloaded master must not report the
+        # master's numbers under its own pid.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._counters = {}
+            self._histograms = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    'buckets': list(buckets), 'counts': [0] * (len(buckets) + 1), 'sum': 0.0,
+                }
+            histogram['counts'][bisect_left(histogram['buckets'], value)] += 1
+            histogram['sum'] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [
+                    [name, list(labels), dict(h, counts=list(h['counts']))]
+                    for (name, labels), h in self._histograms.items()
+                ],
+            }
+
+    def maybe_flush(self):
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if not self.directory:
+            return
+        self._last_flush = time.monotonic()
+        path = self.directory / f'{os.getpid()}.json'
+        tmp_path = path.with_suffix('.tmp')
+        try:
+            if self._pruned_pid != os.getpid():
+                self._pruned_pid = os.getpid()
+                self.prune()
+            tmp_path.write_text(json.dumps(self.snapshot()))
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def _exit(self):
+        self.flush()
+        try:
+            self.mark_process_dead(os.getpid())
+        except OSError:
+            pass
+
+    def prune(self):
+        """
+        Fold the snapshots of processes that no longer exist; see
+        :meth:`mark_process_dead`. Run before this process first writes its
+        own file, so a file left under a reused pid is folded too.
+        """
+        for path in self.directory.glob('*.json'):
+            if path.stem.isdecimal():
+                pid = int(path.stem)
+                if pid == os.getpid() or not _is_alive(pid):
+                    self.mark_process_dead(pid)
+
+    def mark_process_dead(self, pid):
+        """Fold the snapshot of the finished process ``pid`` into ``dead.json`` and remove its file."""
+        if not self.directory:
+            return
+        path = self.directory / f'{pid}.json'
+        dead = self.directory / 'dead.json'
+        with _directory_lock(self.directory):
+            try:
+                snapshot = json.loads(path.read_text())
+            except FileNotFoundError:
+                return
+            except (OSError, ValueError):
+                snapshot = None
+            if snapshot is not None:
+                snapshots = [snapshot]
+                try:
+                    snapshots.append(json.loads(dead.read_text()))
+                except (OSError, ValueError):
+                    pass
+                tmp_path = dead.with_suffix('.tmp')
+                tmp_path.write_text(json.dumps(_as_snapshot(*_merge(snapshots))))
+                os.replace(tmp_path, dead)
+            path.unlink(missing_ok=True)
+            self.directory.joinpath(f'{pid}.tmp').unlink(missing_ok=True)
+
+    def collect(self):
+        """Return the merged ``(counters, histograms)`` of every process."""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            own_file = f'{os.getpid()}.json'
+            for path in self.directory.glob('*.json'):
+                if path.name == own_file:
+                    continue
+                try:
+                    snapshots.append(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    continue
+        return _merge(snapshots)
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        counters, histograms = self.collect()
+        lines = []
+        for name in sorted({key[0] for key in counters}):
+            lines.append(f'# TYPE {name} counter')
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {value}')
+        for name in sorted({key[0] for key in histograms}):
+            lines.append(f'# TYPE {name} histogram')
+            for (metric, labels), h in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(h['buckets'] + ['+Inf'], h['counts']):
+                    cumulative += count
+                    bucket_labels = labels + (('le', str(bound)),)
+                    lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {h["sum"]}')
+                lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # alive, but not ours
+        return True
+    return True
+
+
+@contextmanager
+def _directory_lock(directory):
+    # Serializes folding, so a dead worker is never counted twice.
+    with open(directory / '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _merge(snapshots):
+    """Sum snapshots into ``(counters, histograms)`` keyed by ``(name, labels)``."""
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, h in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = dict(h, counts=list(h['counts']))
+            else:
+                merged['counts'] = [a + b for a, b in zip(merged['counts'], h['counts'])]
+                merged['sum'] += h['sum']
+    return counters, histograms
+
+
+def _as_snapshot(counters, histograms):
+    return {
+        'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, list(labels), h] for (name, labels), h in histograms.items()],
+    }
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+registry = MetricsRegistry(
+    directory=getattr(settings, 'METRICS_MULTIPROCESS_DIR', None),
+    flush_interval=getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0),
+)
+
+
+def mark_process_dead(pid):
+    """
+    Fold the snapshot of the exited worker ``pid`` into the totals and
+    remove its file. For gunicorn's ``child_exit`` server hook, which also
+    covers workers that were killed::
+
+        def child_exit(server, worker):
+            from backend.metrics import mark_process_dead
+            mark_process_dead(worker.pid)
+    """
+    registry.mark_process_dead(pid)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, DB time, serializer time, response size and errors per
+    resolved view and HTTP method into the process-wide ``registry``.
+
+    A streaming response's body is produced after the middleware returns,
+    and for /api/sync/events/ that lasts as long as the client stays
+    connected. Streaming responses are therefore left out of the latency,
+    DB and serializer histograms; their time to the response headers goes
+    to ``http_response_headers_seconds`` instead.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current_request.set(timings)
+        start = time.perf_counter()
+        try:
+            with recording(QueryRecorder()) as recorder:
+                response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        return self.record(request, response, time.perf_counter() - start, recorder, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current_request.set(timings)
+        start = time.perf_counter()
+        try:
+            with recording(QueryRecorder()) as recorder:
+                response = await self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        return self.record(request, response, time.perf_counter() - start, recorder, timings)
+
+    def record(self, request, response, duration, recorder, timings):
+        match = request.resolver_match
+        labels = {'view': match.view_name if match else '<unmatched>', 'method': request.method}
+        registry.inc('http_requests_total', dict(labels, status=str(response.status_code)))
+        registry.inc('http_db_queries_total', labels, recorder.count)
+        if response.streaming:
+            registry.observe('http_response_headers_seconds', labels, duration)
+        else:
+            registry.observe('http_request_duration_seconds', labels, duration)
+            registry.observe('http_request_db_seconds', labels, recorder.duration)
+            registry.observe('http_request_serializer_seconds', labels, timings.totals.get('serializer', 0.0))
+            registry.inc('http_response_bytes_total', labels, len(response.content))
+        if response.status_code >= 400:
+            registry.inc('http_request_errors_total', dict(labels, status=str(response.status_code)))
+        registry.maybe_flush()
+        return response
+
+
+def _may_scrape(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    if token and scheme == 'Bearer' and hmac.compare_digest(credentials.encode(), token.encode()):
+        return True
+    return is_staff_request(request)
+
+
+def metrics_view(request):
+    """
+    The registry in the Prometheus text format, for scrapers that send
+    ``Authorization: Bearer <METRICS_TOKEN>`` and for staff users.
+    """
+    if not _may_scrape(request):
+        return HttpResponseForbidden('Forbidden\n', content_type='text/plain')
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,171 @@
+import functools
+import logging
+import re
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('backend.sql')
+
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*%s\s*,?)+\)', re.IGNORECASE)
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """Collapse a statement to its shape so repeats with different values compare equal."""
+    sql = _STRING.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def _request_stack(limit=25):
+    """Return the stack below the middleware, without this module's own frames."""
+    frames = traceback.extract_stack()
+    outer = next((i for i, frame in enumerate(frames) if frame.filename == __file__), 0)
+    frames = [frame for frame in frames[outer + 1:] if frame.filename != __file__]
+    return ''.join(traceback.format_list(frames[-limit:]))
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that counts and times every query it sees.
+
+    Install with ``recording(recorder)`` for everything the current request
+    runs, or ``connection.execute_wrapper(recorder)`` for one connection.
+    When ``threshold`` is set, the stack of the first statement that repeats more than ``threshold``
+    times is kept so the offending loop can be found.
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold
+        self._lock = threading.Lock()  # the dashboard runs a request's queries on several threads
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self.stacks = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            shape = normalize_sql(sql) if self.threshold is not None else None
+            with self._lock:
+                self.duration += duration
+                self.count += 1
+                if shape is not None:
+                    self.shapes[shape] += 1
+                    if self.shapes[shape] == self.threshold + 1:
+                        self.stacks[shape] = _request_stack()
+
+    def repeated(self):
+        """Return ``(sql, count, stack)`` for every statement over the threshold."""
+        return [
+            (shape, self.shapes[shape], stack)
+            for shape, stack in self.stacks.items()
+        ]
+
+
+_recorders = ContextVar('query_recorders', default=())
+
+
+def _dispatch(execute, sql, params, many, context):
+    for recorder in reversed(_recorders.get()):
+        execute = functools.partial(recorder, execute)
+    return execute(sql, params, many, context)
+
+
+def _install(connection):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+def _install_on_new_connection(sender, connection, **kwargs):
+    _install(connection)
+
+
+connection_created.connect(_install_on_new_connection, dispatch_uid='backend-query-recorders')
+
+
+@contextmanager
+def recording(recorder):
+    """
+    Pass every query of the current context to ``recorder``: on any thread
+    and connection, since the recorders are looked up in a context variable
+    that ``sync_to_async`` and ``async_to_sync`` carry over, so the queries
+    of an async view's worker threads are seen as well as a sync view's.
+    """
+    for connection in connections.all():
+        _install(connection)
+    token = _recorders.set(_recorders.get() + (recorder,))
+    try:
+        yield recorder
+    finally:
+        _recorders.reset(token)
+
+
+def add_server_timing(response, metric, duration, description=None):
+    """Append a metric to the response's ``Server-Timing`` header."""
+    entry = f'{metric};dur={duration * 1000:.1f}'
+    if description:
+        entry += f';desc="{description}"'
+    existing = response.get('Server-Timing')
+    response['Server-Timing'] = f'{existing}, {entry}' if existing else entry
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Counts and times the SQL run by each request.
+
+    Enabled with ``SQL_INSTRUMENTATION_ENABLED``. Every response gets a
+    ``Server-Timing: db`` entry, and any statement repeated more than
+    ``SQL_N_PLUS_ONE_THRESHOLD`` times is logged to ``backend.sql`` together
+    with the stack that issued it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_INSTRUMENTATION_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'SQL_N_PLUS_ONE_THRESHOLD', 5)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with recording(QueryRecorder(threshold=self.threshold)) as recorder:
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        with recording(QueryRecorder(threshold=self.threshold)) as recorder:
+            response = await self.get_response(request)
+        return self.report(request, response, recorder)
+
+    def report(self, request, response, recorder):
+        add_server_timing(response, 'db', recorder.duration, f'{recorder.count} queries')
+        response['X-Query-Count'] = str(recorder.count)
+
+        for sql, count, query_stack in recorder.repeated():
+            logger.warning(
+                'Possible N+1 on %s %s: query ran %d times: %s\n%s',
+                request.method, request.path, count, sql, query_stack,
+            )
+        return response
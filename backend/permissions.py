@@ -0,0 +1,23 @@
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+
+def is_staff_request(request):
+    """
+    Whether a plain Django ``request`` comes from a staff user, signed in
+    through the session or authenticated like the API (JWT). For middleware
+    and views outside DRF, such as profiling and /metrics.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    # API clients authenticate with JWT, which only DRF understands.
+    drf_request = Request(request)
+    for authenticator_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authenticator_class().authenticate(drf_request)
+        except Exception:
+            return False
+        if result is not None:
+            return result[0].is_staff
+    return False
@@ -0,0 +1,184 @@
+import cProfile
+import logging
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import FileResponse, Http404
+
+from backend.middleware import add_server_timing
+from backend.permissions import is_staff_request
+
+logger = logging.getLogger('backend.profiling')
+
+PHASES = ('parse', 'auth', 'queryset', 'serialization', 'render')
+
+# (module path fragment, function name) -> phase. A sample is attributed to
+# the innermost marker on its stack, so a lazy foreign-key fetch made while
+# serializing counts as queryset time.
+_PHASE_MARKERS = {
+    ('rest_framework/request.py', '_parse'): 'parse',
+    ('rest_framework/request.py', '_load_data_and_files'): 'parse',
+    ('rest_framework/views.py', 'perform_authentication'): 'auth',
+    ('rest_framework/views.py', 'check_permissions'): 'auth',
+    ('rest_framework/views.py', 'check_throttles'): 'auth',
+    ('rest_framework/request.py', '_authenticate'): 'auth',
+    ('django/db/models/query.py', '_fetch_all'): 'queryset',
+    ('django/db/models/query.py', 'count'): 'queryset',
+    ('django/db/models/query.py', 'aggregate'): 'queryset',
+    ('django/db/models/sql/compiler.py', 'execute_sql'): 'queryset',
+    ('rest_framework/serializers.py', 'to_representation'): 'serialization',
+    ('rest_framework/serializers.py', 'is_valid'): 'serialization',
+    ('rest_framework/response.py', 'rendered_content'): 'render',
+}
+
+_PROFILE_ID = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$')
+
+
+def _phase_for(code):
+    filename = code.co_filename.replace('\\', '/')
+    for (module, function), phase in _PHASE_MARKERS.items():
+        if code.co_name == function and filename.endswith(module):
+            return phase
+    return None
+
+
+def _frame_label(code):
+    return f'{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})'
+
+
+class StackSampler(threading.Thread):
+    """Samples the stack of one thread at a fixed interval until stopped."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            if codes:
+                self.stacks[tuple(reversed(codes))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        """
+        Return ``(lines, phase_counts)``: Brendan Gregg's collapsed-stack lines,
+        each rooted at the request phase it belongs to, and samples per phase.
+        """
+        lines, phase_counts = [], Counter()
+        for codes, count in self.stacks.items():
+            # Drop the frames above the profiling middleware itself.
+            start = next((i for i, code in enumerate(codes) if code.co_filename == __file__), -1)
+            codes = [code for code in codes[start + 1:] if code.co_filename != __file__]
+            phase = 'view'
+            for code in codes:
+                phase = _phase_for(code) or phase
+            phase_counts[phase] += count
+            lines.append(';'.join([phase] + [_frame_label(code) for code in codes]) + f' {count}')
+        return sorted(lines), phase_counts
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a single request on demand.
+
+    A staff user adds ``?_profile=1`` or an ``X-Profile: 1`` header. The view
+    then runs under cProfile and a stack sampler; a ``.prof`` dump and a
+    flamegraph-ready ``.collapsed`` file are written to ``PROFILE_DIR``, the
+    profile id comes back in ``X-Profile-Id`` and the time per DRF phase
+    (parse, auth, queryset, serialization, render) in ``Server-Timing``.
+    The files can be downloaded from ``/profiles/<id>.prof`` and
+    ``/profiles/<id>.collapsed``.
+
+    Under ASGI the profiled request is driven from a worker thread, and the
+    sync view code Django hands back to that thread is what gets profiled;
+    code running on the event loop itself is not sampled. Streaming
+    responses, such as the /api/sync/events/ stream, are not profiled: their
+    body is produced after the profile ends, so it would only cover the time
+    to the headers.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.interval = getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.005)
+        self.directory = Path(getattr(settings, 'PROFILE_DIR', settings.BASE_DIR / 'profiles'))
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _requested(request):
+        return request.GET.get('_profile') or request.headers.get('X-Profile')
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self._requested(request) or not is_staff_request(request):
+            return self.get_response(request)
+        return self._profiled(request, self.get_response)
+
+    async def __acall__(self, request):
+        if not self._requested(request) or not await sync_to_async(is_staff_request)(request):
+            return await self.get_response(request)
+        return await sync_to_async(self._profiled)(request, async_to_sync(self.get_response))
+
+    def _profiled(self, request, get_response):
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        sampler.start()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            sampler.stop()
+
+        if response.streaming:
+            logger.info('Not profiling streaming response to %s %s', request.method, request.path)
+            return response
+
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        lines, phase_counts = sampler.collapsed()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(self.directory / f'{profile_id}.prof')
+        (self.directory / f'{profile_id}.collapsed').write_text('\n'.join(lines) + '\n')
+        logger.info('Profiled %s %s as %s', request.method, request.path, profile_id)
+
+        total_samples = sum(phase_counts.values())
+        for name in PHASES + ('view',):
+            share = phase_counts[name] / total_samples if total_samples else 0
+            add_server_timing(response, f'profile-{name}', elapsed * share)
+        add_server_timing(response, 'profile-total', elapsed, f'{total_samples} samples')
+        response['X-Profile-Id'] = profile_id
+        return response
+
+
+def profile_download(request, profile_id, kind):
+    if not _PROFILE_ID.match(profile_id) or not is_staff_request(request):
+        raise Http404
+    directory = Path(getattr(settings, 'PROFILE_DIR', settings.BASE_DIR / 'profiles'))
+    path = directory / f'{profile_id}.{kind}'
+    if not path.exists():
+        raise Http404
+    return FileResponse(path.open('rb'), as_attachment=True, filename=path.name)
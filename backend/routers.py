@@ -0,0 +1,129 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework.permissions import SAFE_METHODS
+
+_routing = ContextVar('replica_routing', default=None)
+
+
+def _pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """
+    Send the user's reads to the primary for the next ``REPLICA_PIN_SECONDS``.
+
+    The pin is kept in the default cache, so it holds for whichever worker
+    serves the user's next read only if that cache is shared; settings
+    refuses to configure replicas with a per-process one.
+    """
+    cache.set(_pin_key(user_id), True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+def _authenticated_user_id(request):
+    # Never force Django's lazy session user from inside the router: that
+    # would itself run a query. DRF replaces it with the real user once it
+    # has authenticated the request.
+    user = request.__dict__.get('user')
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    return getattr(user, 'pk', None)
+
+
+class RoutingState:
+    """Whether the current request may read from a replica."""
+
+    def __init__(self, request, allow_replica):
+        self.request = request
+        self.allow_replica = allow_replica
+        self._pinned = {}
+
+    def use_replica(self):
+        if not self.allow_replica:
+            return False
+        user_id = _authenticated_user_id(self.request)
+        if user_id is None:
+            return True
+        if user_id not in self._pinned:
+            self._pinned[user_id] = bool(cache.get(_pin_key(user_id)))
+        return not self._pinned[user_id]
+
+
+class ReplicaRouter:
+    """
+    Sends reads of safe-method API requests to one of ``DATABASE_REPLICAS``.
+
+    Everything else reads from the primary: writes, the admin, management
+    commands and background jobs (no request in flight), and any user who
+    wrote within the last ``REPLICA_PIN_SECONDS`` so they see their own
+    changes despite replication lag.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        state = _routing.get()
+        if replicas and state is not None and state.use_replica():
+            return random.choice(replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReplicaRoutingMiddleware:
+    """Marks each request as replica-eligible or not for ``ReplicaRouter``."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _state(self, request):
+        allow_replica = request.method in SAFE_METHODS and not request.path.startswith('/admin/')
+        return RoutingState(request, allow_replica)
+
+    def _writer(self, request):
+        if request.method not in SAFE_METHODS:
+            return _authenticated_user_id(request)
+        return None
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _routing.set(self._state(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+        user_id = self._writer(request)
+        if user_id is not None:
+            pin_to_primary(user_id)
+        return response
+
+    async def __acall__(self, request):
+        token = _routing.set(self._state(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+        user_id = self._writer(request)
+        if user_id is not None:
+            await sync_to_async(pin_to_primary)(user_id)
+        return response
@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import copy
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -38,6 +42,9 @@ INSTALLED_APPS = [
     'account',
     'budget',
     'category',
+    'dashboard',
+    'sync',
+    'analytics',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -48,16 +55,40 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'backend.metrics.MetricsMiddleware',
+    'backend.middleware.QueryInstrumentationMiddleware',
+    'backend.routers.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'backend.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request SQL counting, Server-Timing header and N+1 warnings
+# (see backend/middleware.py). Off unless explicitly enabled.
+SQL_INSTRUMENTATION_ENABLED = os.environ.get('SQL_INSTRUMENTATION_ENABLED', '') == '1'
+SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get('SQL_N_PLUS_ONE_THRESHOLD', '5'))
+
+# Prometheus metrics served at /metrics (see backend/metrics.py). Under
+# gunicorn point this at a directory shared by the workers so every scrape
+# reports totals for all of them, and call backend.metrics.mark_process_dead
+# from the child_exit hook so killed workers' files are folded right away.
+METRICS_MULTIPROCESS_DIR = os.environ.get('METRICS_MULTIPROCESS_DIR')
+METRICS_FLUSH_INTERVAL = 1.0
+# Scrapers authenticate with "Authorization: Bearer <METRICS_TOKEN>"; without
+# a token only staff users can read /metrics.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# On-demand profiling of single requests by staff users with ?_profile=1
+# (see backend/profiling.py).
+PROFILE_DIR = Path(os.environ.get('PROFILE_DIR', BASE_DIR / 'profiles'))
+PROFILE_SAMPLE_INTERVAL = 0.005
+
 
 ROOT_URLCONF = 'backend.urls'
 
@@ -79,20 +110,113 @@ TEMPLATES = [
 WSGI_APPLICATION = 'backend.wsgi.application'
 
 
+# Transactions older than TRANSACTION_ARCHIVE_YEARS are moved by
+# archive_transactions into gzip NDJSON files here, one per user and year
+# (see transaction/archive.py).
+TRANSACTION_ARCHIVE_DIR = Path(os.environ.get('TRANSACTION_ARCHIVE_DIR', BASE_DIR / 'archive'))
+TRANSACTION_ARCHIVE_YEARS = 2
+
+
+# CACHE_BACKEND picks where both caches live: 'locmem' in each process,
+# 'file' in directories under CACHE_LOCATION shared by the processes of one
+# host, 'redis' on the Redis server at the CACHE_LOCATION URL. 'aggregates'
+# holds memoized per-user aggregates (see dashboard/memo.py). The data
+# versions that invalidate them are in the database, so a write in any
+# process invalidates them everywhere, whichever backend holds the results.
+# On Redis, bound the size with the server's maxmemory and an allkeys-lru
+# policy; MAX_ENTRIES is ignored there.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION', '')
+AGGREGATE_CACHE_MAX_ENTRIES = int(os.environ.get('AGGREGATE_CACHE_MAX_ENTRIES', '10000'))
+AGGREGATE_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _cache(name, **options):
+    if CACHE_BACKEND == 'redis':
+        return {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_LOCATION, 'KEY_PREFIX': name}
+    if CACHE_BACKEND == 'file':
+        location = Path(CACHE_LOCATION or BASE_DIR / 'cache') / name
+        return {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': str(location), 'OPTIONS': options}
+    return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': name, 'OPTIONS': options}
+
+
+CACHES = {
+    'default': _cache('default'),
+    'aggregates': _cache('aggregates', MAX_ENTRIES=AGGREGATE_CACHE_MAX_ENTRIES),
+}
+
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'finance_db',
-        'USER': 'finance_user',
-        'PASSWORD': 'dev123',  # Use the password you chose above
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.environ.get('DB_NAME', 'finance_db'),
+        'USER': os.environ.get('DB_USER', 'finance_user'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'dev123'),  # Use the password you chose above
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
     }
 }
 
+# DB_PROFILE selects how connections are reused:
+#   (unset)      a new connection per request, as in development
+#   persistent   keep one connection per worker thread, checked before reuse
+#   production   a psycopg 3 connection pool per worker process (needs
+#                psycopg[pool]) with server-side prepared statements
+DB_PROFILE = os.environ.get('DB_PROFILE', '')
+
+if DB_PROFILE == 'persistent':
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', '600'))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+elif DB_PROFILE == 'production':
+    DATABASES['default']['OPTIONS'] = {
+        # Sizes are per worker process: total connections are roughly
+        # workers * DB_POOL_MAX_SIZE, keep that below max_connections.
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+            'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', '300')),
+        },
+        # Prepared statements need server-side parameter binding. psycopg
+        # prepares a query once it has run prepare_threshold times on a
+        # connection, which pooled connections reach quickly for the hot
+        # viewset list/detail queries.
+        'server_side_binding': True,
+        'prepare_threshold': int(os.environ.get('DB_PREPARE_THRESHOLD', '5')),
+    }
+
+# Read replicas: DB_REPLICA_HOSTS=host1,host2 adds aliases replica_1,
+# replica_2, ... with the primary's other settings. Safe-method API requests
+# read from them (see backend/routers.py); a user's reads stay on the
+# primary for REPLICA_PIN_SECONDS after they write. That pin is kept in the
+# default cache, which every worker must see, so replicas need
+# CACHE_BACKEND 'file' (one host) or 'redis'.
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    alias = f'replica_{index}'
+    DATABASES[alias] = copy.deepcopy(DATABASES['default'])
+    DATABASES[alias].update(HOST=host.strip(), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
+if DATABASE_REPLICAS and CACHE_BACKEND == 'locmem':
+    raise ImproperlyConfigured(
+        'DB_REPLICA_HOSTS needs a cache shared by all workers for read-your-writes pinning; '
+        "set CACHE_BACKEND to 'file' or 'redis'."
+    )
+
+DATABASE_ROUTERS = ['backend.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = 5
+
+# TRANSACTION_PARTITIONING=1 makes migrations turn transaction_transaction
+# into a table range-partitioned by month on its date (PostgreSQL only, see
+# transaction/partitions.py). Run create_transaction_partitions daily to
+# keep TRANSACTION_PARTITION_MONTHS_AHEAD months of partitions ready.
+TRANSACTION_PARTITIONING = os.environ.get('TRANSACTION_PARTITIONING', '') == '1'
+TRANSACTION_PARTITION_MONTHS_AHEAD = 3
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -137,7 +261,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'user.authentication.CachedJWTAuthentication',
     )
 }
 
@@ -147,8 +271,38 @@ CORS_ALLOWED_ORIGINS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'user.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 25,
-}
\ No newline at end of file
+}
+
+# Largest number of sub-requests accepted by /api/batch/.
+BATCH_MAX_REQUESTS = 20
+
+# Most change log entries returned by one /api/sync/ call.
+SYNC_PAGE_SIZE = 500
+# Days of change log kept by prune_change_log. Clients that have not synced
+# for longer get a full snapshot.
+SYNC_CHANGE_LOG_RETENTION_DAYS = 30
+
+# /api/sync/events/ is only served over ASGI (backend.asgi.application, e.g.
+# under uvicorn); WSGI servers get a 501 for it.
+# How /api/sync/events/ streams hear about commits: 'local' reaches streams
+# in the same process only, 'postgres' fans out to every worker through
+# LISTEN/NOTIFY.
+SYNC_EVENTS_BACKEND = os.environ.get('SYNC_EVENTS_BACKEND', 'local')
+# Seconds between keepalive comments on an idle event stream.
+SYNC_EVENTS_KEEPALIVE = 15
+# Events buffered per stream before a slow client is disconnected.
+SYNC_EVENTS_QUEUE_SIZE = 100
+
+# How long CachedJWTAuthentication may serve a user without reloading it.
+# It only caches with CACHE_BACKEND 'file' or 'redis', which every worker
+# shares; with 'locmem' users are loaded on every request.
+JWT_USER_CACHE_TTL = 60
+
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'user.serializers.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'user.serializers.TokenRefreshSerializer',
+}
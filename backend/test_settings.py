@@ -0,0 +1,29 @@
+"""
+Settings for running the test suite without PostgreSQL:
+
+    python manage.py test --settings=backend.test_settings
+
+Two SQLite databases stand in for a primary and its read replica. The
+replica is a test mirror of the primary, so in tests it reads the same
+database over its own connection. DATABASE_REPLICAS is left empty: test
+cases that exercise routing enable it with override_settings and list
+'replica' in their ``databases``, and every other test case reads from the
+primary it writes to.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASE_REPLICAS = []
+TRANSACTION_PARTITIONING = False
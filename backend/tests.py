@@ -0,0 +1,356 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpRequest
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from account.models import Account
+from backend.metrics import MetricsMiddleware, MetricsRegistry, mark_process_dead
+from backend.middleware import QueryInstrumentationMiddleware, normalize_sql
+from backend.profiling import ProfilingMiddleware
+from backend.routers import ReplicaRouter, ReplicaRoutingMiddleware, RoutingState, _routing, pin_to_primary
+from dashboard.lookups import Names
+from transaction.models import Transaction
+
+
+class NormalizeSqlTests(TestCase):
+    def test_collapses_literals_and_in_lists(self):
+        first = normalize_sql('SELECT * FROM t WHERE id IN (%s, %s) AND  x = 10')
+        second = normalize_sql("SELECT * FROM t WHERE id IN (%s) AND x = 7")
+        self.assertEqual(first, second)
+
+
+@override_settings(SQL_INSTRUMENTATION_ENABLED=True, SQL_N_PLUS_ONE_THRESHOLD=3)
+class QueryInstrumentationMiddlewareTests(TestCase):
+    def setUp(self):
+        # Without the lookup maps related names are read one row at a time,
+        # the N+1 the detector is tested against.
+        names = mock.patch('dashboard.lookups.names_for', return_value=Names({}, {}, {}))
+        names.start()
+        self.addCleanup(names.stop)
+        self.user = User.objects.create_user(username='sql_user', password='test123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_reports_query_count_and_server_timing(self):
+        response = self.client.get('/api/accounts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertGreater(int(response['X-Query-Count']), 0)
+
+    def test_flags_repeated_queries(self):
+        for i in range(5):
+            account = Account.objects.create(name_account=f'Acc {i}', balance=Decimal('10.00'), user=self.user)
+            Transaction.objects.create(
+                user=self.user, amount=Decimal('1.00'), description='Coffee', account=account, type='withdrawal'
+            )
+
+        with self.assertLogs('backend.sql', level='WARNING') as logs:
+            self.client.get('/api/transactions/')
+        self.assertIn('Possible N+1', logs.output[0])
+
+    @override_settings(SQL_N_PLUS_ONE_THRESHOLD=10)
+    async def test_counts_the_queries_of_async_requests(self):
+        # Under ASGI the view runs on a thread of its own; its queries are
+        # still attributed to the request.
+        token = RefreshToken.for_user(self.user).access_token
+        response = await self.async_client.get('/api/dashboard/summary/', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-Query-Count']), 0)
+
+    @override_settings(SQL_INSTRUMENTATION_ENABLED=False)
+    def test_disabled_by_default(self):
+        response = self.client.get('/api/accounts/')
+        self.assertNotIn('Server-Timing', response)
+
+
+class AsyncCapableMiddlewareTests(TestCase):
+    @override_settings(SQL_INSTRUMENTATION_ENABLED=True)
+    def test_middleware_runs_without_a_thread_switch_under_asgi(self):
+        async def get_response(request):
+            pass
+
+        def sync_get_response(request):
+            pass
+
+        for middleware in (MetricsMiddleware, QueryInstrumentationMiddleware, ReplicaRoutingMiddleware, ProfilingMiddleware):
+            with self.subTest(middleware=middleware.__name__):
+                self.assertTrue(middleware.async_capable and middleware.sync_capable)
+                self.assertTrue(iscoroutinefunction(middleware(get_response)))
+                self.assertFalse(iscoroutinefunction(middleware(sync_get_response)))
+
+
+class MetricsRegistryTests(TestCase):
+    def test_renders_counters_and_histograms(self):
+        metrics = MetricsRegistry()
+        metrics.inc('requests_total', {'view': 'a'})
+        metrics.observe('latency_seconds', {'view': 'a'}, 0.02)
+        text = metrics.render()
+        self.assertIn('requests_total{view="a"} 1', text)
+        self.assertIn('latency_seconds_bucket{view="a",le="0.025"} 1', text)
+        self.assertIn('latency_seconds_bucket{view="a",le="0.01"} 0', text)
+        self.assertIn('latency_seconds_count{view="a"} 1', text)
+
+    def test_merges_snapshots_from_other_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            other = MetricsRegistry()
+            other.inc('requests_total', {'view': 'a'}, 2)
+            other.observe('latency_seconds', {'view': 'a'}, 0.3)
+            Path(directory, '99999.json').write_text(json.dumps(other.snapshot()))
+
+            metrics = MetricsRegistry(directory=directory)
+            metrics.inc('requests_total', {'view': 'a'})
+            metrics.observe('latency_seconds', {'view': 'a'}, 0.001)
+            text = metrics.render()
+        self.assertIn('requests_total{view="a"} 3', text)
+        self.assertIn('latency_seconds_count{view="a"} 2', text)
+
+
+    def _snapshot_of(self, directory, pid, requests):
+        other = MetricsRegistry()
+        other.inc('requests_total', {'view': 'a'}, requests)
+        other.observe('latency_seconds', {'view': 'a'}, 0.3)
+        Path(directory, f'{pid}.json').write_text(json.dumps(other.snapshot()))
+
+    def test_folds_files_of_exited_workers(self):
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        with tempfile.TemporaryDirectory() as directory:
+            self._snapshot_of(directory, exited.pid, 2)
+            self._snapshot_of(directory, os.getppid(), 1)  # alive
+            metrics = MetricsRegistry(directory=directory)
+            metrics.inc('requests_total', {'view': 'a'})
+            metrics.flush()
+            self.assertEqual(
+                sorted(path.name for path in Path(directory).glob('*.json')),
+                sorted(['dead.json', f'{os.getpid()}.json', f'{os.getppid()}.json']),
+            )
+            self.assertIn('requests_total{view="a"} 4', metrics.render())
+
+            # At exit the worker folds its own file as well.
+            metrics._exit()
+            self.assertFalse(Path(directory, f'{os.getpid()}.json').exists())
+            self.assertIn('requests_total{view="a"} 4', MetricsRegistry(directory=directory).render())
+
+    def test_mark_process_dead(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self._snapshot_of(directory, 4242, 2)
+            with mock.patch('backend.metrics.registry', MetricsRegistry(directory=directory)) as metrics:
+                mark_process_dead(4242)
+                mark_process_dead(4242)  # already folded
+                text = metrics.render()
+            self.assertEqual([path.name for path in Path(directory).glob('*.json')], ['dead.json'])
+        self.assertIn('requests_total{view="a"} 2', text)
+        self.assertIn('latency_seconds_count{view="a"} 1', text)
+
+
+@override_settings(METRICS_TOKEN='scrape-token')
+class MetricsMiddlewareTests(TestCase):
+    def test_records_viewset_and_token_views(self):
+        User.objects.create_user(username='metrics_user', password='test123')
+        client = APIClient()
+        response = client.post('/api/token/', {'username': 'metrics_user', 'password': 'test123'}, format='json')
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        client.get('/api/accounts/')
+        client.get('/api/accounts/999/')
+
+        text = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token').content.decode()
+        self.assertIn('http_request_duration_seconds_count{method="POST",view="token_obtain_pair"}', text)
+        self.assertIn('http_request_serializer_seconds_count{method="POST",view="token_obtain_pair"}', text)
+        self.assertIn('http_request_db_seconds_count{method="GET",view="account:account-list"}', text)
+        self.assertIn('http_request_errors_total{method="GET",status="404",view="account:account-detail"}', text)
+        self.assertIn('http_response_bytes_total{method="GET",view="account:account-list"}', text)
+
+    async def test_event_stream_is_kept_out_of_the_latency_histogram(self):
+        user = await User.objects.acreate_user(username='stream_user', password='test123')
+        token = RefreshToken.for_user(user).access_token
+        response = await self.async_client.get('/api/sync/events/', headers={'Authorization': f'Bearer {token}'})
+        self.assertTrue(response.streaming)
+
+        text = (await self.async_client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'})).content.decode()
+        self.assertIn('http_response_headers_seconds_count{method="GET",view="sync:events"} ', text)
+        self.assertIn('http_requests_total{method="GET",status="200",view="sync:events"} ', text)
+        self.assertNotIn('http_request_duration_seconds_count{method="GET",view="sync:events"}', text)
+
+    def test_endpoint_needs_the_token_or_staff(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.client.force_login(User.objects.create_user(username='metrics_viewer', password='test123'))
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(User.objects.create_user(username='metrics_staff', password='test123', is_staff=True))
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        with self.settings(METRICS_TOKEN=''):
+            self.client.logout()
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.settings_override = override_settings(PROFILE_DIR=Path(self.directory.name), PROFILE_SAMPLE_INTERVAL=0.001)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def _client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client
+
+    def test_staff_request_is_profiled(self):
+        staff = User.objects.create_user(username='staff_user', password='test123', is_staff=True)
+        client = self._client_for(staff)
+        response = client.get('/api/transactions/?_profile=1')
+
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+        self.assertIn('profile-queryset;dur=', response['Server-Timing'])
+        self.assertTrue(Path(self.directory.name, f'{profile_id}.prof').exists())
+        self.assertTrue(Path(self.directory.name, f'{profile_id}.collapsed').exists())
+
+        download = client.get(f'/profiles/{profile_id}.collapsed')
+        self.assertEqual(download.status_code, 200)
+
+    async def test_async_staff_request_is_profiled(self):
+        staff = await User.objects.acreate_user(username='async_staff', password='test123', is_staff=True)
+        token = RefreshToken.for_user(staff).access_token
+        response = await self.async_client.get(
+            '/api/transactions/?_profile=1', headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('profile-queryset;dur=', response['Server-Timing'])
+        self.assertTrue(Path(self.directory.name, f"{response['X-Profile-Id']}.prof").exists())
+
+    async def test_event_stream_is_not_profiled(self):
+        staff = await User.objects.acreate_user(username='stream_staff', password='test123', is_staff=True)
+        token = RefreshToken.for_user(staff).access_token
+        response = await self.async_client.get(
+            '/api/sync/events/?_profile=1', headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertTrue(response.streaming)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(list(Path(self.directory.name).iterdir()), [])
+
+    def test_flag_is_ignored_for_regular_users(self):
+        user = User.objects.create_user(username='plain_user', password='test123')
+        response = self._client_for(user).get('/api/transactions/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+
+
+class ReplicaRouterTests(TestCase):
+    def _route(self, method, path='/api/accounts/', user=None):
+        request = HttpRequest()
+        request.method, request.path = method, path
+        if user is not None:
+            request.user = user
+        token = _routing.set(RoutingState(request, method in ('GET', 'HEAD', 'OPTIONS') and not path.startswith('/admin/')))
+        try:
+            return ReplicaRouter().db_for_read(Account)
+        finally:
+            _routing.reset(token)
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_routes_safe_requests_to_replicas(self):
+        self.assertEqual(self._route('GET'), 'replica')
+        self.assertEqual(self._route('POST'), 'default')
+        self.assertEqual(self._route('GET', path='/admin/account/account/'), 'default')
+        self.assertEqual(ReplicaRouter().db_for_read(Account), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_pins_user_to_primary_after_write(self):
+        cache.clear()
+        user = User.objects.create_user(username='pinned_user', password='test123')
+        self.assertEqual(self._route('GET', user=user), 'replica')
+        pin_to_primary(user.pk)
+        self.assertEqual(self._route('GET', user=user), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        self.assertEqual(self._route('GET'), 'default')
+
+
+HAS_REPLICA = 'replica' in settings.DATABASES
+
+
+@skipUnless(HAS_REPLICA, "needs a 'replica' database alias, as in backend.test_settings")
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingIntegrationTests(TransactionTestCase):
+    # Real commits, so the replica connection sees the primary's writes.
+    databases = {'default', 'replica'} if HAS_REPLICA else {'default'}
+
+    def test_reads_follow_replica_until_user_writes(self):
+        cache.clear()
+        user = User.objects.create_user(username='replica_user', password='test123')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            client.get('/api/accounts/')
+        self.assertTrue(replica_queries.captured_queries)
+
+        client.post('/api/accounts/', {'name_account': 'Checking', 'balance': '10.00'}, format='json')
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = client.get('/api/accounts/')
+        self.assertEqual(response.data['count'], 1)
+        self.assertFalse(replica_queries.captured_queries)
+
+
+class BatchViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='batch_user', password='test123')
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('100.00'), user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_runs_sub_requests_in_order(self):
+        response = self.client.post('/api/batch/', {'requests': [
+            {'method': 'POST', 'path': '/api/transactions/', 'body': {
+                'amount': '12.00', 'description': 'Lunch', 'account': self.account.id, 'type': 'withdrawal',
+            }},
+            {'method': 'GET', 'path': f'/api/accounts/{self.account.id}/'},
+            {'method': 'GET', 'path': '/api/transactions/?page=1'},
+            {'method': 'GET', 'path': '/api/dashboard/summary/'},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        statuses = [sub['status'] for sub in response.data['responses']]
+        self.assertEqual(statuses, [201, 200, 200, 200])
+        self.assertEqual(response.data['responses'][1]['body']['name_account'], 'Checking')
+        self.assertEqual(response.data['responses'][2]['body']['count'], 1)
+
+    def test_atomic_batch_rolls_back_on_failure(self):
+        response = self.client.post('/api/batch/', {'atomic': True, 'requests': [
+            {'method': 'POST', 'path': '/api/categories/', 'body': {'name': 'Travel'}},
+            {'method': 'POST', 'path': '/api/transactions/', 'body': {'amount': 'not a number'}},
+            {'method': 'POST', 'path': '/api/categories/', 'body': {'name': 'Rent'}},
+        ]}, format='json')
+
+        first, failed, skipped = response.data['responses']
+        self.assertEqual((first['status'], first['rolled_back']), (424, True))
+        self.assertEqual(first['body']['name'], 'Travel')
+        self.assertEqual(failed['status'], 400)
+        self.assertEqual((skipped['status'], skipped['run']), (424, False))
+        self.assertFalse(self.user.categories.exists())
+
+    def test_rejects_non_api_and_nested_batches(self):
+        response = self.client.post('/api/batch/', {'requests': [
+            {'path': '/admin/'},
+            {'method': 'POST', 'path': '/api/batch/', 'body': {'requests': []}},
+        ]}, format='json')
+        self.assertEqual([sub['status'] for sub in response.data['responses']], [400, 400])
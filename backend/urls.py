@@ -15,8 +15,11 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from transaction import views
+from backend.batch import BatchView
+from backend.metrics import metrics_view
+from backend.profiling import profile_download
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
@@ -29,20 +32,35 @@ from rest_framework_simplejwt.views import (
 def api_root(request, format=None):
     return Response({
         'transactions': reverse('transaction:transaction-list', request=request, format=format),
+        'merchants': reverse('transaction:merchant-list', request=request, format=format),
         'accounts': reverse('account:account-list', request=request, format=format),
         'budgets': reverse('budget:budget-list', request=request, format=format),
         'categories': reverse('category:category-list', request=request, format=format),
+        'rules': reverse('category:rule-list', request=request, format=format),
+        'dashboard': reverse('dashboard:dashboard', request=request, format=format),
+        'bootstrap': reverse('dashboard:bootstrap', request=request, format=format),
+        'sync': reverse('sync:sync', request=request, format=format),
+        'recurring': reverse('analytics:recurring-list', request=request, format=format),
+        'forecast': reverse('analytics:forecast', request=request, format=format),
+        'trend': reverse('analytics:trend', request=request, format=format),
+        'anomalies': reverse('analytics:anomalies', request=request, format=format),
     })
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', api_root, name='api-root'),
+    path('api/batch/', BatchView.as_view(), name='batch'),
     path('api/', include('account.urls')),
     path('api/', include('budget.urls')),
     path('api/', include('category.urls')),
     path('api/', include('transaction.urls')),
     path('api/', include('user.urls')),
+    path('api/', include('dashboard.urls')),
+    path('api/', include('sync.urls')),
+    path('api/', include('analytics.urls')),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api-auth/', include('rest_framework.urls')),
+    path('metrics', metrics_view, name='metrics'),
+    re_path(r'^profiles/(?P<profile_id>[\w-]+)\.(?P<kind>prof|collapsed)$', profile_download, name='profile-download'),
 ]
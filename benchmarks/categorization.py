@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Categorization Benchmark
+========================
+Times category.rules.RuleMatcher.categorize on synthetic transactions:
+a rule set of plain, prefix and regex rules over a few hundred merchants,
+against descriptions drawn from those merchants plus noise.
+
+Rules and rows are built in memory, so this measures matching only, not
+the database reads and updates around it in apply_rules.
+
+Run with: python benchmarks/categorization.py [--rules 300] [--rows 100000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def build(rule_count, row_count, seed=0):
+    from category.models import CategoryRule
+
+    rng = random.Random(seed)
+    merchants = [f'merchant{i:04d}' for i in range(rule_count)]
+    rules = []
+    for index, merchant in enumerate(merchants):
+        # Mostly plain text rules, as users write them, and a few regexes.
+        kind = CategoryRule.REGEX if index % 30 == 0 else CategoryRule.PREFIX if index % 3 == 0 else CategoryRule.CONTAINS
+        pattern = rf'{merchant}\s*#?\d*' if kind == CategoryRule.REGEX else merchant
+        rules.append(SimpleNamespace(
+            category_id=index % 40 + 1, kind=kind, pattern=pattern, type='',
+            min_amount=None, max_amount=Decimal('500.00') if index % 5 == 0 else None,
+        ))
+    rows = []
+    for _ in range(row_count):
+        if rng.random() < 0.8:
+            description = f'{rng.choice(merchants)} #{rng.randint(1, 9999)}'
+        else:
+            description = f'POS PURCHASE {rng.randint(1, 10 ** 6)} UNKNOWN'
+        rows.append((description, Decimal(rng.randint(100, 90000)).scaleb(-2), 'withdrawal'))
+    return rules, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', type=int, default=300)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+    from category.rules import RuleMatcher
+
+    rules, rows = build(args.rules, args.rows)
+    start = time.perf_counter()
+    matcher = RuleMatcher(rules)
+    compile_time = time.perf_counter() - start
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        categories = matcher.categorize(rows)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    matched = sum(category is not None for category in categories)
+    print(f'{len(rules)} rules compiled in {compile_time * 1000:.1f} ms; {len(rows)} rows, {matched} categorized')
+    print(f'median {timings[len(timings) // 2] * 1000:.1f} ms, best {timings[0] * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
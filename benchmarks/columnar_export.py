@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Columnar Export Benchmark
+=========================
+Times analytics.export.write on synthetic transaction rows, shaped as
+values_list returns them, and reports rows per second and the peak
+resident memory of the process.
+
+Rows are generated lazily, so this measures conversion to Arrow and
+writing only, not the database cursor in front of them. Peak memory
+should stay flat as --rows grows; it depends on --batch-size.
+
+Run with: python benchmarks/columnar_export.py [--rows 2000000] [--batch-size 100000] [--format parquet]
+"""
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def transaction_rows(model, count):
+    # One tuple per row in concrete field order, cycling through a few values per column.
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    samples = {
+        'DecimalField': [Decimal(f'{cents // 100}.{cents % 100:02d}') for cents in range(100, 50000, 997)],
+        'DateTimeField': [start + timedelta(minutes=37 * i) for i in range(500)],
+        'ForeignKey': list(range(1, 200)),
+        'CharField': ['withdrawal', 'deposit'],
+        'description': [f'Store {i} purchase' for i in range(400)],
+    }
+    columns = [
+        samples.get(field.name, samples.get(field.get_internal_type(), [None])) for field in model._meta.concrete_fields
+    ]
+    for index in range(count):
+        yield tuple(index + 1 if position == 0 else values[index % len(values)] for position, values in enumerate(columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--batch-size', type=int, default=100_000)
+    parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet')
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+    from analytics.export import schema, write
+    from transaction.models import Transaction
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / f'transactions.{args.format}'
+        start = time.perf_counter()
+        count = write(transaction_rows(Transaction, args.rows), str(path), schema(Transaction), args.format, args.batch_size)
+        elapsed = time.perf_counter() - start
+        size = path.stat().st_size
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'{count} rows in {elapsed:.2f}s, {count / elapsed:,.0f} rows/s, {size / 2 ** 20:.1f} MiB written')
+    print(f'peak RSS {peak:.0f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""
+Database Connection Benchmark
+=============================
+Compares API requests/second against a local Postgres for each DB_PROFILE
+in backend/settings.py:
+
+    (default)    a new connection per request
+    persistent   CONN_MAX_AGE with health checks
+    production   psycopg 3 pool with server-side prepared statements
+
+Each profile runs in its own process, since settings are read once at
+startup. The process serves the app with Django's threaded WSGI server and
+sends it real HTTP requests. Every client thread keeps one keep-alive
+connection, which the server handles on one thread of its own, like a
+worker thread. The test client is not used: it disconnects the
+request_started / request_finished handlers that close or return database
+connections, so it never pays for connecting and never gives pooled
+connections back.
+
+Run with: python benchmarks/db_pooling.py [--requests 2000] [--threads 8]
+Connection details come from the DB_* environment variables.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+PROFILES = ['', 'persistent', 'production']
+PATHS = ['/api/transactions/', '/api/accounts/', '/api/budgets/', '/api/categories/']
+
+
+def run_worker(requests, threads):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+    import django
+    from django.conf import settings
+    settings.ALLOWED_HOSTS.append('127.0.0.1')
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.core.wsgi import get_wsgi_application
+    from django.db import connections
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from account.models import Account
+    from transaction.models import Transaction
+
+    user, _ = User.objects.get_or_create(username='bench_pool_user')
+    account = Account.objects.create(name_account='Bench', balance=Decimal('100.00'), user=user)
+    Transaction.objects.bulk_create([
+        Transaction(user=user, account=account, amount=Decimal('9.99'), description=f'Bench {i}', type='withdrawal')
+        for i in range(100)
+    ])
+    token = str(RefreshToken.for_user(user).access_token)
+    connections.close_all()
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+    server.set_app(get_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    per_thread = requests // threads
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        client = http.client.HTTPConnection('127.0.0.1', port)
+        headers = {'Authorization': f'Bearer {token}'}
+        local = []
+        for i in range(per_thread):
+            start = time.perf_counter()
+            client.request('GET', PATHS[i % len(PATHS)], headers=headers)
+            response = client.getresponse()
+            response.read()
+            local.append(time.perf_counter() - start)
+            assert response.status == 200, response.status
+        client.close()
+        with lock:
+            latencies.extend(local)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    server.server_close()
+
+    user.delete()
+    latencies.sort()
+    print(json.dumps({
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.requests, args.threads)
+        return
+
+    print(f'HTTP GETs to a threaded WSGI server, {args.threads} keep-alive clients')
+    print(f"{'profile':<12} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for profile in PROFILES:
+        env = dict(os.environ, DB_PROFILE=profile, DB_POOL_MAX_SIZE=str(max(args.threads, 2)))
+        result = subprocess.run(
+            [sys.executable, __file__, '--worker', '--requests', str(args.requests), '--threads', str(args.threads)],
+            env=env, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            print(f"{profile or 'default':<12} failed:\n{result.stderr}")
+            continue
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{profile or 'default':<12} {stats['rps']:>8.1f} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Recurring Detection Benchmark
+=============================
+Times analytics.recurring.detect on a synthetic history: a handful of
+subscriptions and a paycheck, plus everyday spending spread over many
+merchants, for the given number of years.
+
+The history is built directly as arrays, so this measures detection only,
+not the database load in front of it.
+
+Run with: python benchmarks/recurring_detection.py [--years 10] [--per-day 6] [--repeat 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def build_history(years, per_day, seed=0):
+    from analytics.recurring import EPOCH, History
+
+    rng = np.random.default_rng(seed)
+    end = (date(2026, 1, 1) - EPOCH).days
+    start = end - 365 * years
+    descriptions, cents, days, deposits = [], [], [], []
+
+    for name, interval, amount in [('Netflix', 30, 1599), ('Spotify', 30, 999), ('Gym', 30, 4000),
+                                   ('Insurance', 91, 32000), ('Domain', 365, 1500)]:
+        for day in range(start, end, interval):
+            descriptions.append(name)
+            cents.append(amount)
+            days.append(day)
+            deposits.append(False)
+    for day in range(start, end, 14):
+        descriptions.append('ACME PAYROLL')
+        cents.append(250000)
+        days.append(day)
+        deposits.append(True)
+
+    count = (end - start) * per_day
+    merchants = [f'Store {i}' for i in range(400)]
+    descriptions.extend(rng.choice(merchants, count))
+    cents.extend(rng.integers(100, 20000, count))
+    days.extend(rng.integers(start, end, count))
+    deposits.extend([False] * count)
+
+    names, codes = np.unique(descriptions, return_inverse=True)
+    return History(
+        ids=np.arange(1, len(days) + 1),
+        cents=np.array(cents, np.int64),
+        days=np.array(days, np.int64),
+        codes=codes.astype(np.int64),
+        deposits=np.array(deposits),
+        merchants=np.char.lower(names),
+    ), date(2026, 1, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--per-day', type=int, default=6)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+    from analytics.recurring import detect
+
+    history, today = build_history(args.years, args.per_day)
+    detect(history, today)
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        series = detect(history, today)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f'{len(history.ids)} transactions over {args.years} years, {len(series)} series found')
+    print(f'median {timings[len(timings) // 2] * 1000:.2f} ms, best {timings[0] * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
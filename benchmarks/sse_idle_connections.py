@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"""
+Idle Event Stream Benchmark
+===========================
+Opens many concurrent /api/sync/events/ streams against one ASGI worker and
+reports what they cost while idle, and how long one committed change takes
+to reach all of them.
+
+Streams are driven straight through backend.asgi.application in this
+process, without sockets, so the numbers are the application's own cost per
+connection: memory, threads, and fan-out latency.
+
+Run with: python benchmarks/sse_idle_connections.py [--connections 1000 2000 5000] [--users 10]
+The database must be migrated; connection details come from the DB_*
+environment variables.
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def rss_mb():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+class Stream:
+    """One client connection, speaking ASGI to the application."""
+
+    def __init__(self, application, token):
+        self.application = application
+        self.token = token
+        self.connected = asyncio.Event()
+        self.disconnect = asyncio.Event()
+        self.received = asyncio.Event()
+        self.started = False
+        self.status = None
+
+    async def receive(self):
+        if not self.started:
+            self.started = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+        elif message['type'] == 'http.response.body':
+            body = message.get('body', b'')
+            if body.startswith(b': connected'):
+                self.connected.set()
+            elif b'event: change' in body:
+                self.received.set()
+
+    async def run(self):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': '/api/sync/events/', 'raw_path': b'/api/sync/events/',
+            'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {self.token}'.encode())],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        await self.application(scope, self.receive, self.send)
+
+
+async def measure(application, tokens, connections, write):
+    from sync.events import broadcaster
+
+    rss_before = rss_mb()
+    threads_before = threading.active_count()
+    streams = [Stream(application, tokens[i % len(tokens)]) for i in range(connections)]
+    tasks = [asyncio.create_task(stream.run()) for stream in streams]
+
+    start = time.perf_counter()
+    await asyncio.wait_for(asyncio.gather(*(stream.connected.wait() for stream in streams)), 300)
+    connect_time = time.perf_counter() - start
+    assert broadcaster.subscriber_count() == connections, broadcaster.subscriber_count()
+
+    # Let the streams sit idle, then look at what they hold on to.
+    await asyncio.sleep(1)
+    idle_rss = rss_mb() - rss_before
+    idle_threads = threading.active_count() - threads_before
+
+    start = time.perf_counter()
+    await asyncio.to_thread(write)
+    await asyncio.wait_for(asyncio.gather(*(stream.received.wait() for stream in streams)), 60)
+    fanout = time.perf_counter() - start
+
+    for stream in streams:
+        stream.disconnect.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        'connect_s': connect_time,
+        'kb_per_conn': idle_rss * 1024 / connections,
+        'threads': idle_threads,
+        'fanout_ms': fanout * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, nargs='+', default=[1000, 2000, 5000])
+    parser.add_argument('--users', type=int, default=10)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    from backend.asgi import application
+    from django.contrib.auth.models import User
+    from django.db import connections
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from account.models import Account
+
+    users = [User.objects.get_or_create(username=f'bench_sse_user_{i}')[0] for i in range(args.users)]
+    tokens = [str(RefreshToken.for_user(user).access_token) for user in users]
+    accounts = [Account.objects.create(name_account='Bench', balance=Decimal('0.00'), user=user) for user in users]
+    connections.close_all()
+
+    def write():
+        # One change per user reaches every stream.
+        for account in accounts:
+            account.balance += 1
+            account.save()
+        connections.close_all()
+
+    print(f"{'streams':>8} {'connect s':>10} {'KB/stream':>10} {'threads':>8} {'fan-out ms':>11}")
+    try:
+        for count in args.connections:
+            stats = asyncio.run(measure(application, tokens, count, write))
+            print(
+                f"{count:>8} {stats['connect_s']:>10.2f} {stats['kb_per_conn']:>10.1f} "
+                f"{stats['threads']:>8} {stats['fanout_ms']:>11.1f}"
+            )
+    finally:
+        User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,9 @@ from django.contrib import admin
 from django.db.models import Sum
 from django.utils.html import format_html
 from django.utils import timezone
-from .models import Budget
+from .models import ENDED, ON_TRACK, OVER, WARNING, Budget, budget_status
 from category.models import Category
+from dashboard.signals import bulk_updated, owned_rows
 
 
 class CategoryInline(admin.TabularInline):
@@ -84,7 +85,7 @@ class BudgetAdmin(admin.ModelAdmin):
         if obj.total_amount == 0:
             percentage = 0
         else:
-            percentage = min((float(obj.spent_amount) / float(obj.total_amount)) * 100, 100)
+            percentage = obj.spent_amount * 100 / obj.total_amount
 
         if percentage > 100:
             color = '#dc3545'  # red
@@ -95,53 +96,57 @@ class BudgetAdmin(admin.ModelAdmin):
 
         return format_html(
             '''<div style="width: 100px; background: #e9ecef; border-radius: 4px; overflow: hidden;">
-                <div style="width: {:.0f}%; background: {}; height: 20px; text-align: center; color: white; font-size: 11px; line-height: 20px;">
-                    {:.0f}%
+                <div style="width: {}%; background: {}; height: 20px; text-align: center; color: white; font-size: 11px; line-height: 20px;">
+                    {}%
                 </div>
             </div>''',
-            percentage, color, percentage
+            f'{min(percentage, 100):.0f}', color, f'{percentage:.0f}'
         )
     progress_bar.short_description = 'Progress'
 
     def spent_display(self, obj):
-        return format_html('<span style="color: #dc3545;">${:,.2f}</span>', obj.spent_amount)
+        return format_html('<span style="color: #dc3545;">${}</span>', f'{obj.spent_amount:,.2f}')
     spent_display.short_description = 'Spent'
     spent_display.admin_order_field = 'spent_amount'
 
     def total_display(self, obj):
-        return format_html('<span style="font-weight: bold;">${:,.2f}</span>', obj.total_amount)
+        return format_html('<span style="font-weight: bold;">${}</span>', f'{obj.total_amount:,.2f}')
     total_display.short_description = 'Budget'
     total_display.admin_order_field = 'total_amount'
 
     def remaining_display(self, obj):
-        remaining = float(obj.total_amount) - float(obj.spent_amount)
+        remaining = obj.total_amount - obj.spent_amount
         color = 'green' if remaining >= 0 else 'red'
-        return format_html('<span style="color: {};">${:,.2f}</span>', color, remaining)
+        return format_html('<span style="color: {};">${}</span>', color, f'{remaining:,.2f}')
     remaining_display.short_description = 'Remaining'
 
     def date_range(self, obj):
         return f"{obj.start_date.strftime('%m/%d/%y')} - {obj.end_date.strftime('%m/%d/%y')}"
     date_range.short_description = 'Period'
 
-    def status_badge(self, obj):
-        today = timezone.now().date()
-        percentage = (float(obj.spent_amount) / float(obj.total_amount)) * 100 if obj.total_amount > 0 else 0
+    STATUS_COLORS = {
+        ENDED: ('#6c757d', 'white'),
+        OVER: ('#dc3545', 'white'),
+        WARNING: ('#ffc107', 'black'),
+        ON_TRACK: ('#28a745', 'white'),
+    }
 
-        if obj.end_date < today:
-            return format_html('<span style="background: #6c757d; color: white; padding: 3px 8px; border-radius: 3px; font-size: 11px;">ENDED</span>')
-        elif percentage > 100:
-            return format_html('<span style="background: #dc3545; color: white; padding: 3px 8px; border-radius: 3px; font-size: 11px;">OVER</span>')
-        elif percentage > 80:
-            return format_html('<span style="background: #ffc107; color: black; padding: 3px 8px; border-radius: 3px; font-size: 11px;">WARNING</span>')
-        else:
-            return format_html('<span style="background: #28a745; color: white; padding: 3px 8px; border-radius: 3px; font-size: 11px;">ON TRACK</span>')
+    def status_badge(self, obj):
+        status = budget_status(obj.spent_amount, obj.total_amount, obj.end_date)
+        background, color = self.STATUS_COLORS[status]
+        return format_html(
+            '<span style="background: {}; color: {}; padding: 3px 8px; border-radius: 3px; font-size: 11px;">{}</span>',
+            background, color, status,
+        )
     status_badge.short_description = 'Status'
 
     actions = ['reset_spent_amount', 'extend_by_month', 'duplicate_budget']
 
     @admin.action(description='Reset spent amount to zero')
     def reset_spent_amount(self, request, queryset):
+        pks, user_ids = owned_rows(queryset)
         updated = queryset.update(spent_amount=0)
+        bulk_updated.send(sender=queryset.model, pks=pks, user_ids=user_ids)
         self.message_user(request, f'{updated} budget(s) reset to zero spent.')
 
     @admin.action(description='Extend end date by 1 month')
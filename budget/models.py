@@ -1,7 +1,27 @@
 from django.db import models
+from django.utils import timezone
 from account.models import Account
 from django.contrib.auth.models import User
 
+ENDED = 'ENDED'
+OVER = 'OVER'
+WARNING = 'WARNING'
+ON_TRACK = 'ON TRACK'
+
+
+def budget_status(spent, total, end_date, today=None):
+    """ENDED once the period is over, else OVER above 100% spent, WARNING above 80%, else ON TRACK."""
+    today = today or timezone.now().date()
+    percentage = spent / total * 100 if total > 0 else 0
+    if end_date < today:
+        return ENDED
+    if percentage > 100:
+        return OVER
+    if percentage > 80:
+        return WARNING
+    return ON_TRACK
+
+
 # Create your models here.
 class Budget(models.Model):
     name = models.CharField(max_length=100)  # name of the budget
@@ -1,8 +1,29 @@
 from rest_framework import serializers
+from backend.metrics import TimedSerializerMixin
 from .models import Budget
 
-class BudgetSerializer(serializers.ModelSerializer):
+class BudgetSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Budget
         fields = ['id', 'name', 'total_amount', 'account', 'start_date', 'end_date', 'spent_amount', 'user']
         read_only_fields = ['id', 'user']
+
+
+class CategorySpendingSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    spent = serializers.DecimalField(max_digits=15, decimal_places=2)
+
+
+class BudgetProgressSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    account = serializers.IntegerField()
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    total_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    spent = serializers.DecimalField(max_digits=15, decimal_places=2)
+    remaining = serializers.DecimalField(max_digits=15, decimal_places=2)
+    percent = serializers.DecimalField(max_digits=9, decimal_places=1)
+    status = serializers.CharField()
+    categories = CategorySpendingSerializer(many=True)
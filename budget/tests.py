@@ -1,3 +1,115 @@
-from django.test import TestCase
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from account.models import Account
+from budget.models import Budget, budget_status
+from category.models import Category
+from transaction.models import Transaction
+
+
+class BudgetStatusTests(TestCase):
+    def test_rules(self):
+        today = date(2026, 1, 15)
+        end = date(2026, 1, 31)
+        self.assertEqual(budget_status(Decimal('50'), Decimal('100'), end, today), 'ON TRACK')
+        self.assertEqual(budget_status(Decimal('80'), Decimal('100'), end, today), 'ON TRACK')
+        self.assertEqual(budget_status(Decimal('81'), Decimal('100'), end, today), 'WARNING')
+        self.assertEqual(budget_status(Decimal('101'), Decimal('100'), end, today), 'OVER')
+        self.assertEqual(budget_status(Decimal('101'), Decimal('100'), date(2026, 1, 1), today), 'ENDED')
+        self.assertEqual(budget_status(Decimal('5'), Decimal('0'), end, today), 'ON TRACK')
+
+
+class BudgetProgressTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='progress_user', password='test123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('500.00'), user=self.user)
+        today = timezone.now().date()
+        self.budget = Budget.objects.create(
+            name='Monthly', total_amount=Decimal('100.00'), account=self.account,
+            start_date=today - timedelta(days=10), end_date=today + timedelta(days=10), user=self.user,
+        )
+        self.food = Category.objects.create(name='Food', user=self.user, budget=self.budget)
+        self.fun = Category.objects.create(name='Fun', user=self.user, budget=self.budget)
+        Category.objects.create(name='Unbudgeted', user=self.user)
+
+    def _spend(self, category, amount, when=None, type='withdrawal'):
+        transaction = Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), description='Spend', account=self.account,
+            budget_category=category, type=type,
+        )
+        if when is not None:
+            Transaction.objects.filter(pk=transaction.pk).update(date=when)
+
+    def test_progress(self):
+        self._spend(self.food, '60.00')
+        self._spend(self.fun, '25.00')
+        self._spend(self.fun, '500.00', type='deposit')
+        outside = timezone.make_aware(datetime.combine(self.budget.start_date - timedelta(days=1), datetime.min.time()))
+        self._spend(self.food, '999.00', when=outside)
+        Budget.objects.create(
+            name='Empty', total_amount=Decimal('50.00'), account=self.account,
+            start_date=date(2020, 1, 1), end_date=date(2020, 1, 31), user=self.user,
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/budgets/progress/')
+        self.assertEqual(response.status_code, 200)
+        # The data versions, the grouped query and the archive cutoff.
+        self.assertEqual(len(queries), 3)
+
+        monthly, empty = response.data
+        self.assertEqual(monthly['spent'], '85.00')
+        self.assertEqual(monthly['remaining'], '15.00')
+        self.assertEqual(monthly['percent'], '85.0')
+        self.assertEqual(monthly['status'], 'WARNING')
+        self.assertEqual(
+            [(c['name'], c['spent']) for c in monthly['categories']],
+            [('Food', '60.00'), ('Fun', '25.00')],
+        )
+        self.assertEqual((empty['spent'], empty['status'], empty['categories']), ('0.00', 'ENDED', []))
+
+    def test_counts_archived_spending(self):
+        start = timezone.make_aware(datetime.combine(self.budget.start_date, datetime.min.time()))
+        self._spend(self.food, '60.00', when=start + timedelta(hours=12))
+        self._spend(self.food, '999.00', when=start - timedelta(hours=12))
+        self._spend(self.fun, '25.00')
+        with tempfile.TemporaryDirectory() as directory, override_settings(TRANSACTION_ARCHIVE_DIR=directory):
+            call_command('archive_transactions', before=timezone.localdate().isoformat(), stdout=StringIO())
+            self.assertEqual(Transaction.objects.count(), 1)
+            monthly, = self.client.get('/api/budgets/progress/').data
+        self.assertEqual(monthly['spent'], '85.00')
+        self.assertEqual(
+            [(c['name'], c['spent']) for c in monthly['categories']],
+            [('Food', '60.00'), ('Fun', '25.00')],
+        )
+
+    def test_filters_by_account(self):
+        other = Account.objects.create(name_account='Savings', balance=Decimal('0.00'), user=self.user)
+        response = self.client.get('/api/budgets/progress/', {'account': other.id})
+        self.assertEqual(response.data, [])
+
+    def test_rejects_bad_account(self):
+        for account in ['abc', '9' * 30, '0']:
+            response = self.client.get('/api/budgets/progress/', {'account': account})
+            self.assertEqual(response.status_code, 400, account)
+            self.assertIn('account', response.data)
+
+    def test_admin_changelist_is_exact(self):
+        Budget.objects.filter(pk=self.budget.pk).update(total_amount=Decimal('0.30'), spent_amount=Decimal('0.10'))
+        self.client.force_login(User.objects.create_superuser(username='budget_admin', password='test123'))
+        response = self.client.get('/admin/budget/budget/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '$0.20</span>')
+        self.assertContains(response, '33%')
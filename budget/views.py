@@ -1,7 +1,92 @@
-from .models import Budget
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Budget, budget_status
 from rest_framework import permissions
 from rest_framework import viewsets
-from budget.serializers import BudgetSerializer
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from budget.serializers import BudgetProgressSerializer, BudgetSerializer
+from dashboard.memo import memoize
+from transaction.archive import archived_rows
+
+MAX_ID = 2 ** 63 - 1  # largest bigint
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _add_archived_spending(user_id, budgets):
+    """
+    Add the archived withdrawals (transaction.archive) in each budget's
+    window and categories to its spending. One read of the archive for the
+    span of all the budgets; nothing to read for budgets after the cutoff.
+    """
+    budgets = [budget for budget in budgets if budget['categories']]
+    if not budgets:
+        return
+    start = _day_start(min(budget['start_date'] for budget in budgets))
+    end = _day_start(max(budget['end_date'] for budget in budgets) + timedelta(days=1))
+    rows = [row for row in archived_rows(user_id, start, end) if row['type'] == 'withdrawal']
+    for budget in budgets:
+        window = (_day_start(budget['start_date']), _day_start(budget['end_date'] + timedelta(days=1)))
+        categories = {category['id']: category for category in budget['categories']}
+        for row in rows:
+            category = categories.get(row['budget_category'])
+            if category is not None and window[0] <= parse_datetime(row['date']) < window[1]:
+                amount = Decimal(row['amount'])
+                category['spent'] += amount
+                budget['spent'] += amount
+
+
+@memoize('budget_progress', ('budgets', 'categories', 'transactions'))
+def budget_progress(user, account_id, today):
+    """The rows of /api/budgets/progress/ for ``user``'s budgets, or only those of ``account_id`` if given."""
+    budgets = Budget.objects.filter(user=user)
+    if account_id is not None:
+        budgets = budgets.filter(account_id=account_id)
+    in_window = Q(
+        categories__transactions__type='withdrawal',
+        categories__transactions__date__date__gte=F('start_date'),
+        categories__transactions__date__date__lte=F('end_date'),
+    )
+    rows = (
+        budgets
+        .values('id', 'name', 'account', 'start_date', 'end_date', 'total_amount', 'categories__id', 'categories__name')
+        .annotate(spent=Sum('categories__transactions__amount', filter=in_window))
+        .order_by('-start_date', 'id', 'categories__name')
+    )
+
+    progress = {}
+    for row in rows:
+        budget = progress.setdefault(row['id'], {
+            'id': row['id'],
+            'name': row['name'],
+            'account': row['account'],
+            'start_date': row['start_date'],
+            'end_date': row['end_date'],
+            'total_amount': row['total_amount'],
+            'spent': Decimal('0'),
+            'categories': [],
+        })
+        if row['categories__id'] is not None:
+            spent = row['spent'] or Decimal('0')
+            budget['spent'] += spent
+            budget['categories'].append({'id': row['categories__id'], 'name': row['categories__name'], 'spent': spent})
+    _add_archived_spending(user.id, progress.values())
+
+    for budget in progress.values():
+        total = budget['total_amount']
+        budget['remaining'] = total - budget['spent']
+        budget['percent'] = budget['spent'] / total * 100 if total > 0 else Decimal('0')
+        budget['status'] = budget_status(budget['spent'], total, budget['end_date'], today)
+    return list(progress.values())
+
 
 class BudgetViewSet(viewsets.ModelViewSet):
     serializer_class = BudgetSerializer
@@ -9,6 +94,30 @@ class BudgetViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         return Budget.objects.filter(user=self.request.user)
-    
+
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
\ No newline at end of file
+        serializer.save(user=self.request.user)
+
+    @action(detail=False)
+    def progress(self, request):
+        """
+        Spent, remaining, percent and status of every budget, with spending
+        per linked category, from one grouped query.
+
+        Spending is the sum of withdrawals in the budget's categories dated
+        within its start and end date, archived ones included (read from
+        the archive only for budgets reaching before the user's archive
+        cutoff). ``?account=<id>`` limits the result
+        to that account's budgets. Results are memoized until the user's
+        budgets, categories or transactions change (dashboard.memo).
+        """
+        account = request.query_params.get('account')
+        if account:
+            try:
+                account = int(account)
+            except ValueError:
+                account = 0
+            if not 0 < account <= MAX_ID:
+                raise ValidationError({'account': 'Must be an account id.'})
+        progress = budget_progress(request.user, account or None, timezone.now().date())
+        return Response(BudgetProgressSerializer(progress, many=True).data)
@@ -3,6 +3,7 @@ from django.db.models import Sum, Count
 from django.utils.html import format_html
 from .models import Category
 from transaction.models import Transaction
+from dashboard.signals import bulk_updated, owned_rows
 
 
 class TransactionInline(admin.TabularInline):
@@ -98,7 +99,9 @@ class CategoryAdmin(admin.ModelAdmin):
 
     @admin.action(description='Unlink from budget')
     def unlink_from_budget(self, request, queryset):
+        pks, user_ids = owned_rows(queryset)
         updated = queryset.update(budget=None)
+        bulk_updated.send(sender=queryset.model, pks=pks, user_ids=user_ids)
         self.message_user(request, f'{updated} category(ies) unlinked from budgets.')
 
     @admin.action(description='Show spending summary')
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('category', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('contains', 'Contains'), ('prefix', 'Starts with'), ('regex', 'Regular expression')], default='contains', max_length=10)),
+                ('pattern', models.CharField(blank=True, max_length=255)),
+                ('min_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('type', models.CharField(blank=True, choices=[('deposit', 'Deposit'), ('withdrawal', 'Withdrawal')], max_length=50)),
+                ('priority', models.PositiveIntegerField(default=100)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rules', to='category.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_rules', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -9,4 +9,23 @@ class Category(models.Model):
     budget = models.ForeignKey('budget.Budget', on_delete=models.CASCADE, related_name='categories', blank=True, null=True)  # associated budget, optional
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+class CategoryRule(models.Model):
+    """Puts matching uncategorized transactions into ``category`` (see category.rules)."""
+    CONTAINS = 'contains'
+    PREFIX = 'prefix'
+    REGEX = 'regex'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='category_rules')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='rules')  # category to assign
+    kind = models.CharField(max_length=10, choices=[(CONTAINS, 'Contains'), (PREFIX, 'Starts with'), (REGEX, 'Regular expression')], default=CONTAINS)
+    pattern = models.CharField(max_length=255, blank=True)  # matched case-insensitively against the description; blank matches any
+    min_amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)  # inclusive
+    max_amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)  # inclusive
+    type = models.CharField(max_length=50, choices=[('deposit', 'Deposit'), ('withdrawal', 'Withdrawal')], blank=True)  # blank matches both
+    priority = models.PositiveIntegerField(default=100)  # lower wins when several rules match
+
+    def __str__(self):
+        return f"{self.kind} {self.pattern!r} -> {self.category_id}"
@@ -0,0 +1,237 @@
+"""
+Rule-based categorization.
+
+A user's CategoryRules are compiled into one RuleMatcher. All "contains"
+and "starts with" texts are merged into a single trie-shaped regex, so one
+scan of a description finds every literal rule it matches, however many
+rules there are; regex rules are searched on their own. Amount range and
+type are checked afterwards on the few candidates, in priority order.
+Since this runs on every new transaction, ``validate_pattern`` only
+accepts short regexes without the shapes that backtrack catastrophically.
+
+Compiled matchers are kept in a per-process LRU cache keyed by the user's
+'rules' data version. Rule edits bump it in the database every process
+reads it from (dashboard.versioning), so each process drops a stale
+matcher on its next lookup.
+"""
+
+import re
+from decimal import Decimal
+from functools import lru_cache
+
+from django.db import transaction as db_transaction
+
+from dashboard.signals import bulk_updated
+from dashboard.versioning import get_versions
+from transaction.models import Transaction
+from .models import CategoryRule
+
+try:
+    from re import _parser
+except ImportError:  # Python < 3.11
+    import sre_parse as _parser
+
+MATCHER_CACHE_SIZE = 256
+APPLY_CHUNK_SIZE = 5000
+MAX_PATTERN_LENGTH = 100
+MAX_UNBOUNDED_REPEATS = 2
+
+_REPEATS = {_parser.MAX_REPEAT, _parser.MIN_REPEAT, getattr(_parser, 'POSSESSIVE_REPEAT', _parser.MAX_REPEAT)}
+
+
+def _backtracking_risk(items, repeated, counts):
+    """
+    Why the parsed pattern ``items`` could make the regex engine backtrack
+    exponentially (or with a high polynomial) on a short description, or None.
+    ``repeated`` is whether ``items`` sit inside a repeat.
+    """
+    for op, arg in items:
+        if op in _REPEATS:
+            low, high, body = arg
+            if high == _parser.MAXREPEAT:
+                counts['unbounded'] += 1
+            if repeated and low != high:
+                return 'nested quantifiers such as (a+)+'
+            error = _backtracking_risk(body, repeated or high > 1, counts)
+        elif op is _parser.SUBPATTERN:
+            error = _backtracking_risk(arg[-1], repeated, counts)
+        elif op is _parser.BRANCH:
+            starts = [branch[0] if len(branch) else None for branch in arg[1]]
+            if repeated and (
+                any(start is None or start[0] is not _parser.LITERAL for start in starts)
+                or len({chr(start[1]).lower() for start in starts}) < len(starts)
+            ):
+                return 'repeated alternatives that can match the same text, such as (a|ab)*'
+            error = next(
+                (error for branch in arg[1] if (error := _backtracking_risk(branch, repeated, counts))), None,
+            )
+        elif op in (_parser.ASSERT, _parser.ASSERT_NOT):
+            error = _backtracking_risk(arg[1], repeated, counts)
+        elif op in (_parser.GROUPREF, _parser.GROUPREF_EXISTS):
+            return 'backreferences'
+        else:
+            error = None
+        if error:
+            return error
+    if counts['unbounded'] > MAX_UNBOUNDED_REPEATS:
+        return f'more than {MAX_UNBOUNDED_REPEATS} unbounded repeats (*, + or {{n,}})'
+    return None
+
+
+def validate_pattern(kind, pattern):
+    """
+    Return an error message for a pattern that cannot be compiled, or could
+    take the regex engine exponential time, else None. Rules run on every
+    new transaction, so a pattern has to be cheap on any description.
+    """
+    if kind != CategoryRule.REGEX:
+        return None
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        return f'Regular expressions are limited to {MAX_PATTERN_LENGTH} characters.'
+    try:
+        re.compile(pattern)
+    except re.error as error:
+        return f'Invalid regular expression: {error}.'
+    risk = _backtracking_risk(_parser.parse(pattern, re.IGNORECASE | re.DOTALL), False, {'unbounded': 0})
+    if risk:
+        return f'Regular expression too slow to run on every transaction: it uses {risk}.'
+    return None
+
+
+def _trie_pattern(words):
+    """
+    One regex matching the longest of ``words`` that starts at a position,
+    shaped as a trie so the engine follows shared prefixes once instead of
+    trying every word in turn.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+class RuleMatcher:
+    def __init__(self, rules):
+        # (category_id, min_amount, max_amount, type), in priority order.
+        self.rules = []
+        self.always = []  # rules without a pattern
+        self.regexes = []  # (index, compiled pattern)
+        contains, prefixes = [], []
+        for rule in rules:
+            index = len(self.rules)
+            self.rules.append((rule.category_id, rule.min_amount, rule.max_amount, rule.type))
+            if not rule.pattern:
+                self.always.append(index)
+            elif rule.kind == CategoryRule.REGEX:
+                # Rules saved before the current checks never match rather
+                # than risk stalling every save.
+                if validate_pattern(rule.kind, rule.pattern) is None:
+                    self.regexes.append((index, re.compile(rule.pattern, re.IGNORECASE | re.DOTALL)))
+            elif rule.kind == CategoryRule.PREFIX:
+                prefixes.append((rule.pattern.lower(), index))
+            else:
+                contains.append((rule.pattern.lower(), index))
+
+        # The scan reports only the longest literal starting at each
+        # position, so each literal maps to every rule it implies: contains
+        # rules whose text occurs in it, prefix rules whose text starts it.
+        literals = {literal for literal, _ in contains + prefixes}
+        self.literal_regex = re.compile(f'(?=({_trie_pattern(literals)}))') if literals else None
+        self.contained = {literal: [index for text, index in contains if text in literal] for literal in literals}
+        self.prefixed = {literal: [index for text, index in prefixes if literal.startswith(text)] for literal in literals}
+
+    def candidates(self, description):
+        """Indexes of the rules whose text matches ``description``, in priority order."""
+        found = set(self.always)
+        if self.literal_regex is not None:
+            text = description.lower()
+            start = len(text) - len(text.lstrip())
+            for match in self.literal_regex.finditer(text):
+                literal = match.group(1)
+                found.update(self.contained[literal])
+                if match.start() == start:
+                    found.update(self.prefixed[literal])
+        for index, regex in self.regexes:
+            if regex.search(description):
+                found.add(index)
+        return sorted(found)
+
+    def category_for(self, candidates, amount, type):
+        for index in candidates:
+            category_id, min_amount, max_amount, rule_type = self.rules[index]
+            if rule_type and rule_type != type:
+                continue
+            if min_amount is not None and amount < min_amount:
+                continue
+            if max_amount is not None and amount > max_amount:
+                continue
+            return category_id
+        return None
+
+    def match(self, description, amount, type):
+        return self.category_for(self.candidates(description), Decimal(str(amount)), type)
+
+    def categorize(self, rows):
+        """
+        Category id (or None) for each ``(description, amount, type)`` in
+        ``rows``. Each distinct description is run through the regex once.
+        """
+        seen = {}
+        results = []
+        for description, amount, type in rows:
+            candidates = seen.get(description)
+            if candidates is None:
+                candidates = seen[description] = self.candidates(description)
+            results.append(self.category_for(candidates, amount, type) if candidates else None)
+        return results
+
+
+@lru_cache(maxsize=MATCHER_CACHE_SIZE)
+def _compiled(user_id, version):
+    return RuleMatcher(CategoryRule.objects.filter(user_id=user_id).order_by('priority', 'id'))
+
+
+def matcher_for(user_id):
+    """The user's compiled RuleMatcher, rebuilt only after their rules change."""
+    return _compiled(user_id, get_versions(user_id, ('rules',))['rules'])
+
+
+def apply_rules(user_id):
+    """
+    Categorize the user's uncategorized transactions with their rules, in
+    chunks, with one set-based update per category. Returns how many
+    transactions were categorized.
+    """
+    matcher = matcher_for(user_id)
+    if not matcher.rules:
+        return 0
+    uncategorized = Transaction.objects.filter(user_id=user_id, budget_category__isnull=True)
+    updated = 0
+    last_id = 0
+    while True:
+        chunk = list(
+            uncategorized.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'description', 'amount', 'type')[:APPLY_CHUNK_SIZE]
+        )
+        if not chunk:
+            return updated
+        last_id = chunk[-1][0]
+        by_category = {}
+        for (transaction_id, *_), category_id in zip(chunk, matcher.categorize(row[1:] for row in chunk)):
+            if category_id is not None:
+                by_category.setdefault(category_id, []).append(transaction_id)
+        with db_transaction.atomic():
+            for category_id, ids in by_category.items():
+                updated += Transaction.objects.filter(pk__in=ids).update(budget_category_id=category_id)
+                bulk_updated.send(sender=Transaction, pks=ids, user_ids=[user_id] * len(ids))
@@ -1,8 +1,37 @@
 from rest_framework import serializers
-from .models import Category
+from backend.metrics import TimedSerializerMixin
+from dashboard.lookups import CachedNameField
+from .models import Category, CategoryRule
+from .rules import validate_pattern
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name', 'description', 'user', 'budget']
         read_only_fields = ['id', 'user']
+
+
+class CategoryRuleSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    category_name = CachedNameField('categories', source='category.name')
+
+    class Meta:
+        model = CategoryRule
+        fields = ['id', 'category', 'category_name', 'kind', 'pattern', 'min_amount', 'max_amount', 'type', 'priority', 'user']
+        read_only_fields = ['id', 'user']
+
+    def validate_category(self, category):
+        if category.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError('Unknown category.')
+        return category
+
+    def validate(self, attrs):
+        kind = attrs.get('kind', getattr(self.instance, 'kind', CategoryRule.CONTAINS))
+        pattern = attrs.get('pattern', getattr(self.instance, 'pattern', ''))
+        error = validate_pattern(kind, pattern)
+        if error:
+            raise serializers.ValidationError({'pattern': error})
+        min_amount = attrs.get('min_amount', getattr(self.instance, 'min_amount', None))
+        max_amount = attrs.get('max_amount', getattr(self.instance, 'max_amount', None))
+        if min_amount is not None and max_amount is not None and min_amount > max_amount:
+            raise serializers.ValidationError({'max_amount': 'Must not be below min_amount.'})
+        return attrs
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from dashboard.versioning import bump
+from transaction.models import Transaction
+from .models import CategoryRule
+from .rules import matcher_for
+
+
+def rules_changed(sender, instance, **kwargs):
+    bump([instance.user_id], 'rules')
+
+
+def categorize_new_transaction(sender, instance, **kwargs):
+    if instance._state.adding and instance.budget_category_id is None and instance.user_id is not None:
+        matcher = matcher_for(instance.user_id)
+        if matcher.rules:
+            instance.budget_category_id = matcher.match(instance.description, instance.amount, instance.type)
+
+
+post_save.connect(rules_changed, sender=CategoryRule, dispatch_uid='category-rules-save')
+post_delete.connect(rules_changed, sender=CategoryRule, dispatch_uid='category-rules-delete')
+pre_save.connect(categorize_new_transaction, sender=Transaction, dispatch_uid='category-rules-categorize')
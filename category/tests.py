@@ -1,3 +1,103 @@
-from django.test import TestCase
+from decimal import Decimal
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from account.models import Account
+from category.models import Category, CategoryRule
+from category.rules import RuleMatcher, validate_pattern
+from transaction.models import Transaction
+
+
+def rule(category_id, pattern, kind=CategoryRule.CONTAINS, min_amount=None, max_amount=None, type=''):
+    return SimpleNamespace(
+        category_id=category_id, pattern=pattern, kind=kind, min_amount=min_amount, max_amount=max_amount, type=type,
+    )
+
+
+class RuleMatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.matcher = RuleMatcher([
+            rule(1, 'uber eats'),
+            rule(2, 'uber'),
+            rule(3, 'AMZN', kind=CategoryRule.PREFIX),
+            rule(4, r'shell\s+\d+', kind=CategoryRule.REGEX),
+            rule(5, '', min_amount=Decimal('1000.00'), type='deposit'),
+        ])
+
+    def test_priority_and_kinds(self):
+        self.assertEqual(self.matcher.match('UBER EATS 1234', '12.50', 'withdrawal'), 1)
+        self.assertEqual(self.matcher.match('Uber trip', '12.50', 'withdrawal'), 2)
+        self.assertEqual(self.matcher.match('  amzn mktp', '30.00', 'withdrawal'), 3)
+        self.assertIsNone(self.matcher.match('paid amzn', '30.00', 'withdrawal'))
+        self.assertEqual(self.matcher.match('SHELL 0042 fuel', '40.00', 'withdrawal'), 4)
+
+    def test_amount_and_type_conditions(self):
+        self.assertEqual(self.matcher.match('Payroll', '2500.00', 'deposit'), 5)
+        self.assertIsNone(self.matcher.match('Payroll', '999.99', 'deposit'))
+        self.assertIsNone(self.matcher.match('Payroll', '2500.00', 'withdrawal'))
+
+    def test_categorize_matches_single_lookups(self):
+        rows = [('Uber', Decimal('9.00'), 'withdrawal'), ('Refund', Decimal('5000.00'), 'deposit'),
+                ('Uber', Decimal('9.00'), 'withdrawal'), ('Coffee', Decimal('3.00'), 'withdrawal')]
+        self.assertEqual(self.matcher.categorize(rows), [self.matcher.match(*row) for row in rows])
+
+    def test_validate_pattern(self):
+        self.assertIsNone(validate_pattern(CategoryRule.CONTAINS, '(('))
+        self.assertIsNotNone(validate_pattern(CategoryRule.REGEX, '(('))
+
+    def test_validate_pattern_rejects_catastrophic_backtracking(self):
+        for pattern in [r'(a+)+$', r'(\w+\s?)+$', r'(?:a{1,3}){2,}', r'(a|ab)*c', r'(.)\1', r'\s*\s*\s*x', 'x' * 101]:
+            self.assertIsNotNone(validate_pattern(CategoryRule.REGEX, pattern), pattern)
+        for pattern in [r'shell\s+\d+', r'^amzn.*prime', r'(foo|bar)+', r'(\d{3})+', r'uber\s*(eats)?']:
+            self.assertIsNone(validate_pattern(CategoryRule.REGEX, pattern), pattern)
+
+    def test_unsafe_stored_patterns_never_match(self):
+        matcher = RuleMatcher([rule(1, r'(a+)+$', kind=CategoryRule.REGEX)])
+        self.assertIsNone(matcher.match('a' * 40 + '!', '1.00', 'withdrawal'))
+
+
+class CategoryRuleTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='rules_user', password='test123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('0.00'), user=self.user)
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.transport = Category.objects.create(name='Transport', user=self.user)
+
+    def _spend(self, description):
+        return Transaction.objects.create(
+            user=self.user, amount=Decimal('12.00'), description=description, account=self.account, type='withdrawal',
+        )
+
+    def test_apply_categorizes_existing_transactions(self):
+        groceries, ride, other = self._spend('Whole Foods'), self._spend('Uber trip'), self._spend('Rent')
+        self.client.post('/api/rules/', {'category': self.food.id, 'pattern': 'foods'})
+        self.client.post('/api/rules/', {'category': self.transport.id, 'pattern': 'uber'})
+
+        response = self.client.post('/api/rules/apply/')
+        self.assertEqual(response.data, {'categorized': 2})
+        categories = dict(Transaction.objects.values_list('id', 'budget_category'))
+        self.assertEqual(categories, {groceries.id: self.food.id, ride.id: self.transport.id, other.id: None})
+
+    def test_new_transactions_use_current_rules(self):
+        rule = CategoryRule.objects.create(user=self.user, category=self.food, pattern='market')
+        self.assertEqual(self._spend('Corner Market').budget_category_id, self.food.id)
+
+        rule.category = self.transport
+        rule.save()
+        self.assertEqual(self._spend('Corner Market').budget_category_id, self.transport.id)
+
+        rule.delete()
+        self.assertIsNone(self._spend('Corner Market').budget_category_id)
+
+    def test_rejects_bad_rules(self):
+        other = Category.objects.create(name='Theirs', user=User.objects.create_user(username='other', password='x'))
+        response = self.client.post('/api/rules/', {'category': other.id, 'pattern': 'x'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/rules/', {'category': self.food.id, 'pattern': '((', 'kind': 'regex'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pattern', response.data)
@@ -6,6 +6,7 @@ app_name = 'category'
 
 router = DefaultRouter()
 router.register(r"categories", views.CategoryViewSet, basename = 'category')
+router.register(r"rules", views.CategoryRuleViewSet, basename = 'rule')
 
 urlpatterns = [
     path("", include(router.urls)),
@@ -1,7 +1,10 @@
-from .models import Category
+from .models import Category, CategoryRule
+from .rules import apply_rules
 from rest_framework import permissions
 from rest_framework import viewsets
-from category.serializers import CategorySerializer
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from category.serializers import CategoryRuleSerializer, CategorySerializer
 
 class CategoryViewSet(viewsets.ModelViewSet):
     serializer_class = CategorySerializer
@@ -14,3 +17,17 @@ class CategoryViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
+class CategoryRuleViewSet(viewsets.ModelViewSet):
+    serializer_class = CategoryRuleSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return CategoryRule.objects.filter(user=self.request.user).order_by('priority', 'id')
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @action(detail=False, methods=['post'])
+    def apply(self, request):
+        """Run the rules over the user's uncategorized transactions."""
+        return Response({'categorized': apply_rules(request.user.id)})
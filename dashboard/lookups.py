@@ -0,0 +1,74 @@
+"""
+Per-user id -> name maps for the related names serializers show.
+
+A user has a handful of accounts and categories and they rarely change, so
+rather than joining them, or following a foreign key, for every serialized
+row, their names come from maps built once per process and data version.
+Account and category writes bump the owner's 'accounts' / 'categories'
+version (dashboard.signals) and user saves their 'user' version
+(user.signals). The versions are read from the database on every lookup,
+so the next lookup after a change rebuilds the maps in whichever process
+makes it, not only in the one that handled the write.
+"""
+
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.contrib.auth.models import User
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+
+from account.models import Account
+from category.models import Category
+from .versioning import get_versions
+
+LOOKUP_CACHE_SIZE = 1024
+
+SCOPES = ('user', 'accounts', 'categories')
+
+
+class Names(NamedTuple):
+    # Shared between callers: read only.
+    users: dict  # {user id: username}, the owner only
+    accounts: dict  # {account id: name_account}
+    categories: dict  # {category id: name}
+
+
+@lru_cache(maxsize=LOOKUP_CACHE_SIZE)
+def _names(user_id, versions):
+    return Names(
+        users=dict(User.objects.filter(pk=user_id).values_list('id', 'username')),
+        accounts=dict(Account.objects.filter(user_id=user_id).values_list('id', 'name_account')),
+        categories=dict(Category.objects.filter(user_id=user_id).values_list('id', 'name')),
+    )
+
+
+def names_for(user_id):
+    """The user's Names, rebuilt only after their accounts, categories or username change."""
+    versions = get_versions(user_id, SCOPES)
+    return _names(user_id, tuple(versions[scope] for scope in SCOPES))
+
+
+class CachedNameField(serializers.ReadOnlyField):
+    """
+    A ``ReadOnlyField(source='<relation>.<name>')`` that reads the name from
+    the row owner's Names map ``kind`` instead of the related row, looking
+    the maps up once per user per serialization. Like the dotted source, it
+    is left out when the relation is empty; a related row the map does not
+    hold (another user's) is read through the relation.
+    """
+
+    def __init__(self, kind, **kwargs):
+        self.kind = kind
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        related_id = getattr(instance, f'{self.source_attrs[0]}_id')
+        if related_id is None:
+            raise SkipField()
+        maps = self.root.__dict__.setdefault('_cached_names', {})
+        names = maps.get(instance.user_id)
+        if names is None:
+            names = maps[instance.user_id] = names_for(instance.user_id)
+        name = getattr(names, self.kind).get(related_id)
+        return super().get_attribute(instance) if name is None else name
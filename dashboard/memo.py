@@ -0,0 +1,77 @@
+"""
+Memoized per-user aggregates.
+
+``memoize`` caches the result of a function of a user in the 'aggregates'
+cache (settings.CACHES), under a key that holds the user's data versions
+of the scopes the function reads (dashboard.versioning). A write bumps
+only its owner's versions, in the database every process reads them
+from, so exactly that user's results stop being found, in every process;
+nothing has to be deleted. Entries also expire after
+AGGREGATE_CACHE_TIMEOUT, and the cache is bounded: MAX_ENTRIES with least
+recently used entries evicted first on the local-memory backend (random
+ones on the file backend), the server's maxmemory policy on Redis.
+
+Every lookup counts towards ``aggregate_cache_hits_total`` or
+``aggregate_cache_misses_total`` in backend.metrics, labelled by aggregate.
+"""
+
+import functools
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from backend.metrics import registry
+from .versioning import get_versions
+
+CACHE_ALIAS = 'aggregates'
+
+_MISSING = object()
+
+
+def memoize(name, scopes):
+    """
+    Decorator for ``func(user, *args)``, where ``user`` is a User or a user
+    id and ``args`` have a stable ``str()``: dates, numbers, strings. Pass
+    anything else the result depends on, such as today's date, as an
+    argument so it is part of the key. ``func`` may be a coroutine
+    function, for the async ORM; the wrapper is then one too.
+    """
+    def key_for(user_id, args, versions):
+        return ':'.join([name, str(user_id), *map(str, args), *(versions[scope] for scope in scopes)])
+
+    def found(result):
+        hit = result is not _MISSING
+        registry.inc('aggregate_cache_hits_total' if hit else 'aggregate_cache_misses_total', {'aggregate': name})
+        return hit
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(user, *args):
+                user_id = getattr(user, 'pk', user)
+                key = key_for(user_id, args, await sync_to_async(get_versions)(user_id, scopes))
+                cache = caches[CACHE_ALIAS]
+                result = await cache.aget(key, _MISSING)
+                if found(result):
+                    return result
+                result = await func(user, *args)
+                await cache.aset(key, result, settings.AGGREGATE_CACHE_TIMEOUT)
+                return result
+        else:
+            @functools.wraps(func)
+            def wrapper(user, *args):
+                user_id = getattr(user, 'pk', user)
+                key = key_for(user_id, args, get_versions(user_id, scopes))
+                cache = caches[CACHE_ALIAS]
+                result = cache.get(key, _MISSING)
+                if found(result):
+                    return result
+                result = func(user, *args)
+                cache.set(key, result, settings.AGGREGATE_CACHE_TIMEOUT)
+                return result
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField()),
+                ('scope', models.CharField(max_length=20)),
+                ('version', models.CharField(max_length=32)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user_id', 'scope'), name='data_version_unique_scope')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import models
+
+
+class DataVersion(models.Model):
+    """
+    The current version of one scope of a user's data (dashboard.versioning).
+
+    Kept in the database rather than a cache so that every worker process
+    sees a write's new version as soon as it commits. ``user_id`` is not a
+    foreign key: versions are bumped by the delete signals of a user's rows
+    while the user itself is being deleted.
+    """
+    user_id = models.BigIntegerField()
+    scope = models.CharField(max_length=20)  # accounts, budgets, ..., or 'user', 'rules', 'recurring'
+    version = models.CharField(max_length=32)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'scope'], name='data_version_unique_scope'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.scope} {self.version}"
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal
+
+from .versioning import MODEL_SCOPES, bump
+
+# Sent after a set-based ``queryset.update()`` on one of the user-owned
+# models, which bypasses post_save, with ``pks`` and ``user_ids``: the
+# updated rows and their owners, pairwise. Senders capture them before the
+# update (``owned_rows``), since the update may change which rows the
+# queryset matches; receivers never re-evaluate it.
+bulk_updated = Signal()
+
+
+def owned_rows(queryset):
+    """``(pks, user_ids)`` of the rows of ``queryset``, for ``bulk_updated``."""
+    rows = list(queryset.values_list('pk', 'user_id'))
+    return [pk for pk, _ in rows], [user_id for _, user_id in rows]
+
+
+def bump_data_version(sender, instance, **kwargs):
+    bump([instance.user_id], MODEL_SCOPES[sender._meta.label_lower])
+
+
+def bump_data_version_bulk(sender, user_ids, **kwargs):
+    bump(set(user_ids), MODEL_SCOPES[sender._meta.label_lower])
+
+
+for label in MODEL_SCOPES:
+    post_save.connect(bump_data_version, sender=label, dispatch_uid=f'data-version-save-{label}')
+    post_delete.connect(bump_data_version, sender=label, dispatch_uid=f'data-version-delete-{label}')
+bulk_updated.connect(bump_data_version_bulk, dispatch_uid='data-version-bulk')
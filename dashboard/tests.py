@@ -0,0 +1,268 @@
+import time
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from account.models import Account
+from category.models import Category
+from backend.metrics import registry
+from dashboard.views import _balance_totals, gather_queries
+from transaction.models import Transaction
+
+
+class GatherQueriesTests(SimpleTestCase):
+    def test_runs_callables_concurrently(self):
+        async def slow(value):
+            # Runs where the async ORM runs its queries.
+            await sync_to_async(time.sleep)(0.2)
+            return value
+
+        start = time.perf_counter()
+        results = async_to_sync(gather_queries)(lambda: slow(1), lambda: slow(2), lambda: slow(3))
+        self.assertEqual(results, [1, 2, 3])
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+
+class DashboardViewTests(TransactionTestCase):
+    # Queries run on their own threads and connections, so the data has to
+    # be committed for them to see it.
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='dash_user', password='test123')
+        account = Account.objects.create(name_account='Checking', balance=Decimal('500.00'), user=self.user)
+        groceries = Category.objects.create(name='Groceries', user=self.user)
+        Transaction.objects.create(user=self.user, amount=Decimal('1000.00'), description='Pay', account=account, type='deposit')
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('42.50'), description='Market', account=account,
+            budget_category=groceries, type='withdrawal',
+        )
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    def test_summary(self):
+        response = self.client.get('/api/dashboard/summary/', **self.auth)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(Decimal(data['total_balance']), Decimal('500.00'))
+        self.assertEqual(Decimal(data['total_income']), Decimal('1000.00'))
+        self.assertEqual(Decimal(data['total_expenses']), Decimal('42.50'))
+        self.assertEqual(data['total_budgeted'], 0)
+
+    def test_dashboard(self):
+        response = self.client.get('/api/dashboard/', **self.auth)
+        data = response.json()
+        self.assertEqual(len(data['accounts']), 1)
+        self.assertEqual(data['spending_by_category'][0]['name'], 'Groceries')
+        self.assertEqual(data['recent_transactions'][0]['account_name'], 'Checking')
+
+    def test_requires_authentication(self):
+        self.assertEqual(self.client.get('/api/dashboard/').status_code, 401)
+
+    @override_settings(SQL_INSTRUMENTATION_ENABLED=True)
+    def test_concurrent_queries_are_instrumented(self):
+        def query_count():
+            caches['aggregates'].clear()
+            return int(self.client.get('/api/dashboard/summary/', **self.auth)['X-Query-Count'])
+
+        query_count()  # creates the data versions
+        concurrent = query_count()
+        # As inside a transaction: one after another on the caller's connection.
+        with mock.patch('dashboard.views._in_atomic_block', return_value=True):
+            self.assertEqual(query_count(), concurrent)
+
+
+class BootstrapViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='boot_user', password='test123')
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('500.00'), user=self.user)
+        Category.objects.create(name='Groceries', user=self.user)
+        for i in range(30):
+            Transaction.objects.create(
+                user=self.user, amount=Decimal('1.00'), description=f'T{i}', account=self.account, type='withdrawal'
+            )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_returns_everything_in_one_response(self):
+        self.client.get('/api/bootstrap/')
+        # The user, the versions for the ETag and the related names, and one
+        # query per list.
+        with self.assertNumQueries(8):
+            response = self.client.get('/api/bootstrap/')
+        self.assertEqual(len(response.data['accounts']), 1)
+        self.assertEqual(len(response.data['categories']), 1)
+        self.assertEqual(response.data['transactions']['count'], 30)
+        self.assertEqual(len(response.data['transactions']['results']), 25)
+        self.assertEqual(response.data['transactions']['results'][0]['description'], 'T29')
+        self.assertTrue(response.data['transactions']['next'].endswith('/api/transactions/?page=2'))
+
+    def test_etag_changes_only_when_data_changes(self):
+        etag = self.client.get('/api/bootstrap/')['ETag']
+        self.assertEqual(self.client.get('/api/bootstrap/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.post('/api/categories/', {'name': 'Rent'}, format='json')
+        response = self.client.get('/api/bootstrap/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_changes_when_the_username_changes(self):
+        etag = self.client.get('/api/bootstrap/')['ETag']
+        self.user.username = 'renamed_user'
+        self.user.save()
+        response = self.client.get('/api/bootstrap/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['transactions']['results'][0]['user_username'], 'renamed_user')
+
+    def test_etag_changes_after_an_admin_action_on_a_filtered_list(self):
+        etag = self.client.get('/api/bootstrap/')['ETag']
+        admin = User.objects.create_superuser(username='boot_admin', password='test123')
+        admin_client = Client()
+        admin_client.force_login(admin)
+        # The action moves every row out of the filter it was selected under.
+        response = admin_client.post('/admin/transaction/transaction/?type__exact=withdrawal', {
+            'action': 'mark_as_deposit',
+            '_selected_action': list(Transaction.objects.values_list('pk', flat=True)),
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Transaction.objects.filter(type='withdrawal').exists())
+        self.assertNotEqual(self.client.get('/api/bootstrap/')['ETag'], etag)
+
+    def test_etag_changes_after_a_write_in_another_process(self):
+        etag = self.client.get('/api/bootstrap/')['ETag']
+        # Another worker has its own local-memory caches.
+        other_process = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'other-process'}
+        with override_settings(CACHES={**settings.CACHES, 'default': other_process}):
+            Category.objects.create(name='Rent', user=self.user)
+        self.assertEqual(self.client.get('/api/bootstrap/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class LookupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='lookup_user', password='test123')
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('0.00'), user=self.user)
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _add(self, count, category=None):
+        for i in range(count):
+            Transaction.objects.create(
+                user=self.user, amount=Decimal('1.00'), description=f'T{i}', account=self.account,
+                budget_category=category, type='withdrawal',
+            )
+
+    def _list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            results = self.client.get('/api/transactions/').data['results']
+        return len(queries), results
+
+    def test_names_without_a_query_per_row(self):
+        self._add(2, self.food)
+        self._list_queries()  # builds the maps
+        few, _ = self._list_queries()
+        self._add(10)
+        many, results = self._list_queries()
+        self.assertEqual(many, few)
+        self.assertEqual(results[0]['account_name'], 'Checking')
+        self.assertEqual(results[0]['user_username'], 'lookup_user')
+        self.assertNotIn('budget_category_name', results[0])
+        self.assertEqual(results[-1]['budget_category_name'], 'Food')
+
+    def test_renames_show_up(self):
+        self._add(1, self.food)
+        self._list_queries()
+        self.account.name_account = 'Everyday'
+        self.account.save()
+        self.food.name = 'Groceries'
+        self.food.save()
+        self.user.username = 'renamed_user'
+        self.user.save()
+        result = self._list_queries()[1][0]
+        self.assertEqual(
+            (result['account_name'], result['budget_category_name'], result['user_username']),
+            ('Everyday', 'Groceries', 'renamed_user'),
+        )
+
+    def test_renames_in_another_process_show_up(self):
+        self._add(1, self.food)
+        self._list_queries()
+        # Another worker has its own local-memory caches.
+        other_process = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'other-process'}
+        with override_settings(CACHES={**settings.CACHES, 'default': other_process}):
+            self.account.name_account = 'Everyday'
+            self.account.save()
+        self.assertEqual(self._list_queries()[1][0]['account_name'], 'Everyday')
+
+
+class MemoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['aggregates'].clear()
+        self.users = [User.objects.create_user(username=f'memo_user{i}', password='test123') for i in range(3)]
+        for user in self.users:
+            Account.objects.create(name_account='Checking', balance=Decimal('10.00'), user=user)
+
+    def _counts(self):
+        counters = registry.collect()[0]
+        return tuple(
+            counters.get((name, (('aggregate', 'balance_totals'),)), 0)
+            for name in ('aggregate_cache_hits_total', 'aggregate_cache_misses_total')
+        )
+
+    def _totals(self, user):
+        with CaptureQueriesContext(connection) as queries:
+            totals = async_to_sync(_balance_totals)(user)
+        return totals['total_balance'], len(queries)
+
+    def test_hits_until_the_owner_writes(self):
+        user, other = self.users[:2]
+        hits, misses = self._counts()
+        # A hit only reads the versions.
+        self.assertEqual(self._totals(user), (Decimal('10.00'), 2))
+        self.assertEqual(self._totals(user), (Decimal('10.00'), 1))
+        self.assertEqual(self._counts(), (hits + 1, misses + 1))
+
+        Account.objects.create(name_account='Savings', balance=Decimal('5.00'), user=other)
+        self.assertEqual(self._totals(user), (Decimal('10.00'), 1))
+        Account.objects.create(name_account='Savings', balance=Decimal('5.00'), user=user)
+        self.assertEqual(self._totals(user), (Decimal('15.00'), 2))
+        self.assertEqual(self._counts(), (hits + 2, misses + 2))
+        self.assertIn('aggregate_cache_hits_total{aggregate="balance_totals"}', registry.render())
+
+    def test_misses_after_a_write_in_another_process(self):
+        user = self.users[0]
+        self._totals(user)
+        # Another worker has its own local-memory caches.
+        other_process = {
+            alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'other-{alias}'}
+            for alias in settings.CACHES
+        }
+        with override_settings(CACHES=other_process):
+            Account.objects.create(name_account='Savings', balance=Decimal('5.00'), user=user)
+        hits, misses = self._counts()
+        self.assertEqual(self._totals(user), (Decimal('15.00'), 2))
+        self.assertEqual(self._counts(), (hits, misses + 1))
+
+    def test_evicts_least_recently_used(self):
+        aggregates = {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'memo-tests',
+            'OPTIONS': {'MAX_ENTRIES': 2, 'CULL_FREQUENCY': 2},
+        }
+        with override_settings(CACHES={**settings.CACHES, 'aggregates': aggregates}):
+            first, second, third = self.users
+            self._totals(first)
+            self._totals(second)
+            self._totals(first)
+            self._totals(third)  # full: the least recently used, second, goes
+            self.assertEqual(self._totals(first)[1], 1)
+            self.assertEqual(self._totals(second)[1], 2)
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+app_name = 'dashboard'
+
+urlpatterns = [
+    path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/summary/', views.summary, name='summary'),
+    path('bootstrap/', views.BootstrapView.as_view(), name='bootstrap'),
+]
@@ -0,0 +1,62 @@
+import hashlib
+import uuid
+
+from .models import DataVersion
+
+SCOPES = ('accounts', 'budgets', 'categories', 'transactions')
+
+MODEL_SCOPES = {
+    'account.account': 'accounts',
+    'budget.budget': 'budgets',
+    'category.category': 'categories',
+    'transaction.transaction': 'transactions',
+}
+
+
+def get_versions(user_id, scopes=SCOPES):
+    """
+    Return ``{scope: version}`` for the user's data.
+
+    Versions are opaque tokens that change whenever the user's rows in that
+    scope change. They live in the database (DataVersion), so a bump in one
+    worker process is seen by all of them, and read through the same router
+    as the data, so a version read from a replica matches that replica's
+    rows. A scope without a version yet gets a fresh token.
+    """
+    versions = dict(
+        DataVersion.objects.filter(user_id=user_id, scope__in=scopes).values_list('scope', 'version')
+    )
+    missing = [scope for scope in scopes if scope not in versions]
+    if missing:
+        tokens = {scope: uuid.uuid4().hex for scope in missing}
+        DataVersion.objects.bulk_create(
+            [DataVersion(user_id=user_id, scope=scope, version=token) for scope, token in tokens.items()],
+            ignore_conflicts=True,
+        )
+        # Another process may have got there first; the replica may lag.
+        tokens.update(
+            DataVersion.objects.filter(user_id=user_id, scope__in=missing).values_list('scope', 'version')
+        )
+        versions.update(tokens)
+    return {scope: versions[scope] for scope in scopes}
+
+
+def combined_version(user_id, scopes=SCOPES):
+    """One short tag that changes when any of ``scopes`` changes for the user."""
+    versions = get_versions(user_id, scopes)
+    digest = hashlib.sha1(':'.join(f'{scope}={versions[scope]}' for scope in scopes).encode())
+    return digest.hexdigest()[:16]
+
+
+def bump(user_ids, *scopes):
+    """
+    Give each scope of each user a new version. Called from the signals of
+    a write, so the new version commits or rolls back with it.
+    """
+    DataVersion.objects.bulk_create(
+        [
+            DataVersion(user_id=user_id, scope=scope, version=uuid.uuid4().hex)
+            for user_id in user_ids for scope in scopes
+        ],
+        update_conflicts=True, unique_fields=['user_id', 'scope'], update_fields=['version'],
+    )
@@ -0,0 +1,258 @@
+import asyncio
+import functools
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import close_old_connections, connection
+from django.db.models import Count, Q, Sum
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
+from rest_framework import permissions
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+from account.models import Account
+from account.serializers import AccountSerializer
+from budget.models import Budget
+from budget.serializers import BudgetSerializer
+from category.models import Category
+from category.serializers import CategorySerializer
+from transaction.models import Transaction, TransactionRollup
+from transaction.serializers import TransactionSerializer
+from .lookups import names_for
+from .memo import memoize
+from .versioning import SCOPES, combined_version
+
+RECENT_TRANSACTIONS = 5
+
+# The transactions carry the owner's username (dashboard.lookups), so a
+# rename has to change the bootstrap ETag as well.
+BOOTSTRAP_SCOPES = SCOPES + ('user',)
+
+
+def _authenticate(request):
+    """Authenticate with the DRF authentication classes; return the user or None."""
+    drf_request = Request(request, authenticators=[cls() for cls in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = drf_request.user
+    except APIException:
+        return None
+    return user if user.is_authenticated else None
+
+
+def _in_atomic_block():
+    return connection.in_atomic_block
+
+
+def _on_worker_connection(func):
+    def run():
+        close_old_connections()
+        try:
+            return func()
+        finally:
+            # Executor threads outlive the request: like the end of a
+            # request, this keeps a persistent connection for the thread's
+            # next call and gives a pooled one back to the pool.
+            close_old_connections()
+    return run
+
+
+async def gather_queries(*funcs):
+    """
+    Run async ORM coroutine functions concurrently and return their results
+    in order, so the total wait is that of the slowest query.
+
+    Within one request Django runs every ``a*`` queryset call on the same
+    thread and connection, which would serialize them again. So each
+    function runs in an event loop on its own executor thread, where its
+    ORM calls use that thread's connection. With the default DB_PROFILE
+    that means a connection opened per function; the persistent and
+    production profiles reuse them.
+
+    Inside an open transaction (an atomic /api/batch/ call, or a test case)
+    other connections cannot see its uncommitted rows, so the functions run
+    one after another on the caller's connection then.
+
+    The query recorders of the SQL instrumentation and metrics middleware
+    are carried over with the context, so they see the workers' queries.
+    """
+    if await sync_to_async(_in_atomic_block)():
+        return [await func() for func in funcs]
+    return await asyncio.gather(*(
+        sync_to_async(_on_worker_connection(async_to_sync(func)), thread_sensitive=False)()
+        for func in funcs
+    ))
+
+
+@memoize('balance_totals', ('accounts',))
+async def _balance_totals(user):
+    return await Account.objects.filter(user=user).aaggregate(total_balance=Sum('balance'), account_count=Count('id'))
+
+
+@memoize('transaction_totals', ('transactions',))
+async def _transaction_totals(user):
+    # Archived transactions (transaction.archive) count through their rollups.
+    live = await Transaction.objects.filter(user=user).aaggregate(
+        total_income=Sum('amount', filter=Q(type='deposit')),
+        total_expenses=Sum('amount', filter=Q(type='withdrawal')),
+        transaction_count=Count('id'),
+    )
+    archived = await TransactionRollup.objects.filter(user=user).aaggregate(
+        total_income=Sum('total', filter=Q(type='deposit')),
+        total_expenses=Sum('total', filter=Q(type='withdrawal')),
+        transaction_count=Sum('count'),
+    )
+    return {key: (live[key] or 0) + (archived[key] or 0) for key in live}
+
+
+@memoize('budget_totals', ('budgets',))
+async def _budget_totals(user):
+    return await Budget.objects.filter(user=user).aaggregate(
+        total_budgeted=Sum('total_amount'), total_spent=Sum('spent_amount'), budget_count=Count('id'),
+    )
+
+
+@memoize('spending_by_category', ('categories', 'transactions'))
+async def _spending_by_category(user):
+    categories = [
+        category async for category in
+        Category.objects.filter(user=user)
+        .annotate(spent=Sum('transactions__amount', filter=Q(transactions__type='withdrawal')))
+        .filter(spent__isnull=False)
+        .order_by('-spent')
+        .values('id', 'name', 'spent')
+    ]
+    archived = {
+        category_id: spent async for category_id, spent in
+        TransactionRollup.objects.filter(user=user, type='withdrawal', budget_category__isnull=False)
+        .values('budget_category').annotate(spent=Sum('total')).values_list('budget_category', 'spent')
+    }
+    if not archived:
+        return categories
+    for category in categories:
+        category['spent'] += archived.pop(category['id'], 0)
+    categories.extend([
+        {'id': category['id'], 'name': category['name'], 'spent': archived[category['id']]}
+        async for category in Category.objects.filter(id__in=archived).values('id', 'name')
+    ])
+    return sorted(categories, key=lambda category: -category['spent'])
+
+
+async def _accounts(user):
+    return [
+        account async for account in
+        Account.objects.filter(user=user).order_by('id').values('id', 'name_account', 'balance')
+    ]
+
+
+async def _budgets(user):
+    return [
+        budget async for budget in
+        Budget.objects.filter(user=user).order_by('-start_date')
+        .values('id', 'name', 'total_amount', 'spent_amount', 'account', 'start_date', 'end_date')
+    ]
+
+
+async def _recent_transactions(user):
+    names = await sync_to_async(names_for)(user.id)
+    recent = [
+        row async for row in
+        Transaction.objects.filter(user=user).order_by('-date')
+        .values('id', 'amount', 'description', 'date', 'type', 'account', 'budget_category')[:RECENT_TRANSACTIONS]
+    ]
+    for row in recent:
+        row['account_name'] = names.accounts.get(row['account'])
+        row['budget_category_name'] = names.categories.get(row['budget_category'])
+    return recent
+
+
+def _totals(*parts):
+    totals = {}
+    for part in parts:
+        totals.update({key: 0 if value is None else value for key, value in part.items()})
+    return totals
+
+
+@require_GET
+async def summary(request):
+    """Per-user totals for accounts, transactions and budgets."""
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    balances, transactions, budgets = await gather_queries(
+        functools.partial(_balance_totals, user),
+        functools.partial(_transaction_totals, user),
+        functools.partial(_budget_totals, user),
+    )
+    return JsonResponse(_totals(balances, transactions, budgets))
+
+
+@require_GET
+async def dashboard(request):
+    """Everything the dashboard page shows, fetched in one concurrent round."""
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    balances, transactions, accounts, budgets, spending, recent = await gather_queries(
+        functools.partial(_balance_totals, user),
+        functools.partial(_transaction_totals, user),
+        functools.partial(_accounts, user),
+        functools.partial(_budgets, user),
+        functools.partial(_spending_by_category, user),
+        functools.partial(_recent_transactions, user),
+    )
+    return JsonResponse({
+        'summary': _totals(balances, transactions),
+        'accounts': accounts,
+        'budgets': budgets,
+        'spending_by_category': spending,
+        'recent_transactions': recent,
+    })
+
+
+class BootstrapView(APIView):
+    """
+    Accounts, categories, budgets and the first page of recent transactions
+    in one response, for initial page loads.
+
+    The response carries the user's combined data version, usernames
+    included, as its ETag; a request with a matching If-None-Match gets a 304 after reading only the
+    versions.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        etag = f'"{combined_version(request.user.id, BOOTSTRAP_SCOPES)}"'
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=304, headers=headers)
+
+        user = request.user
+        page_size = api_settings.PAGE_SIZE
+        transactions = (
+            Transaction.objects.filter(user=user)
+            .order_by('-date', '-id')
+        )
+        count = transactions.count()
+        next_url = None
+        if count > page_size:
+            next_url = request.build_absolute_uri(reverse('transaction:transaction-list')) + '?page=2'
+
+        return Response({
+            'version': etag.strip('"'),
+            'accounts': AccountSerializer(Account.objects.filter(user=user).order_by('id'), many=True).data,
+            'categories': CategorySerializer(Category.objects.filter(user=user).order_by('name'), many=True).data,
+            'budgets': BudgetSerializer(Budget.objects.filter(user=user).order_by('-start_date'), many=True).data,
+            'transactions': {
+                'count': count,
+                'next': next_url,
+                'previous': None,
+                'results': TransactionSerializer(transactions[:page_size], many=True).data,
+            },
+        }, headers=headers)
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger('sync.events')
+
+CHANNEL = 'sync_changes'
+
+
+class Subscription:
+    """One open event stream. Events arrive on ``queue``; ``None`` ends it."""
+
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def deliver(self, event):
+        # Runs on the subscriber's event loop. A client too slow to keep up
+        # is disconnected; it reconnects with Last-Event-ID and catches up
+        # from the change log.
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = None
+        self.queue.put_nowait(event)
+
+
+class Broadcaster:
+    """
+    Fans change events out to the event streams open in this process.
+
+    Streams are plain queues waiting on the event loop, so an idle client
+    costs one coroutine and no thread, database connection or polling.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, getattr(settings, 'SYNC_EVENTS_QUEUE_SIZE', 100))
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        if getattr(settings, 'SYNC_EVENTS_BACKEND', 'local') == 'postgres':
+            listener.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def dispatch(self, user_id, event):
+        """Hand ``event`` to the user's streams in this process. Safe from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The stream's event loop has shut down.
+                self.unsubscribe(subscription)
+
+
+broadcaster = Broadcaster()
+
+
+class PostgresListener:
+    """
+    Relays ``NOTIFY sync_changes`` from every worker process to this one.
+
+    One thread and one connection per process, started with the first
+    stream, however many streams are open.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sync-events-listener', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        import psycopg
+
+        db = settings.DATABASES['default']
+        while True:
+            try:
+                with psycopg.connect(
+                    dbname=db['NAME'], user=db['USER'], password=db['PASSWORD'],
+                    host=db['HOST'], port=db['PORT'] or None, autocommit=True,
+                ) as conn:
+                    conn.execute(f'LISTEN {CHANNEL}')
+                    for notify in conn.notifies():
+                        event = json.loads(notify.payload)
+                        broadcaster.dispatch(event.pop('user'), event)
+            except Exception:
+                logger.exception('Change event listener lost its connection; reconnecting')
+                threading.Event().wait(1)
+
+
+listener = PostgresListener()
+
+
+def publish(user_id, events):
+    """
+    Announce change log entries to the user's open streams once the current
+    transaction commits.
+
+    With ``SYNC_EVENTS_BACKEND = 'postgres'`` the events go through
+    ``pg_notify``, which Postgres itself holds back until commit and delivers
+    to the listener in every worker process. The ``'local'`` backend only
+    reaches streams served by this process.
+    """
+    if getattr(settings, 'SYNC_EVENTS_BACKEND', 'local') == 'postgres':
+        with connection.cursor() as cursor:
+            for event in events:
+                cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, json.dumps({**event, 'user': user_id})])
+        return
+
+    def dispatch():
+        for event in events:
+            broadcaster.dispatch(user_id, event)
+    transaction.on_commit(dispatch)
+
+
+def event_for(entry):
+    """The compact event sent to clients for a ChangeLog row."""
+    return {'id': entry.id, 'scope': entry.scope, 'object_id': entry.object_id, 'action': entry.action}
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from sync.models import ChangeLog, SyncHorizon
+
+
+class Command(BaseCommand):
+    help = 'Delete old change log entries, remembering per user how far they went so stale cursors get a snapshot.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.SYNC_CHANGE_LOG_RETENTION_DAYS,
+            help='Keep the entries of the last this many days.',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        old = ChangeLog.objects.filter(created_at__lt=cutoff)
+        with transaction.atomic():
+            horizons = [
+                SyncHorizon(user_id=user_id, pruned_through=last)
+                for user_id, last in old.order_by().values('user').annotate(last=Max('id')).values_list('user', 'last')
+            ]
+            # The horizon is written with the delete, so no reader sees the
+            # entries gone without it.
+            SyncHorizon.objects.bulk_create(
+                horizons, update_conflicts=True, unique_fields=['user'], update_fields=['pruned_through'],
+            )
+            deleted, _ = old.delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Pruned {deleted} change log entr(ies) older than {options["days"]} day(s) for {len(horizons)} user(s).'
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('sync', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncHorizon',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sync_horizon', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('pruned_through', models.BigIntegerField()),
+            ],
+        ),
+    ]
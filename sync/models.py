@@ -0,0 +1,41 @@
+from django.db import models
+from django.contrib.auth.models import User
+
+
+class ChangeLog(models.Model):
+    """
+    One row per write to a user's data. The row id is the sync cursor.
+
+    A cursor only works if a user's entries become visible in id order:
+    otherwise a reader can pass an id whose transaction has not committed
+    yet and never come back for it. Entries are therefore written under a
+    per-user lock held until commit (sync.signals), so a user's writers
+    queue up and commit in the order they took their ids.
+    """
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='changes')  # owner of the changed row
+    scope = models.CharField(max_length=20)  # accounts, budgets, categories or transactions
+    object_id = models.BigIntegerField()  # id of the changed row
+    action = models.CharField(max_length=10, choices=[(UPSERT, 'Upsert'), (DELETE, 'Delete')])
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'id'], name='changelog_user_cursor')]
+
+    def __str__(self):
+        return f"{self.action} {self.scope}:{self.object_id}"
+
+
+class SyncHorizon(models.Model):
+    """
+    The newest change log entry pruned for a user (prune_change_log). A
+    cursor older than that may have missed entries, so a sync from it gets
+    a full snapshot instead.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='sync_horizon')
+    pruned_through = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.user_id}: pruned through {self.pruned_through}"
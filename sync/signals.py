@@ -0,0 +1,74 @@
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+
+from dashboard.signals import bulk_updated
+from dashboard.versioning import MODEL_SCOPES
+from .events import event_for, publish
+from .models import ChangeLog
+
+
+# First key of the two-key advisory locks that serialize a user's change
+# log writes; the second is the user id.
+LOCK_NAMESPACE = 7305
+
+
+def _scope(model):
+    return MODEL_SCOPES[model._meta.label_lower]
+
+
+def _lock_change_logs(user_ids):
+    # Held until the enclosing transaction ends, so a user's next entry is
+    # only numbered once this one is committed (see ChangeLog). SQLite
+    # already lets one writer at a time in. Users are locked in id order so
+    # that two bulk updates cannot wait on each other.
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for user_id in sorted(set(user_ids)):
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [LOCK_NAMESPACE, user_id])
+
+
+def _log(instance, action):
+    with transaction.atomic():
+        _lock_change_logs([instance.user_id])
+        entry = ChangeLog.objects.create(
+            user_id=instance.user_id, scope=_scope(type(instance)), object_id=instance.pk, action=action,
+        )
+        publish(entry.user_id, [event_for(entry)])
+
+
+def log_save(sender, instance, **kwargs):
+    _log(instance, ChangeLog.UPSERT)
+
+
+def log_delete(sender, instance, origin=None, **kwargs):
+    # Rows deleted along with their user take the user's change log with them.
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if issubclass(origin_model, User):
+        return
+    _log(instance, ChangeLog.DELETE)
+
+
+def log_bulk_update(sender, pks, user_ids, **kwargs):
+    scope = _scope(sender)
+    with transaction.atomic():
+        _lock_change_logs(user_ids)
+        entries = ChangeLog.objects.bulk_create([
+            ChangeLog(user_id=user_id, scope=scope, object_id=pk, action=ChangeLog.UPSERT)
+            for pk, user_id in zip(pks, user_ids)
+        ])
+        events = defaultdict(list)
+        for entry in entries:
+            events[entry.user_id].append(event_for(entry))
+        for user_id, user_events in events.items():
+            publish(user_id, user_events)
+
+
+for label in MODEL_SCOPES:
+    post_save.connect(log_save, sender=label, dispatch_uid=f'change-log-save-{label}')
+    post_delete.connect(log_delete, sender=label, dispatch_uid=f'change-log-delete-{label}')
+bulk_updated.connect(log_bulk_update, dispatch_uid='change-log-bulk')
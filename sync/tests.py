@@ -0,0 +1,188 @@
+import asyncio
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from asgiref.sync import sync_to_async
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from account.models import Account
+from sync.events import broadcaster
+from sync.models import ChangeLog, SyncHorizon
+from sync.views import event_stream
+from transaction.admin import TransactionAdmin
+from transaction.models import Transaction
+
+
+class SyncViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='sync_user', password='test123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('100.00'), user=self.user)
+
+    def _sync(self, since=None):
+        response = self.client.get('/api/sync/', {'since': since} if since is not None else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _transaction(self, description='Coffee'):
+        return Transaction.objects.create(
+            user=self.user, amount=Decimal('3.50'), description=description, account=self.account, type='withdrawal',
+        )
+
+    def test_snapshot_then_changes(self):
+        self._transaction('Old')
+        snapshot = self._sync()
+        self.assertEqual(len(snapshot['changes']['transactions']), 1)
+        self.assertEqual(self._sync(snapshot['cursor'])['changes']['transactions'], [])
+
+        new = self._transaction('New')
+        delta = self._sync(snapshot['cursor'])
+        self.assertEqual([row['id'] for row in delta['changes']['transactions']], [new.id])
+        self.assertEqual(delta['changes']['accounts'], [])
+        self.assertGreater(delta['cursor'], snapshot['cursor'])
+
+    def test_deletes_become_tombstones(self):
+        cursor = self._sync()['cursor']
+        transaction_id = self._transaction().id
+        Transaction.objects.get(pk=transaction_id).delete()
+        delta = self._sync(cursor)
+        self.assertEqual(delta['changes']['transactions'], [])
+        self.assertEqual(delta['deleted']['transactions'], [transaction_id])
+
+    def test_cascaded_deletes_are_logged(self):
+        transaction = self._transaction()
+        account_id = self.account.id
+        cursor = self._sync()['cursor']
+        self.account.delete()
+        deleted = self._sync(cursor)['deleted']
+        self.assertEqual(deleted['accounts'], [account_id])
+        self.assertEqual(deleted['transactions'], [transaction.id])
+
+    def test_pages_through_the_log(self):
+        cursor = self._sync()['cursor']
+        with self.settings(SYNC_PAGE_SIZE=2):
+            ids = [self._transaction(str(i)).id for i in range(3)]
+            first = self._sync(cursor)
+            second = self._sync(first['cursor'])
+        self.assertTrue(first['has_more'])
+        self.assertFalse(second['has_more'])
+        seen = [row['id'] for page in (first, second) for row in page['changes']['transactions']]
+        self.assertEqual(seen, ids)
+
+    def test_only_own_changes(self):
+        cursor = self._sync()['cursor']
+        other = User.objects.create_user(username='other_sync_user', password='test123')
+        other_account = Account.objects.create(name_account='Other', balance=Decimal('0.00'), user=other)
+        self.assertEqual(self._sync(cursor)['changes']['accounts'], [])
+        other.delete()
+        self.assertFalse(ChangeLog.objects.filter(user_id=other.id).exists())
+        self.assertFalse(Account.objects.filter(pk=other_account.pk).exists())
+
+    def test_admin_bulk_update_is_logged(self):
+        transaction = self._transaction()
+        cursor = self._sync()['cursor']
+        admin = TransactionAdmin(Transaction, site)
+        admin.message_user = lambda *args, **kwargs: None
+        admin.mark_as_deposit(RequestFactory().post('/admin/'), Transaction.objects.filter(pk=transaction.pk))
+        changed = self._sync(cursor)['changes']['transactions']
+        self.assertEqual(changed[0]['type'], 'deposit')
+
+    def test_admin_bulk_update_on_a_filtered_list_is_logged(self):
+        transaction = self._transaction()
+        cursor = self._sync()['cursor']
+        admin = TransactionAdmin(Transaction, site)
+        admin.message_user = lambda *args, **kwargs: None
+        # As selected under ?type__exact=withdrawal, which the update empties.
+        admin.mark_as_deposit(RequestFactory().post('/admin/'), Transaction.objects.filter(type='withdrawal'))
+        changed = self._sync(cursor)['changes']['transactions']
+        self.assertEqual([(row['id'], row['type']) for row in changed], [(transaction.id, 'deposit')])
+
+    def test_cursor_from_before_pruning_gets_a_snapshot(self):
+        cursor = self._sync()['cursor']
+        first = self._transaction('First')
+        ChangeLog.objects.update(created_at=timezone.now() - timedelta(days=40))
+        second = self._transaction('Second')
+        call_command('prune_change_log', days=30, stdout=StringIO())
+        self.assertEqual(list(ChangeLog.objects.values_list('object_id', flat=True)), [second.id])
+
+        reset = self._sync(cursor)
+        self.assertTrue(reset['reset'])
+        self.assertEqual([row['id'] for row in reset['changes']['transactions']], [first.id, second.id])
+        self.assertFalse(self._sync(reset['cursor'])['reset'])
+
+    def test_rejects_bad_cursor(self):
+        for since in ['abc', '\u00b2', '-1', str(2 ** 63)]:
+            self.assertEqual(self.client.get('/api/sync/', {'since': since}).status_code, 400, since)
+
+
+class EventStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='events_user', password='test123')
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('100.00'), user=self.user)
+
+    async def _next(self, stream):
+        return await asyncio.wait_for(anext(stream), 1)
+
+    async def test_streams_committed_changes(self):
+        stream = event_stream(self.user.id)
+        self.assertEqual(await self._next(stream), ': connected\n\n')
+        self.assertEqual(broadcaster.subscriber_count(), 1)
+
+        def write():
+            with self.captureOnCommitCallbacks(execute=True):
+                return Transaction.objects.create(
+                    user=self.user, amount=Decimal('3.50'), description='Coffee', account=self.account, type='withdrawal',
+                )
+        transaction = await sync_to_async(write)()
+
+        chunk = await self._next(stream)
+        event = json.loads(chunk.split('data: ')[1])
+        self.assertEqual((event['scope'], event['object_id'], event['action']), ('transactions', transaction.id, 'upsert'))
+        await stream.aclose()
+        self.assertEqual(broadcaster.subscriber_count(), 0)
+
+    async def test_replays_missed_changes(self):
+        since = await ChangeLog.objects.filter(user=self.user).alatest('id')
+        await sync_to_async(self.account.delete)()
+        stream = event_stream(self.user.id, since.id)
+        event = json.loads((await self._next(stream)).split('data: ')[1])
+        self.assertEqual((event['scope'], event['action']), ('accounts', 'delete'))
+        await stream.aclose()
+
+    async def test_other_users_changes_are_not_sent(self):
+        stream = event_stream(self.user.id)
+        await self._next(stream)
+        broadcaster.dispatch(self.user.id + 1, {'id': 10**9, 'scope': 'accounts', 'object_id': 1, 'action': 'upsert'})
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(anext(stream), 0.2)
+        await stream.aclose()
+
+    async def test_cursor_from_before_pruning_asks_for_a_resync(self):
+        since = await ChangeLog.objects.filter(user=self.user).alatest('id')
+        await SyncHorizon.objects.acreate(user=self.user, pruned_through=since.id + 1)
+        stream = event_stream(self.user.id, since.id)
+        self.assertTrue((await self._next(stream)).startswith('event: resync'))
+
+    async def test_requires_authentication(self):
+        self.assertEqual((await self.async_client.get('/api/sync/events/')).status_code, 401)
+
+    async def test_rejects_bad_cursor(self):
+        token = RefreshToken.for_user(self.user).access_token
+        response = await self.async_client.get(
+            '/api/sync/events/', {'since': '\u00b2'}, headers={'Authorization': f'Bearer {token}'},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_wsgi_requests(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/sync/events/').status_code, 501)
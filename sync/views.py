@@ -0,0 +1,208 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from account.models import Account
+from account.serializers import AccountSerializer
+from budget.models import Budget
+from budget.serializers import BudgetSerializer
+from category.models import Category
+from category.serializers import CategorySerializer
+from dashboard.versioning import SCOPES
+from dashboard.views import _authenticate
+from transaction.models import Transaction
+from transaction.serializers import TransactionSerializer
+from .events import broadcaster, event_for
+from .models import ChangeLog, SyncHorizon
+
+MAX_ID = 2 ** 63 - 1  # largest bigint
+
+SOURCES = {
+    'accounts': (Account.objects.all(), AccountSerializer),
+    'budgets': (Budget.objects.all(), BudgetSerializer),
+    'categories': (Category.objects.all(), CategorySerializer),
+    'transactions': (Transaction.objects.all(), TransactionSerializer),
+}
+
+
+def _cursor(value):
+    """``value`` as a change log cursor (0 for none yet), or None if it is not one."""
+    if not (value.isascii() and value.isdecimal()):
+        return None
+    cursor = int(value)
+    return cursor if cursor <= MAX_ID else None
+
+
+def _pruned_past(user_id, since):
+    """Whether change log entries after cursor ``since`` have been pruned."""
+    return SyncHorizon.objects.filter(user_id=user_id, pruned_through__gt=since).exists()
+
+
+class SyncView(APIView):
+    """
+    Rows changed since a cursor, for clients that keep a local copy.
+
+    ``GET /api/sync/`` returns all of the user's rows and a ``cursor``.
+    ``GET /api/sync/?since=<cursor>`` then returns only the rows created or
+    updated since, in ``changes``, and the ids deleted since, in ``deleted``,
+    both keyed by scope. Pass the returned ``cursor`` to the next call, and
+    call again straight away while ``has_more`` is true.
+
+    Old entries are pruned from the change log (prune_change_log). A cursor
+    from before the pruned ones gets a full snapshot instead of changes;
+    ``reset`` is then true and the client replaces its copy rather than
+    merging into it.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        since = _cursor(request.query_params.get('since', '0'))
+        if since is None:
+            return Response({'detail': '"since" must be a cursor from a previous sync.'}, status=status.HTTP_400_BAD_REQUEST)
+        if since == 0 or _pruned_past(request.user.id, since):
+            return Response(self.snapshot(request.user))
+        return Response(self.changes_since(request.user, since))
+
+    def snapshot(self, user):
+        # Read the cursor first: a write that lands while the rows are being
+        # read is then sent again on the next sync, rather than lost.
+        cursor = ChangeLog.objects.filter(user=user).order_by('-id').values_list('id', flat=True).first() or 0
+        changes = {
+            scope: serializer(queryset.filter(user=user).order_by('pk'), many=True).data
+            for scope, (queryset, serializer) in SOURCES.items()
+        }
+        return {
+            'cursor': cursor, 'reset': True, 'has_more': False, 'changes': changes,
+            'deleted': {scope: [] for scope in SCOPES},
+        }
+
+    def changes_since(self, user, since):
+        limit = getattr(settings, 'SYNC_PAGE_SIZE', 500)
+        entries = list(
+            ChangeLog.objects.filter(user=user, id__gt=since).order_by('id')
+            .values_list('id', 'scope', 'object_id', 'action')[:limit + 1]
+        )
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        # Only the last action on each row matters.
+        latest = {(scope, object_id): action for _, scope, object_id, action in entries}
+        changes = {scope: [] for scope in SCOPES}
+        deleted = {scope: [] for scope in SCOPES}
+        upserts = {scope: set() for scope in SCOPES}
+        for (scope, object_id), action in latest.items():
+            if action == ChangeLog.DELETE:
+                deleted[scope].append(object_id)
+            else:
+                upserts[scope].add(object_id)
+
+        for scope, ids in upserts.items():
+            if not ids:
+                continue
+            queryset, serializer = SOURCES[scope]
+            rows = list(queryset.filter(user=user, pk__in=ids).order_by('pk'))
+            changes[scope] = serializer(rows, many=True).data
+            # Deleted again in a later page of the log.
+            deleted[scope].extend(ids - {row.pk for row in rows})
+
+        return {
+            'cursor': entries[-1][0] if entries else since,
+            'reset': False,
+            'has_more': has_more,
+            'changes': changes,
+            'deleted': {scope: sorted(ids) for scope, ids in deleted.items()},
+        }
+
+
+def _format(event):
+    return f"id: {event['id']}\nevent: change\ndata: {json.dumps(event)}\n\n"
+
+
+def _replay(user_id, since, limit):
+    if _pruned_past(user_id, since):
+        return None
+    entries = ChangeLog.objects.filter(user_id=user_id, id__gt=since).order_by('id')[:limit + 1]
+    return [event_for(entry) for entry in entries]
+
+
+async def event_stream(user_id, since=None):
+    """
+    Yield server-sent events for the user's changes as they are committed.
+
+    Entries after ``since`` are replayed from the change log first. If there
+    are more than ``SYNC_PAGE_SIZE`` of them, or some have been pruned, a
+    ``resync`` event asks the client to catch up through /api/sync/
+    instead, and the stream ends.
+    """
+    subscription = broadcaster.subscribe(user_id)
+    try:
+        last_sent = since or 0
+        if since is not None:
+            limit = getattr(settings, 'SYNC_PAGE_SIZE', 500)
+            replay = await sync_to_async(_replay)(user_id, since, limit)
+            if replay is None or len(replay) > limit:
+                yield f'event: resync\ndata: {json.dumps({"cursor": since})}\n\n'
+                return
+            for event in replay:
+                last_sent = event['id']
+                yield _format(event)
+        else:
+            # Flush the headers so the client knows it is connected.
+            yield ': connected\n\n'
+
+        keepalive = getattr(settings, 'SYNC_EVENTS_KEEPALIVE', 15)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event is None:
+                return
+            if event['id'] > last_sent:
+                last_sent = event['id']
+                yield _format(event)
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+@require_GET
+async def events(request):
+    """
+    ``text/event-stream`` of the user's changes: one ``change`` event per
+    change log entry, with the entry id as the event id.
+
+    Authenticates like the rest of the API, so browsers read it with
+    ``fetch`` rather than ``EventSource``. On reconnect, send the last event
+    id as ``Last-Event-ID`` (or a /api/sync/ cursor as ``?since=``) to
+    receive what was missed.
+
+    Only served over ASGI (backend.asgi). Under WSGI every open stream
+    would hold a worker thread for as long as the client stays connected,
+    so WSGI requests get a 501.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'detail': 'The event stream is only served over ASGI.'}, status=501)
+
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+    if since is not None:
+        since = _cursor(since)
+        if since is None:
+            return JsonResponse({'detail': '"since" must be a cursor from a previous sync.'}, status=400)
+
+    response = StreamingHttpResponse(event_stream(user.id, since), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
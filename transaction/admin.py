@@ -2,8 +2,9 @@ from django.contrib import admin
 from django.db.models import Sum
 from django.utils.html import format_html
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, datetime, time, timedelta
 from .models import Transaction
+from dashboard.signals import bulk_updated, owned_rows
 
 
 class AmountRangeFilter(admin.SimpleListFilter):
@@ -32,6 +33,14 @@ class AmountRangeFilter(admin.SimpleListFilter):
             return queryset.filter(amount__gt=1000)
 
 
+def _between(queryset, start, end=None):
+    """Transactions from local day ``start`` up to, not including, day ``end``."""
+    queryset = queryset.filter(date__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if end is not None:
+        queryset = queryset.filter(date__lt=timezone.make_aware(datetime.combine(end, time.min)))
+    return queryset
+
+
 class DateRangeFilter(admin.SimpleListFilter):
     title = 'Date Range'
     parameter_name = 'date_range'
@@ -46,19 +55,21 @@ class DateRangeFilter(admin.SimpleListFilter):
         )
 
     def queryset(self, request, queryset):
-        today = timezone.now().date()
+        # Bounds on the column itself, not on date parts, so the date index
+        # and partition pruning apply.
+        today = timezone.localdate()
         if self.value() == 'today':
-            return queryset.filter(date__date=today)
+            return _between(queryset, today, today + timedelta(days=1))
         if self.value() == 'week':
-            start = today - timedelta(days=today.weekday())
-            return queryset.filter(date__date__gte=start)
+            return _between(queryset, today - timedelta(days=today.weekday()))
         if self.value() == 'month':
-            return queryset.filter(date__year=today.year, date__month=today.month)
+            start = today.replace(day=1)
+            return _between(queryset, start, (start + timedelta(days=32)).replace(day=1))
         if self.value() == 'quarter':
             quarter_start_month = ((today.month - 1) // 3) * 3 + 1
-            return queryset.filter(date__year=today.year, date__month__gte=quarter_start_month)
+            return _between(queryset, today.replace(month=quarter_start_month, day=1), date(today.year + 1, 1, 1))
         if self.value() == 'year':
-            return queryset.filter(date__year=today.year)
+            return _between(queryset, date(today.year, 1, 1), date(today.year + 1, 1, 1))
 
 
 @admin.register(Transaction)
@@ -111,7 +122,7 @@ class TransactionAdmin(admin.ModelAdmin):
     def amount_display(self, obj):
         color = 'green' if obj.type == 'deposit' else 'red'
         sign = '+' if obj.type == 'deposit' else '-'
-        return format_html('<span style="color: {}; font-weight: bold;">{} ${:,.2f}</span>', color, sign, obj.amount)
+        return format_html('<span style="color: {}; font-weight: bold;">{} ${}</span>', color, sign, f'{obj.amount:,.2f}')
     amount_display.short_description = 'Amount'
     amount_display.admin_order_field = 'amount'
 
@@ -138,12 +149,16 @@ class TransactionAdmin(admin.ModelAdmin):
 
     @admin.action(description='Mark selected as Deposit')
     def mark_as_deposit(self, request, queryset):
+        pks, user_ids = owned_rows(queryset)
         updated = queryset.update(type='deposit')
+        bulk_updated.send(sender=queryset.model, pks=pks, user_ids=user_ids)
         self.message_user(request, f'{updated} transaction(s) marked as deposit.')
 
     @admin.action(description='Mark selected as Withdrawal')
     def mark_as_withdrawal(self, request, queryset):
+        pks, user_ids = owned_rows(queryset)
         updated = queryset.update(type='withdrawal')
+        bulk_updated.send(sender=queryset.model, pks=pks, user_ids=user_ids)
         self.message_user(request, f'{updated} transaction(s) marked as withdrawal.')
 
     @admin.action(description='Export selected transactions summary')
@@ -0,0 +1,182 @@
+"""
+Cold archive of old transactions.
+
+``archive_user`` moves a user's transactions dated before a cutoff out of
+the database into ``TRANSACTION_ARCHIVE_DIR/<user id>/<year>.ndjson.gz``,
+one JSON object per line in the TransactionSerializer shape. What stays
+behind is an ArchivedYear per file and TransactionRollup rows (count and
+sum per account, category, type and month), so all-time totals need no
+archive reads.
+
+``archived_rows`` reads them back for a date range: history queries that
+reach before the user's archive cutoff merge these rows in after the live
+ones. Decompressed years are memoized per process, keyed by file and
+modification time.
+"""
+
+import gzip
+import json
+import os
+from datetime import date, datetime, time
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.db import models, router, transaction as db_transaction
+from django.db.models import Count, DateField, Max, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from dashboard.versioning import bump
+from .models import ArchivedYear, Transaction, TransactionRollup
+from .serializers import TransactionSerializer
+
+YEAR_CACHE_SIZE = 32
+DELETE_CHUNK_SIZE = 1000
+
+
+def archive_path(user_id, year):
+    return Path(settings.TRANSACTION_ARCHIVE_DIR) / str(user_id) / f'{year}.ndjson.gz'
+
+
+def _year_start(year):
+    return timezone.make_aware(datetime.combine(date(year, 1, 1), time.min))
+
+
+@lru_cache(maxsize=YEAR_CACHE_SIZE)
+def _load(path, mtime_ns):
+    with gzip.open(path, 'rt', encoding='utf-8') as lines:
+        return tuple(json.loads(line) for line in lines)
+
+
+def read_year(user_id, year):
+    """Every archived row of the user's year, as stored; empty if there is no file."""
+    path = archive_path(user_id, year)
+    try:
+        return _load(str(path), path.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return ()
+
+
+def _write_year(user_id, year, rows):
+    # Written beside the old file and renamed over it, so readers see either.
+    path = archive_path(user_id, year)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix('.partial')
+    with gzip.open(partial, 'wt', encoding='utf-8') as out:
+        for row in rows:
+            out.write(json.dumps(row, separators=(',', ':')))
+            out.write('\n')
+    os.replace(partial, path)
+
+
+def _add_rollups(user_id, transactions):
+    rollups = {}
+    for rollup in TransactionRollup.objects.filter(user_id=user_id, month__in={row['month'] for row in transactions}):
+        rollups[(rollup.account_id, rollup.budget_category_id, rollup.type, rollup.month)] = rollup
+    for row in transactions:
+        key = (row['account'], row['budget_category'], row['type'], row['month'])
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = TransactionRollup(
+                user_id=user_id, account_id=key[0], budget_category_id=key[1], type=key[2], month=key[3],
+            )
+        rollup.count += row['count']
+        rollup.total += row['total']
+    TransactionRollup.objects.bulk_create([rollup for rollup in rollups.values() if rollup.pk is None])
+    TransactionRollup.objects.bulk_update([rollup for rollup in rollups.values() if rollup.pk is not None], ['count', 'total'])
+
+
+def _delete_archived(ids):
+    # A raw delete, with no per-row post_delete receivers: archiving moves
+    # rows rather than deleting them, so
+    # - the running CategoryStats (and the RecurringSeries found earlier)
+    #   keep counting them, as they are still the user's history;
+    # - sync clients get no tombstones. Their copies of archived rows stay
+    #   valid, since archived rows are never changed again, and a fresh
+    #   snapshot simply starts at the live rows, like the transaction list.
+    # Rows that cascade from a transaction (duplicate candidates, which
+    # have no database constraint) go with it.
+    for relation in Transaction._meta.get_fields(include_hidden=True):
+        if relation.one_to_many and relation.auto_created and relation.on_delete is models.CASCADE:
+            relation.related_model._base_manager.filter(**{f'{relation.field.name}__in': ids}).delete()
+    Transaction.objects.filter(pk__in=ids)._raw_delete(router.db_for_write(Transaction))
+
+
+def archive_year(user_id, year, before):
+    """
+    Move the user's transactions of ``year`` dated before ``before`` into the
+    year's archive file. Returns how many were moved.
+
+    The file is written first and the database changed after, in one
+    transaction: if that fails, the rows stay live and the next run writes
+    them again, replacing their copies in the file by id. The rows are
+    deleted without signals (see ``_delete_archived``) and the user's
+    'transactions' version is bumped once.
+    """
+    before = min(before, _year_start(year + 1))
+    transactions = (
+        Transaction.objects.filter(user_id=user_id, date__gte=_year_start(year), date__lt=before)
+        .order_by('date', 'id')
+    )
+    live = list(transactions)
+    moved = {}
+    for transaction, data in zip(live, TransactionSerializer(live, many=True).data):
+        moved[transaction.id] = {**data, 'merchant': transaction.merchant_id}
+    if not moved:
+        return 0
+    rows = [row for row in read_year(user_id, year) if row['id'] not in moved] + list(moved.values())
+    _write_year(user_id, year, sorted(rows, key=lambda row: (parse_datetime(row['date']), row['id'])))
+
+    with db_transaction.atomic():
+        _add_rollups(user_id, list(
+            transactions.filter(pk__in=list(moved)).order_by()
+            .annotate(month=TruncMonth('date', output_field=DateField()))
+            .values('account', 'budget_category', 'type', 'month')
+            .annotate(count=Count('id'), total=Sum('amount'))
+        ))
+        ArchivedYear.objects.update_or_create(
+            user_id=user_id, year=year, defaults={'before': before, 'count': len(rows)},
+        )
+        ids = list(moved)
+        for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+            _delete_archived(ids[start:start + DELETE_CHUNK_SIZE])
+    bump([user_id], 'transactions')
+    return len(moved)
+
+
+def archive_user(user_id, cutoff):
+    """Archive every year of the user's transactions dated before ``cutoff``. Returns how many were moved."""
+    years = Transaction.objects.filter(user_id=user_id, date__lt=cutoff).dates('date', 'year')
+    return sum(archive_year(user_id, day.year, cutoff) for day in years)
+
+
+def archive_cutoff(user_id):
+    """Transactions of the user dated before this may be in the archive; None if nothing is archived."""
+    return ArchivedYear.objects.filter(user_id=user_id).aggregate(before=Max('before'))['before']
+
+
+def archived_rows(user_id, start=None, end=None):
+    """
+    Archived rows of the user dated from ``start`` up to, not including,
+    ``end`` (either may be None), newest first, in the TransactionSerializer
+    shape.
+    """
+    cutoff = archive_cutoff(user_id)
+    if cutoff is None or (start is not None and start >= cutoff):
+        return []
+    years = ArchivedYear.objects.filter(user_id=user_id)
+    if start is not None:
+        years = years.filter(year__gte=timezone.localtime(start).year)
+    if end is not None:
+        years = years.filter(year__lte=timezone.localtime(end).year)
+    fields = TransactionSerializer.Meta.fields
+    rows = []
+    for year in years.values_list('year', flat=True):
+        for row in read_year(user_id, year):
+            when = parse_datetime(row['date'])
+            if (start is None or when >= start) and (end is None or when < end):
+                rows.append((when, row['id'], {field: row[field] for field in fields if field in row}))
+    rows.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    return [row for _, _, row in rows]
@@ -0,0 +1,40 @@
+from datetime import datetime, time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from transaction.archive import archive_user
+
+
+class Command(BaseCommand):
+    help = 'Move old transactions into per-user, per-year gzip NDJSON archive files, leaving monthly rollups behind.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--years', type=int, default=settings.TRANSACTION_ARCHIVE_YEARS,
+            help='Archive transactions from before the start of the month this many years ago.',
+        )
+        parser.add_argument('--before', help='Archive transactions dated before this day (YYYY-MM-DD) instead.')
+        parser.add_argument('--user', type=int, nargs='+', dest='users', help='Only these user ids.')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            day = parse_date(options['before'])
+            if day is None:
+                raise CommandError('--before expects a date as YYYY-MM-DD.')
+        else:
+            today = timezone.localdate()
+            day = today.replace(year=today.year - options['years'], day=1)
+        cutoff = timezone.make_aware(datetime.combine(day, time.min))
+
+        users = User.objects.filter(transactions__date__lt=cutoff).distinct().order_by('id')
+        if options['users']:
+            users = users.filter(id__in=options['users'])
+        user_ids = list(users.values_list('id', flat=True))
+        moved = sum(archive_user(user_id, cutoff) for user_id in user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved} transaction(s) dated before {day} for {len(user_ids)} user(s).'
+        ))
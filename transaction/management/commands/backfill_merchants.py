@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+
+from transaction.merchants import merchant_ids, normalize_merchant
+from transaction.models import Transaction
+
+
+class Command(BaseCommand):
+    help = 'Set the normalized merchant of existing transactions, in chunks of ids.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every transaction, not only those without a merchant.')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Transactions per chunk.')
+
+    def handle(self, *args, **options):
+        transactions = Transaction.objects.all() if options['all'] else Transaction.objects.filter(merchant__isnull=True)
+        size = options['chunk_size']
+        updated = 0
+        last_id = 0
+        while True:
+            chunk = list(transactions.filter(id__gt=last_id).order_by('id').values_list('id', 'description', 'merchant_id')[:size])
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            names = {transaction_id: normalize_merchant(description) for transaction_id, description, _ in chunk}
+            with db_transaction.atomic():
+                ids = merchant_ids(set(names.values()))
+                by_merchant = {}
+                for transaction_id, _, current in chunk:
+                    merchant = ids.get(names[transaction_id])
+                    if merchant != current:
+                        by_merchant.setdefault(merchant, []).append(transaction_id)
+                # Merchants are derived data and not part of any synced
+                # payload, so this skips bulk_updated on purpose.
+                for merchant, transaction_ids in by_merchant.items():
+                    updated += Transaction.objects.filter(pk__in=transaction_ids).update(merchant_id=merchant)
+        self.stdout.write(self.style.SUCCESS(f'Set the merchant of {updated} transaction(s).'))
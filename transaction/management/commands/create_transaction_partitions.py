@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction as db_transaction
+
+from transaction.partitions import create_partitions, is_partitioned, partition_table
+
+
+class Command(BaseCommand):
+    help = 'Create the monthly transaction partitions for the coming months (PostgreSQL, TRANSACTION_PARTITIONING).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int, default=settings.TRANSACTION_PARTITION_MONTHS_AHEAD,
+            help='Months after the current one to create.',
+        )
+        parser.add_argument(
+            '--convert', action='store_true',
+            help='Partition the table first if it is still a plain one (locks it while rows are copied).',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Transaction partitioning needs PostgreSQL.')
+        with db_transaction.atomic():
+            if not is_partitioned():
+                if not options['convert']:
+                    raise CommandError('The transaction table is not partitioned; run with --convert to partition it.')
+                partition_table(options['months'])
+                self.stdout.write('Partitioned the transaction table by month.')
+            created = create_partitions(options['months'])
+        self.stdout.write(self.style.SUCCESS(f'Created {len(created)} partition(s): {", ".join(created) or "none needed"}.'))
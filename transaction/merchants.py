@@ -0,0 +1,76 @@
+"""
+Merchant normalization.
+
+Bank descriptions name the same merchant many ways ("AMZN Mktp US*2K3L",
+"Amazon.com", "POS AMAZON.COM 4411"). ``normalize_merchant`` reduces them
+to one name: payment-processor prefixes and reference codes after a '*'
+are cut, digits and punctuation dropped, noise words removed and known
+abbreviations expanded. Transactions point at a Merchant row per name, so
+merchant reports group on an indexed foreign key instead of scanning
+descriptions.
+"""
+
+import re
+from functools import lru_cache
+
+from .models import Merchant
+
+NORMALIZE_CACHE_SIZE = 20000
+
+_PROCESSOR = re.compile(r'^(?:sq|tst|sp|pp|paypal|ppl|pos|in|py)\s*\*\s*')
+_REFERENCE = re.compile(r'\*.*$')
+_NOISE = re.compile(r"[^a-z&' ]+")
+_STOPWORDS = {
+    'pos', 'purchase', 'debit', 'credit', 'card', 'payment', 'ach', 'online', 'recurring', 'ref', 'the',
+    'com', 'www', 'net', 'org', 'inc', 'llc', 'ltd', 'co', 'corp', 'mktp', 'marketplace', 'us', 'usa', 'store',
+}
+_ALIASES = {
+    'amzn': 'amazon',
+    'wm': 'walmart',
+    'wal': 'walmart',
+    'mcdonald': 'mcdonalds',
+    "mcdonald's": 'mcdonalds',
+    'sbux': 'starbucks',
+    'wholefds': 'whole foods',
+}
+MAX_WORDS = 4
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_merchant(description):
+    """'AMZN Mktp US*2K3L' -> 'amazon'; '' for descriptions with nothing recognizable."""
+    text = _REFERENCE.sub('', _PROCESSOR.sub('', description.lower().strip()))
+    words = []
+    for word in _NOISE.sub(' ', text).split():
+        word = _ALIASES.get(word.strip("'"), word.strip("'"))
+        if len(word) > 1 and word not in _STOPWORDS and word not in words:
+            words.append(word)
+    return ' '.join(words[:MAX_WORDS])[:100]
+
+
+def merchant_ids(names):
+    """
+    Map each normalized name to its Merchant id, creating missing rows.
+
+    One upsert on the unique name index that returns the id of every row,
+    new or existing. Backends that cannot return ids from it (MySQL) read
+    them back in a second query.
+    """
+    names = set(names) - {''}
+    if not names:
+        return {}
+    merchants = Merchant.objects.bulk_create(
+        [Merchant(name=name) for name in names],
+        update_conflicts=True, unique_fields=['name'], update_fields=['name'],
+    )
+    result = {merchant.name: merchant.pk for merchant in merchants if merchant.pk is not None}
+    missing = names - set(result)
+    if missing:
+        result.update(Merchant.objects.filter(name__in=missing).values_list('name', 'id'))
+    return result
+
+
+def merchant_id(description):
+    """Merchant id for a transaction description, or None."""
+    name = normalize_merchant(description)
+    return merchant_ids([name]).get(name) if name else None
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0002_account_user'),
+        ('category', '0001_initial'),
+        ('transaction', '0004_alter_transaction_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'type', '-amount'], name='transaction_user_type_amount'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def partition(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql' and settings.TRANSACTION_PARTITIONING:
+        from transaction.partitions import partition_table
+        partition_table(settings.TRANSACTION_PARTITION_MONTHS_AHEAD, schema_editor.connection)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        from transaction.partitions import unpartition_table
+        unpartition_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_duplicatecandidate_no_db_constraint'),
+        ('transaction', '0006_transaction_merchant'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
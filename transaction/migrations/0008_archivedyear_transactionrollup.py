@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0002_account_user'),
+        ('category', '0002_categoryrule'),
+        ('transaction', '0007_partition_by_month'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedYear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('before', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_years', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'year'), name='archived_year_unique_year')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TransactionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('deposit', 'Deposit'), ('withdrawal', 'Withdrawal')], max_length=50)),
+                ('month', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_rollups', to='account.account')),
+                ('budget_category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='transaction_rollups', to='category.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'month'], name='rollup_user_month')],
+            },
+        ),
+    ]
@@ -4,6 +4,13 @@ from django.contrib.auth.models import User
 from category.models import Category
 
 # Create your models here.
+class Merchant(models.Model):
+    name = models.CharField(max_length=100, unique=True)  # normalized name, see transaction.merchants
+
+    def __str__(self):
+        return self.name
+
+
 class Transaction(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions') # which user made the transaction
     amount = models.DecimalField(max_digits=10, decimal_places=2) # monetary amount
@@ -12,6 +19,69 @@ class Transaction(models.Model):
     account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='transactions') # which account the transaction is associated with
     budget_category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='transactions', blank=True, null=True) # optional budget category
     type = models.CharField(max_length=50, choices=[('deposit', 'Deposit'), ('withdrawal', 'Withdrawal')]) # type of transaction
+    merchant = models.ForeignKey(Merchant, on_delete=models.SET_NULL, related_name='transactions', blank=True, null=True) # derived from the description on save
+
+    class Meta:
+        indexes = [
+            # Largest deposits/withdrawals per user (TransactionViewSet.top).
+            models.Index(fields=['user', 'type', '-amount'], name='transaction_user_type_amount'),
+            # Spend per merchant and a merchant's history (MerchantViewSet).
+            models.Index(fields=['user', 'merchant', '-date'], name='transaction_user_merchant'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored description, so that saves which keep it skip the
+        # merchant lookup (transaction.signals), and the fields the category
+        # stats are kept on, so that an update can take the old amount out
+        # without reading the row again (analytics.signals).
+        instance._loaded_description = instance.__dict__.get('description')
+        instance._loaded_stats = instance.stats_key()
+        return instance
+
+    def stats_key(self):
+        """(user id, category id, amount, type), or None with any of them deferred."""
+        fields = ('user_id', 'budget_category_id', 'amount', 'type')
+        if any(field not in self.__dict__ for field in fields):
+            return None
+        return tuple(self.__dict__[field] for field in fields)
+
+    def __str__(self):
+        return f"{self.description}: ${self.amount} on {self.date}"
+
+
+class ArchivedYear(models.Model):
+    """A year of a user's transactions moved to the cold archive (transaction.archive)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_years')
+    year = models.PositiveSmallIntegerField()
+    before = models.DateTimeField()  # every transaction of the year dated before this is in the archive file
+    count = models.PositiveIntegerField(default=0)  # transactions in the file
+    archived_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'year'], name='archived_year_unique_year'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}/{self.year}: {self.count} transactions"
+
+
+class TransactionRollup(models.Model):
+    """Count and sum of archived transactions, per account, category, type and month."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transaction_rollups')
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='transaction_rollups')
+    budget_category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='transaction_rollups', blank=True, null=True)
+    type = models.CharField(max_length=50, choices=[('deposit', 'Deposit'), ('withdrawal', 'Withdrawal')])
+    month = models.DateField()  # first day of the month
+    count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'month'], name='rollup_user_month'),
+        ]
 
     def __str__(self):
-        return f"{self.description}: ${self.amount} on {self.date}"
\ No newline at end of file
+        return f"{self.month:%Y-%m} {self.type}: {self.count} for ${self.total}"
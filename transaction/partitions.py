@@ -0,0 +1,204 @@
+"""
+Monthly range partitioning of transaction_transaction (PostgreSQL).
+
+Partitioned, the table is a parent holding no rows of its own, one child
+table per calendar month (UTC) of ``date`` named
+``transaction_transaction_pYYYYMM``, and a default partition that catches
+dates outside them. A query bounded on ``date`` only scans the months it
+can touch; the planner prunes the rest.
+
+PostgreSQL requires the partition key in every unique constraint, so the
+primary key becomes (id, date). ``id`` stays unique in practice, being
+drawn from one identity sequence, but no foreign key can reference the
+table by id alone: tables pointing at transactions use ``db_constraint=False``.
+
+``partition_table`` converts the existing table in place, ``create_partitions``
+adds months ahead of time, and ``unpartition_table`` reverses the conversion.
+"""
+
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection as default_connection
+
+from .models import Transaction
+
+TABLE = Transaction._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month.year}{month.month:02d}'
+
+
+def is_partitioned(connection=default_connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def partitions(connection=default_connection):
+    """Names of the table's partitions, in creation order."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s) ORDER BY c.oid", [TABLE],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _create_partition(cursor, month):
+    """
+    Attach the partition for ``month`` unless it exists. Rows already caught
+    by the default partition for that month are moved into it first, since
+    attaching fails while the default partition holds any.
+    """
+    name = partition_name(month)
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is not None:
+        return False
+    bounds = [month, add_months(month, 1)]
+    cursor.execute(f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE "date" >= %s AND "date" < %s RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved', bounds,
+    )
+    cursor.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', bounds)
+    return True
+
+
+def create_partitions(months_ahead, today=None, connection=default_connection):
+    """
+    Make sure the partitions from the current month to ``months_ahead``
+    months later exist. Returns the names of the partitions created.
+    """
+    current = month_start(today or datetime.now(dt_timezone.utc))
+    created = []
+    with connection.cursor() as cursor:
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if _create_partition(cursor, month):
+                created.append(partition_name(month))
+    return created
+
+
+def partition_table(months_ahead, connection=default_connection):
+    """
+    Convert the plain transaction table into a partitioned one with the same
+    columns, indexes and foreign keys, one partition per month from the
+    oldest transaction to ``months_ahead`` months from now. Run inside a
+    transaction; the table is locked while rows are copied.
+    """
+    if is_partitioned(connection):
+        return
+    old = f'{TABLE}_unpartitioned'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conrelid::regclass::text FROM pg_constraint WHERE contype = 'f' AND confrelid = %s::regclass", [TABLE],
+        )
+        referencing = [row[0] for row in cursor.fetchall()]
+        if referencing:
+            raise PartitioningError(
+                f'Foreign keys from {", ".join(referencing)} reference {TABLE}; '
+                f'declare them with db_constraint=False first.'
+            )
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+            [TABLE, f'{TABLE}_pkey'],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE contype = 'f' AND conrelid = %s::regclass",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+        sequence = cursor.fetchone()[0]
+
+        cursor.execute(f'LOCK TABLE "{TABLE}" IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{old}"')
+        cursor.execute(f'ALTER SEQUENCE {sequence} RENAME TO "{old}_id_seq"')
+        cursor.execute(f'ALTER TABLE "{old}" DROP CONSTRAINT "{TABLE}_pkey"')
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX "{name}"')
+
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{old}" INCLUDING ALL EXCLUDING INDEXES) PARTITION BY RANGE ("date")'
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY ("id", "date")')
+        for _, definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+
+        cursor.execute(f'SELECT min("date") FROM "{old}"')
+        oldest = cursor.fetchone()[0]
+        current = month_start(datetime.now(dt_timezone.utc))
+        month = month_start(oldest) if oldest is not None else current
+        while month <= add_months(current, months_ahead):
+            _create_partition(cursor, month)
+            month = add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{old}"')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), coalesce(max(id), 1), max(id) IS NOT NULL) FROM \"{TABLE}\"",
+            [TABLE],
+        )
+        cursor.execute(f'DROP TABLE "{old}"')
+
+
+def unpartition_table(connection=default_connection):
+    """Turn the partitioned table back into a plain one with the same rows, indexes and foreign keys."""
+    if not is_partitioned(connection):
+        return
+    old = f'{TABLE}_partitioned'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+            [TABLE, f'{TABLE}_pkey'],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE contype = 'f' AND conrelid = %s::regclass AND conparentid = 0",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+        sequence = cursor.fetchone()[0]
+
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{old}"')
+        cursor.execute(f'ALTER SEQUENCE {sequence} RENAME TO "{old}_id_seq"')
+        cursor.execute(f'ALTER TABLE "{old}" DROP CONSTRAINT "{TABLE}_pkey"')
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX "{name}"')
+
+        cursor.execute(f'CREATE TABLE "{TABLE}" (LIKE "{old}" INCLUDING ALL EXCLUDING INDEXES)')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY ("id")')
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{old}"')
+        for _, definition in indexes:
+            cursor.execute(definition.replace(' ON ONLY ', ' ON '))
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), coalesce(max(id), 1), max(id) IS NOT NULL) FROM \"{TABLE}\"",
+            [TABLE],
+        )
+        cursor.execute(f'DROP TABLE "{old}" CASCADE')
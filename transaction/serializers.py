@@ -1,20 +1,35 @@
 from rest_framework import serializers
-from transaction.models import Transaction
+from backend.metrics import TimedSerializerMixin
+from dashboard.lookups import CachedNameField
+from transaction.models import Merchant, Transaction
 from django.contrib.auth.models import User
 from account.models import Account
 from category.models import Category
 
-class TransactionSerializer(serializers.ModelSerializer):
-    user_username = serializers.ReadOnlyField(source='user.username')
-    account_name = serializers.ReadOnlyField(source='account.name_account')
-    budget_category_name = serializers.ReadOnlyField(source='budget_category.name')
+class TransactionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    user_username = CachedNameField('users', source='user.username')
+    account_name = CachedNameField('accounts', source='account.name_account')
+    budget_category_name = CachedNameField('categories', source='budget_category.name')
 
     class Meta:
         model = Transaction
         fields = ['id', 'user', 'user_username', 'amount', 'description', 'date', 'account', 'account_name', 'budget_category' , 'budget_category_name', 'type']
         read_only_fields = ['id', 'date', 'user']
 
-class UserSerializer(serializers.ModelSerializer):
+class MerchantSpendSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    total = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    count = serializers.IntegerField(read_only=True)
+    average = serializers.SerializerMethodField()
+    last_date = serializers.DateTimeField(read_only=True)
+
+    class Meta:
+        model = Merchant
+        fields = ['id', 'name', 'total', 'count', 'average', 'last_date']
+
+    def get_average(self, obj):
+        return f'{obj.total / obj.count:.2f}'
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     transaction = serializers.PrimaryKeyRelatedField(many=True, queryset=Transaction.objects.all())
 
     class Meta:
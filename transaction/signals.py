@@ -0,0 +1,14 @@
+from django.db.models.signals import pre_save
+
+from .merchants import merchant_id
+from .models import Transaction
+
+
+def set_merchant(sender, instance, **kwargs):
+    if not instance._state.adding and instance.description == getattr(instance, '_loaded_description', None):
+        return
+    instance.merchant_id = merchant_id(instance.description)
+    instance._loaded_description = instance.description
+
+
+pre_save.connect(set_merchant, sender=Transaction, dispatch_uid='transaction-merchant')
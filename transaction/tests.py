@@ -1,3 +1,345 @@
-from django.test import TestCase
+import re
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+import tempfile
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from account.models import Account
+from analytics.models import CategoryStats, DuplicateCandidate
+from category.models import Category
+from dashboard.versioning import get_versions
+from dashboard.views import _spending_by_category, _transaction_totals
+from transaction.archive import archive_path, read_year
+from transaction.merchants import merchant_ids, normalize_merchant
+from transaction.models import ArchivedYear, Merchant, Transaction, TransactionRollup
+from sync.models import ChangeLog
+from transaction.partitions import add_months, create_partitions, month_start, partition_name
+
+
+class TopTransactionsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='top_user', password='test123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('0.00'), user=self.user)
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.travel = Category.objects.create(name='Travel', user=self.user)
+        for amount, category in [('10', self.food), ('30', self.food), ('20', self.food), ('500', self.travel), ('5', None)]:
+            self._create(amount, category)
+        self._create('1000', self.travel, type='deposit')
+
+    def _create(self, amount, category, type='withdrawal'):
+        return Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), description=f'Spend {amount}', account=self.account,
+            budget_category=category, type=type,
+        )
+
+    def _amounts(self, rows):
+        return [row['amount'] for row in rows]
+
+    def test_largest_withdrawals(self):
+        response = self.client.get('/api/transactions/top/', {'limit': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._amounts(response.data), ['500.00', '30.00', '20.00'])
+
+    def test_deposits_and_category(self):
+        self.assertEqual(self._amounts(self.client.get('/api/transactions/top/', {'type': 'deposit'}).data), ['1000.00'])
+        response = self.client.get('/api/transactions/top/', {'category': self.food.id, 'limit': 2})
+        self.assertEqual(self._amounts(response.data), ['30.00', '20.00'])
+
+    def test_date_window(self):
+        old = self._create('9999', self.food)
+        Transaction.objects.filter(pk=old.pk).update(date=timezone.now() - timedelta(days=40))
+        start = (timezone.now() - timedelta(days=7)).date().isoformat()
+        response = self.client.get('/api/transactions/top/', {'start': start, 'limit': 1})
+        self.assertEqual(self._amounts(response.data), ['500.00'])
+        self.assertEqual(self.client.get('/api/transactions/top/', {'start': 'yesterday'}).status_code, 400)
+
+    def test_rejects_bad_filters(self):
+        for params in [{'start': '2020-13-01'}, {'end': '2020-02-30'}, {'category': 'abc'}, {'category': '9' * 30}]:
+            self.assertEqual(self.client.get('/api/transactions/top/', params).status_code, 400, params)
+        self.assertEqual(self.client.get('/api/transactions/', {'start': '2020-13-01'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/merchants/', {'end': '2020-02-30'}).status_code, 400)
+
+    def test_per_category(self):
+        response = self.client.get('/api/transactions/top/', {'per_category': 'true', 'limit': 2})
+        groups = {group['category_name']: self._amounts(group['transactions']) for group in response.data}
+        self.assertEqual(groups, {'Food': ['30.00', '20.00'], 'Travel': ['500.00'], None: ['5.00']})
+        self.assertEqual([group['category_name'] for group in response.data], ['Food', 'Travel', None])
+
+    def test_per_category_names_without_a_query_per_row(self):
+        def queries():
+            with CaptureQueriesContext(connection) as captured:
+                self.client.get('/api/transactions/top/', {'per_category': 'true', 'limit': 50})
+            return len(captured)
+
+        queries()  # builds the name maps
+        few = queries()
+        for i in range(30):
+            self._create('1', self.food if i % 2 else self.travel)
+        self.assertEqual(queries(), few)
+
+    def test_only_own_transactions(self):
+        other = User.objects.create_user(username='other_top_user', password='test123')
+        other_account = Account.objects.create(name_account='Other', balance=Decimal('0.00'), user=other)
+        Transaction.objects.create(user=other, amount=Decimal('100000'), description='Big', account=other_account, type='withdrawal')
+        self.assertEqual(self._amounts(self.client.get('/api/transactions/top/', {'limit': 1}).data), ['500.00'])
+
+
+class NormalizeMerchantTests(SimpleTestCase):
+    def test_variants_share_a_name(self):
+        for description in ['AMZN Mktp US*2K3L45', 'Amazon.com', 'POS AMAZON.COM 4411', 'amzn mktp us']:
+            self.assertEqual(normalize_merchant(description), 'amazon', description)
+        self.assertEqual(normalize_merchant('SQ *BLUE BOTTLE COFFEE 0042'), 'blue bottle coffee')
+        self.assertEqual(normalize_merchant('UBER *TRIP HELP.UBER.COM'), 'uber')
+        self.assertEqual(normalize_merchant('12345'), '')
+
+
+class MerchantTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='merchant_user', password='test123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('0.00'), user=self.user)
+        for description, amount in [('AMZN Mktp US*2K3', '30.00'), ('Amazon.com', '20.00'), ('Corner Cafe', '4.50')]:
+            self._create(description, amount)
+        self._create('Amazon.com refund', '15.00', type='deposit')
+
+    def _create(self, description, amount, type='withdrawal', user=None, account=None):
+        return Transaction.objects.create(
+            user=user or self.user, amount=Decimal(amount), description=description, account=account or self.account, type=type,
+        )
+
+    def test_set_on_save(self):
+        transaction = self._create('Whole Foods #10', '12.00')
+        self.assertEqual(transaction.merchant.name, 'whole foods')
+        transaction.description = 'Amazon.com'
+        transaction.save()
+        self.assertEqual(Transaction.objects.get(pk=transaction.pk).merchant.name, 'amazon')
+
+    def test_saves_keeping_the_description_skip_the_lookup(self):
+        transaction = Transaction.objects.get(pk=self._create('Whole Foods #10', '12.00').pk)
+        transaction.amount = Decimal('13.00')
+        with mock.patch('transaction.signals.merchant_id') as lookup:
+            transaction.save()
+        lookup.assert_not_called()
+        self.assertEqual(Transaction.objects.get(pk=transaction.pk).merchant.name, 'whole foods')
+
+    def test_ids_come_from_one_upsert(self):
+        amazon = Merchant.objects.get(name='amazon')
+        with self.assertNumQueries(1):
+            ids = merchant_ids(['amazon', 'whole foods', ''])
+        self.assertEqual(ids['amazon'], amazon.pk)
+        self.assertEqual(ids['whole foods'], Merchant.objects.get(name='whole foods').pk)
+        self.assertEqual(set(ids), {'amazon', 'whole foods'})
+
+    def test_spend_by_merchant(self):
+        other = User.objects.create_user(username='other_merchant_user', password='test123')
+        self._create('Amazon.com', '999.00', user=other, account=Account.objects.create(name_account='O', balance=0, user=other))
+        response = self.client.get('/api/merchants/')
+        rows = [(row['name'], row['total'], row['count'], row['average']) for row in response.data['results']]
+        self.assertEqual(rows, [('amazon', '50.00', 2, '25.00'), ('corner cafe', '4.50', 1, '4.50')])
+        deposits = self.client.get('/api/merchants/', {'type': 'deposit'}).data['results']
+        self.assertEqual([(row['name'], row['total']) for row in deposits], [('amazon refund', '15.00')])
+
+    def test_merchant_transactions(self):
+        amazon = Merchant.objects.get(name='amazon')
+        response = self.client.get(f'/api/merchants/{amazon.id}/transactions/')
+        self.assertEqual([row['amount'] for row in response.data['results']], ['20.00', '30.00'])
+        for pk in ['abc', '9' * 30]:
+            self.assertEqual(self.client.get(f'/api/merchants/{pk}/transactions/').status_code, 404, pk)
+
+    def test_backfill(self):
+        Transaction.objects.update(merchant=None)
+        Merchant.objects.all().delete()
+        call_command('backfill_merchants', chunk_size=2, stdout=StringIO())
+        names = set(Transaction.objects.values_list('merchant__name', flat=True))
+        self.assertEqual(names, {'amazon', 'corner cafe', 'amazon refund'})
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        archive_settings = override_settings(TRANSACTION_ARCHIVE_DIR=directory.name)
+        archive_settings.enable()
+        self.addCleanup(archive_settings.disable)
+
+        self.user = User.objects.create_user(username='archive_user', password='test123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('0.00'), user=self.user)
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.year = timezone.localdate().year - 4
+        self.old = [
+            self._create('Market', '20.00', date(self.year, 3, 5), category=self.food),
+            self._create('Market', '30.00', date(self.year, 3, 20), category=self.food),
+            self._create('Pay', '1000.00', date(self.year + 1, 7, 1), type='deposit'),
+        ]
+        self.recent = self._create('Cafe', '4.00', timezone.localdate(), category=self.food)
+
+    def _create(self, description, amount, day, category=None, type='withdrawal'):
+        transaction = Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), description=description, account=self.account,
+            budget_category=category, type=type,
+        )
+        Transaction.objects.filter(pk=transaction.pk).update(date=timezone.make_aware(datetime.combine(day, time(12))))
+        return transaction
+
+    def _archive(self):
+        call_command('archive_transactions', stdout=StringIO())
+
+    def test_moves_old_transactions_to_files_and_rollups(self):
+        totals = async_to_sync(_transaction_totals)(self.user)
+        spending = async_to_sync(_spending_by_category)(self.user)
+        self._archive()
+        self.assertEqual(list(Transaction.objects.values_list('id', flat=True)), [self.recent.id])
+        self.assertTrue(archive_path(self.user.id, self.year).exists())
+        self.assertEqual([row['amount'] for row in read_year(self.user.id, self.year)], ['20.00', '30.00'])
+        self.assertEqual(ArchivedYear.objects.get(user=self.user, year=self.year + 1).count, 1)
+        march = TransactionRollup.objects.get(user=self.user, month=date(self.year, 3, 1))
+        self.assertEqual((march.count, march.total, march.budget_category), (2, Decimal('50.00'), self.food))
+        self.assertEqual(async_to_sync(_transaction_totals)(self.user), totals)
+        self.assertEqual(async_to_sync(_spending_by_category)(self.user), spending)
+
+    def test_archiving_again_appends(self):
+        self._archive()
+        self._create('Market', '5.00', date(self.year, 12, 1))
+        self._archive()
+        self.assertEqual(ArchivedYear.objects.get(user=self.user, year=self.year).count, 3)
+        self.assertEqual(TransactionRollup.objects.get(user=self.user, month=date(self.year, 3, 1)).count, 2)
+
+    def test_history_reads_through(self):
+        self._archive()
+        response = self.client.get('/api/transactions/', {'start': f'{self.year}-01-01'})
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.recent.id] + [t.id for t in reversed(self.old)])
+        self.assertEqual(response.data['results'][-1]['budget_category_name'], 'Food')
+
+        response = self.client.get('/api/transactions/', {'start': f'{self.year}-03-10', 'end': f'{self.year}-12-31'})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.old[1].id])
+        self.assertEqual(self.client.get('/api/transactions/').data['count'], 1)
+
+    def test_top_reads_through(self):
+        self._archive()
+        response = self.client.get('/api/transactions/top/', {'start': f'{self.year}-01-01'})
+        self.assertEqual([row['amount'] for row in response.data], ['30.00', '20.00', '4.00'])
+        response = self.client.get('/api/transactions/top/', {'type': 'deposit', 'end': f'{self.year + 1}-12-31'})
+        self.assertEqual([row['id'] for row in response.data], [self.old[2].id])
+        response = self.client.get('/api/transactions/top/', {'start': f'{self.year}-01-01', 'per_category': 'true', 'limit': 2})
+        self.assertEqual([group['category_name'] for group in response.data], ['Food'])
+        self.assertEqual([row['amount'] for row in response.data[0]['transactions']], ['30.00', '20.00'])
+        self.assertEqual([row['id'] for row in self.client.get('/api/transactions/top/').data], [self.recent.id])
+
+    def test_merchants_count_live_transactions_only(self):
+        market = Transaction.objects.get(pk=self.old[0].pk).merchant
+        self._archive()
+        merchants = self.client.get('/api/merchants/').data['results']
+        self.assertEqual([merchant['name'] for merchant in merchants], ['cafe'])
+        self.assertEqual(self.client.get(f'/api/merchants/{market.pk}/transactions/').data['count'], 0)
+
+    def test_deletes_without_per_row_signals(self):
+        bulk = Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, amount=Decimal('1.00'), description=f'Bulk {i}', account=self.account,
+                budget_category=self.food, type='withdrawal',
+            )
+            for i in range(200)
+        ])
+        Transaction.objects.filter(pk__in=[transaction.pk for transaction in bulk]).update(
+            date=timezone.make_aware(datetime.combine(date(self.year, 6, 1), time(12))),
+        )
+        candidate = DuplicateCandidate.objects.create(
+            user=self.user, account=self.account, original=self.old[0], duplicate=self.old[1], similarity=1.0,
+        )
+        changes = ChangeLog.objects.count()
+        version = get_versions(self.user.id, ['transactions'])
+        with CaptureQueriesContext(connection) as queries:
+            self._archive()
+        self.assertLess(len(queries), 45)
+        self.assertEqual(list(Transaction.objects.values_list('id', flat=True)), [self.recent.id])
+        self.assertFalse(DuplicateCandidate.objects.filter(pk=candidate.pk).exists())
+        # Archived rows stay in the history: no tombstones, stats untouched.
+        self.assertEqual(ChangeLog.objects.count(), changes)
+        self.assertEqual(CategoryStats.objects.get(user=self.user, category=self.food).count, 3)
+        self.assertNotEqual(get_versions(self.user.id, ['transactions']), version)
+
+
+@skipUnless(
+    connection.vendor == 'postgresql' and settings.TRANSACTION_PARTITIONING,
+    'needs PostgreSQL with TRANSACTION_PARTITIONING=1',
+)
+class PartitionPruningTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='partition_user', password='test123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.client.force_login(self.user)  # for the admin
+        self.account = Account.objects.create(name_account='Checking', balance=Decimal('0.00'), user=self.user)
+        self.day = timezone.localdate().replace(day=15)
+        for when in [self.day, self.day - timedelta(days=60), self.day - timedelta(days=365)]:
+            self._create(timezone.make_aware(datetime.combine(when, time(12))))
+
+    def _create(self, when):
+        transaction = Transaction.objects.create(
+            user=self.user, amount=Decimal('10.00'), description='Shop', account=self.account, type='withdrawal',
+        )
+        Transaction.objects.filter(pk=transaction.pk).update(date=when)
+        return transaction
+
+    def _partitions(self, start, end):
+        """Partitions covering local days ``start`` up to, not including, ``end``."""
+        first = month_start(timezone.make_aware(datetime.combine(start, time.min)).astimezone(dt_timezone.utc))
+        last = timezone.make_aware(datetime.combine(end, time.min)).astimezone(dt_timezone.utc) - timedelta(microseconds=1)
+        names, month = set(), first
+        while month <= last:
+            names.add(partition_name(month))
+            month = add_months(month, 1)
+        return names
+
+    def _scanned(self, queries):
+        """Partitions in the plan of every captured query bounded on the transaction date."""
+        scanned = []
+        for query in queries:
+            if '"transaction_transaction"."date" >=' in query['sql']:
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN ' + query['sql'])
+                    plan = ' '.join(row[0] for row in cursor.fetchall())
+                scanned.append(set(re.findall(r'transaction_transaction_(?:p\d{6}|default)', plan)))
+        self.assertTrue(scanned)
+        return scanned
+
+    def test_viewset_date_filter_scans_one_month(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/transactions/', {'start': self.day.isoformat(), 'end': self.day.isoformat()})
+        self.assertEqual(response.data['count'], 1)
+        for scanned in self._scanned(queries):
+            self.assertEqual(scanned, self._partitions(self.day, self.day + timedelta(days=1)))
+
+    def test_admin_date_range_filter_prunes(self):
+        today = timezone.localdate()
+        start = today.replace(day=1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/transaction/transaction/', {'date_range': 'month'})
+        self.assertEqual(response.status_code, 200)
+        for scanned in self._scanned(queries):
+            self.assertEqual(scanned, self._partitions(start, (start + timedelta(days=32)).replace(day=1)))
+
+    def test_new_partition_takes_rows_from_default(self):
+        future = month_start(timezone.now()).replace(year=timezone.now().year + 5)
+        transaction = self._create(future + timedelta(days=3))
+        self.assertEqual(create_partitions(0, today=future), [partition_name(future)])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM transaction_transaction WHERE id = %s', [transaction.id])
+            self.assertEqual(cursor.fetchone()[0], partition_name(future))
@@ -6,6 +6,7 @@ app_name = 'transaction'
 
 router = DefaultRouter()
 router.register(r"transactions", views.TransactionViewSet, basename = "transaction")
+router.register(r"merchants", views.MerchantViewSet, basename = "merchant")
 router.register(r"users", views.UserViewSet, basename = "user")
 
 
@@ -1,8 +1,80 @@
-from transaction.models import Transaction
-from transaction.serializers import TransactionSerializer, UserSerializer
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from dashboard.lookups import names_for
+from transaction.archive import archived_rows
+from transaction.models import Merchant, Transaction
+from transaction.serializers import MerchantSpendSerializer, TransactionSerializer, UserSerializer
 from django.contrib.auth.models import User
+from django.db.models import Count, F, Max, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import permissions
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+
+TOP_DEFAULT = 5
+TOP_MAX = 100
+MAX_ID = 2 ** 63 - 1  # largest bigint
+
+
+def _day_start(value, name):
+    try:
+        day = parse_date(value)
+    except ValueError:  # well formed but not a real day, such as 2020-13-01
+        day = None
+    if day is None:
+        raise ValidationError({name: 'Expected a date as YYYY-MM-DD.'})
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _id(value, name):
+    """``value`` as a row id, one the database can compare against."""
+    try:
+        row_id = int(value)
+    except ValueError:
+        row_id = 0
+    if not 0 < row_id <= MAX_ID:
+        raise ValidationError({name: f'Must be a {name} id.'})
+    return row_id
+
+
+def _date_range(params):
+    """``(start, end)`` of the ``?start=``/``?end=`` days (inclusive) as a half-open range; None where not given."""
+    start = _day_start(params['start'], 'start') if params.get('start') else None
+    end = _day_start(params['end'], 'end') + timedelta(days=1) if params.get('end') else None
+    return start, end
+
+
+def _largest(rows, limit):
+    """The ``limit`` largest serialized transactions, biggest (then newest id) first."""
+    return sorted(rows, key=lambda row: (Decimal(row['amount']), row['id']), reverse=True)[:limit]
+
+
+class _ArchiveReadThrough:
+    """
+    Live transactions followed by archived rows, sliced lazily for the
+    paginator. Archived rows all predate the live ones, so the order holds.
+    """
+
+    def __init__(self, queryset, archived):
+        self.queryset = queryset
+        self.archived = archived
+        self.live_count = queryset.count()
+
+    def count(self):
+        return self.live_count + len(self.archived)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        start, stop = index.start or 0, index.stop
+        live = list(self.queryset[start:min(stop, self.live_count)]) if start < self.live_count else []
+        return live + self.archived[max(start - self.live_count, 0):stop - self.live_count]
 
 
 # Create your views here.
@@ -11,13 +83,158 @@ class TransactionViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Transaction.objects.filter(user=self.request.user)
-    
+        """The user's transactions, newest first, within ``?start=`` and ``?end=`` dates (inclusive) if given."""
+        transactions = Transaction.objects.filter(user=self.request.user).order_by('-date', '-id')
+        start, end = _date_range(self.request.query_params)
+        if start is not None:
+            transactions = transactions.filter(date__gte=start)
+        if end is not None:
+            transactions = transactions.filter(date__lt=end)
+        return transactions
+
+    def list(self, request, *args, **kwargs):
+        """
+        With a date range that reaches back before the user's archive cutoff,
+        archived transactions (transaction.archive) follow the live ones.
+        """
+        start, end = _date_range(request.query_params)
+        archived = archived_rows(request.user.id, start, end) if (start or end) else []
+        if not archived:
+            return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(_ArchiveReadThrough(self.get_queryset(), archived))
+        rows = [row if isinstance(row, dict) else self.get_serializer(row).data for row in page]
+        return self.get_paginated_response(rows)
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=False)
+    def top(self, request):
+        """
+        The user's largest transactions of one type, biggest first.
+
+        ``?type=withdrawal|deposit`` (default withdrawal), ``?limit=`` (default
+        5, at most 100), ``?start=`` and ``?end=`` dates (inclusive) and
+        ``?category=<id>``. With ``?per_category=true`` the top ``limit`` of
+        each category are returned, grouped by category.
+
+        Served by the (user, type, -amount) index: the database walks it from
+        the largest amount down and stops after ``limit`` matching rows. As
+        in the list, a date range reaching back before the user's archive
+        cutoff also ranks the archived transactions of the range.
+        """
+        params = request.query_params
+        kind = params.get('type', 'withdrawal')
+        if kind not in ('withdrawal', 'deposit'):
+            raise ValidationError({'type': 'Must be "withdrawal" or "deposit".'})
+        try:
+            limit = min(max(int(params.get('limit', TOP_DEFAULT)), 1), TOP_MAX)
+        except ValueError:
+            raise ValidationError({'limit': 'Must be a number.'})
+
+        transactions = Transaction.objects.filter(user=request.user, type=kind)
+        start, end = _date_range(params)
+        if start is not None:
+            transactions = transactions.filter(date__gte=start)
+        if end is not None:
+            transactions = transactions.filter(date__lt=end)
+        category = _id(params['category'], 'category') if params.get('category') else None
+        if category is not None:
+            transactions = transactions.filter(budget_category_id=category)
+        archived = [
+            row for row in (archived_rows(request.user.id, start, end) if (start or end) else [])
+            if row['type'] == kind and (category is None or row['budget_category'] == category)
+        ]
+
+        if params.get('per_category') not in ('1', 'true'):
+            top = TransactionSerializer(transactions.order_by('-amount', '-id')[:limit], many=True).data
+            return Response(_largest(list(top) + archived, limit) if archived else top)
+
+        ranked = (
+            transactions
+            .annotate(rank=Window(RowNumber(), partition_by=F('budget_category'), order_by=[F('amount').desc(), F('id').desc()]))
+            .filter(rank__lte=limit)
+            .order_by(F('budget_category__name').asc(nulls_last=True), 'budget_category', 'rank')
+        )
+        categories = names_for(request.user.id).categories
+        groups = {}
+        for transaction in ranked:
+            group = groups.setdefault(transaction.budget_category_id, {
+                'category': transaction.budget_category_id,
+                'category_name': categories.get(transaction.budget_category_id),
+                'transactions': [],
+            })
+            group['transactions'].append(transaction)
+        for group in groups.values():
+            group['transactions'] = TransactionSerializer(group['transactions'], many=True).data
+        if not archived:
+            return Response(list(groups.values()))
+
+        for row in archived:
+            groups.setdefault(row['budget_category'], {
+                'category': row['budget_category'],
+                'category_name': categories.get(row['budget_category']),
+                'transactions': [],
+            })['transactions'].append(row)
+        for group in groups.values():
+            group['transactions'] = _largest(list(group['transactions']), limit)
+        # The order of the query: by category name, uncategorized last.
+        return Response(sorted(groups.values(), key=lambda group: (
+            group['category_name'] is None, group['category_name'] or '', group['category'] is None, group['category'] or 0,
+        )))
+
+class MerchantViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    The user's spend per merchant, largest first: total, count, average and
+    latest date. ``?type=withdrawal|deposit`` (default withdrawal) and
+    ``?start=``/``?end=`` dates (inclusive) narrow the transactions counted.
+
+    Grouped on Transaction.merchant through the (user, merchant, -date)
+    index, so no description is scanned.
+
+    Only live transactions count: archived months (transaction.archive) are
+    left out of the totals and of a merchant's transactions, as the rollups
+    kept for them have no merchant. /api/transactions/ with a date range
+    reads the archived ones.
+    """
+    serializer_class = MerchantSpendSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_value_regex = '[0-9]+'
+
+    def _filters(self):
+        params = self.request.query_params
+        kind = params.get('type', 'withdrawal')
+        if kind not in ('withdrawal', 'deposit'):
+            raise ValidationError({'type': 'Must be "withdrawal" or "deposit".'})
+        filters = {'transactions__user': self.request.user, 'transactions__type': kind}
+        if params.get('start'):
+            filters['transactions__date__gte'] = _day_start(params['start'], 'start')
+        if params.get('end'):
+            filters['transactions__date__lt'] = _day_start(params['end'], 'end') + timedelta(days=1)
+        return filters
+
+    def get_queryset(self):
+        # One filter() call, so the aggregates only see the matching transactions.
+        return (
+            Merchant.objects.filter(**self._filters())
+            .annotate(total=Sum('transactions__amount'), count=Count('transactions'), last_date=Max('transactions__date'))
+            .order_by('-total', 'id')
+        )
+
+    @action(detail=True)
+    def transactions(self, request, pk=None):
+        """The user's live transactions at this merchant, newest first."""
+        if int(pk) > MAX_ID:
+            raise NotFound()
+        transactions = (
+            Transaction.objects.filter(user=request.user, merchant_id=pk)
+            .order_by('-date', '-id')
+        )
+        page = self.paginate_queryset(transactions)
+        return self.get_paginated_response(TransactionSerializer(page, many=True).data)
+
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
     def get_queryset(self):
-        return User.objects.filter(id=self.request.user.id)
\ No newline at end of file
+        return User.objects.filter(id=self.request.user.id)
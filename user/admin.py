@@ -7,6 +7,7 @@ from account.models import Account
 from transaction.models import Transaction
 from budget.models import Budget
 from category.models import Category
+from .authentication import invalidate_cached_users
 
 
 class AccountInline(admin.TabularInline):
@@ -77,12 +78,16 @@ class UserAdmin(BaseUserAdmin):
 
     @admin.action(description='Deactivate selected users')
     def deactivate_users(self, request, queryset):
+        user_ids = list(queryset.values_list('id', flat=True))
         queryset.update(is_active=False)
+        invalidate_cached_users(*user_ids)
         self.message_user(request, f'{queryset.count()} user(s) deactivated.')
 
     @admin.action(description='Activate selected users')
     def activate_users(self, request, queryset):
+        user_ids = list(queryset.values_list('id', flat=True))
         queryset.update(is_active=True)
+        invalidate_cached_users(*user_ids)
         self.message_user(request, f'{queryset.count()} user(s) activated.')
 
 
@@ -0,0 +1,68 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def _version_key(user_id):
+    return f'jwt-user-version:{user_id}'
+
+
+def user_cache_key(user_id):
+    """Cache key for a user, tied to the user's current token version."""
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        # A missing version (never set, or evicted) must not revive entries
+        # cached under an older one, so start from a fresh random version.
+        cache.add(_version_key(user_id), uuid.uuid4().hex, None)
+        version = cache.get(_version_key(user_id))
+    return f'jwt-user:{user_id}:{version}'
+
+
+def invalidate_cached_users(*user_ids):
+    """Bump the token version of each user so their cached entry is no longer used."""
+    cache.set_many({_version_key(user_id): uuid.uuid4().hex for user_id in user_ids}, None)
+
+
+def shared_cache():
+    """
+    Whether the default cache is shared by the worker processes, so that
+    ``invalidate_cached_users`` in one of them reaches all of them.
+    """
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that serves the user from the cache for up to
+    ``JWT_USER_CACHE_TTL`` seconds instead of loading it on every request.
+
+    Entries are dropped when the user is saved or deleted and when the admin
+    activates or deactivates users (see ``user.signals``). That only works
+    if every worker sees the drop, so with a per-process default cache
+    (CACHE_BACKEND 'locmem') users are loaded on every request as by
+    JWTAuthentication.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or not shared_cache():
+            return super().get_user(validated_token)
+
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            # Inactive or unknown users raise here and are never cached.
+            user = super().get_user(validated_token)
+            cache.set(key, user, getattr(settings, 'JWT_USER_CACHE_TTL', 60))
+        elif api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+        return user
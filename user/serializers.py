@@ -1,16 +1,18 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
+from rest_framework_simplejwt import serializers as jwt_serializers
+from backend.metrics import TimedSerializerMixin
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name']
         read_only_fields = ['id']
 
 
-class RegisterSerializer(serializers.ModelSerializer):
+class RegisterSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     email = serializers.EmailField(required=True)
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
@@ -38,3 +40,11 @@ class RegisterSerializer(serializers.ModelSerializer):
         user.set_password(validated_data['password'])
         user.save()
         return user
+
+
+class TokenObtainPairSerializer(TimedSerializerMixin, jwt_serializers.TokenObtainPairSerializer):
+    pass
+
+
+class TokenRefreshSerializer(TimedSerializerMixin, jwt_serializers.TokenRefreshSerializer):
+    pass
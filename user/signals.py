@@ -0,0 +1,15 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from dashboard.versioning import bump
+from .authentication import invalidate_cached_users
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Covers password changes as well as is_active / is_staff edits.
+    invalidate_cached_users(instance.pk)
+    # Usernames shown next to transactions (dashboard.lookups).
+    bump([instance.pk], 'user')
@@ -1,3 +1,70 @@
-from django.test import TestCase
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from user.admin import UserAdmin
+from user.authentication import invalidate_cached_users
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        # Users are only cached in a cache the workers share.
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory.name}
+        shared_cache = override_settings(CACHES={**settings.CACHES, 'default': self.shared})
+        shared_cache.enable()
+        self.addCleanup(shared_cache.disable)
+        self.user = User.objects.create_user(username='cached_user', password='test123')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def _query_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/accounts/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_second_request_skips_user_lookup(self):
+        first = self._query_count()
+        self.assertEqual(self._query_count(), first - 1)
+
+    def test_password_change_invalidates(self):
+        first = self._query_count()
+        self.user.set_password('changed123')
+        self.user.save()
+        self.assertEqual(self._query_count(), first)
+
+    def test_admin_deactivation_invalidates(self):
+        self._query_count()
+        request = RequestFactory().post('/admin/auth/user/')
+        admin = UserAdmin(User, site)
+        admin.message_user = lambda *args, **kwargs: None
+        admin.deactivate_users(request, User.objects.filter(pk=self.user.pk))
+
+        response = self.client.get('/api/accounts/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_invalidation_from_another_process(self):
+        self._query_count()
+        # Another worker: its own cache instance on the same directory.
+        another = FileBasedCache(self.shared['LOCATION'], {})
+        with mock.patch('user.authentication.cache', another):
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            invalidate_cached_users(self.user.pk)
+        self.assertEqual(self.client.get('/api/accounts/').status_code, 401)
+
+    def test_per_process_cache_is_not_used(self):
+        local = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'jwt-tests'}
+        with override_settings(CACHES={**settings.CACHES, 'default': local}):
+            first = self._query_count()
+            self.assertEqual(self._query_count(), first)